@@ -0,0 +1,292 @@
+import sys
+import logging
+import numpy as np
+from simulation import Simulation
+from placement import Placement
+
+formatter = logging.Formatter('%(asctime)-15s - %(name)s - %(levelname)s - %(message)s')
+console = logging.StreamHandler()
+console.setFormatter(formatter)
+
+# This class is inherited from Simulation
+# It runs a batch of independent iterations (replications) in lockstep.
+# Each step advances every replication to its next event with vectorized
+# operations over the (replications, devices) arrays of next event times.
+#
+# The supported model is the one of RegularSimulation without transient
+# failures: permanent disk and node failures and disk repairs.
+# The iterations of a batch share one placement.
+#
+# As in RegularSimulation, the failure events of the disks that are scheduled
+# before a node failure stay pending, so a disk can have more than one pending
+# failure event.  They are kept in the slots of disk_fail_t, whose shape is
+# (replications, disks, slots).
+class BatchedSimulation(Simulation):
+    ##
+    # __init__() from Simulation
+    #
+
+    ##
+    # Initialize the simulation
+    #
+    # @param batch_size: number of iterations that run in lockstep
+    # @param report_loss_time: whether to report the time of data loss of each iteration
+    #
+    def init(self, batch_size=64, report_loss_time=False):
+        # Number of iterations that run in lockstep
+        self.batch_size = batch_size
+        self.report_loss_time = report_loss_time
+
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(logging.ERROR)
+        # self.logger.setLevel(logging.INFO)
+        self.logger.addHandler(console)
+        self.logger.propagate = False
+
+        if self.use_trace or self.use_power_outage:
+            self.logger.error("BatchedSimulation does not support traces or power outages!")
+            sys.exit(2)
+        if self.code_type == Placement.CODE_TYPE_LRC:
+            self.logger.error("BatchedSimulation does not support LRC!")
+            sys.exit(2)
+        if not self.use_network and self.disk_repair_dists == None:
+            self.logger.error("BatchedSimulation needs disk_repair_dists without network!")
+            sys.exit(2)
+
+
+    ##
+    # Prepare the arrays of a placement
+    #
+    def set_placement(self, placement):
+        self.placement = placement
+
+        # Stripes on each disk, stored as offsets and values
+        num_stripes_per_disk = [len(placement.get_stripes_to_repair(disk_id)) for disk_id in xrange(self.num_disks)]
+        self.stripe_offsets = np.zeros(self.num_disks + 1, dtype=np.int64)
+        self.stripe_offsets[1:] = np.cumsum(num_stripes_per_disk)
+        self.stripe_ids = np.zeros(self.stripe_offsets[-1], dtype=np.int64)
+        for disk_id in xrange(self.num_disks):
+            self.stripe_ids[self.stripe_offsets[disk_id]:self.stripe_offsets[disk_id+1]] = \
+                placement.get_stripes_to_repair(disk_id)
+
+        self.chunks_per_disk = np.array(placement.num_chunks_per_disk, dtype=np.float64)
+
+        # Repair time (hours) of each disk when all the other chunks are available.
+        # The repairs use the whole cross-rack bandwidth, so they are served one by one.
+        if self.use_network:
+            disks_per_rack = self.nodes_per_rack * self.disks_per_node
+            cross_rack_download = np.zeros(self.num_disks)
+            for disk_id in xrange(self.num_disks):
+                rack_id = disk_id / disks_per_rack
+                for stripe_id in placement.get_stripes_to_repair(disk_id):
+                    if self.code_type == Placement.CODE_TYPE_DRC:
+                        if self.k == 5 and self.n == 9:
+                            cross_rack_download[disk_id] += 1.0
+                        elif self.k == 6 and self.n == 9:
+                            cross_rack_download[disk_id] += 2.0
+                        continue
+                    num_alive_chunk_same_rack = 0
+                    for disk_idx in placement.get_stripe_location(stripe_id):
+                        if disk_idx != disk_id and disk_idx / disks_per_rack == rack_id:
+                            num_alive_chunk_same_rack += 1
+                    if num_alive_chunk_same_rack < self.k:
+                        cross_rack_download[disk_id] += self.k - num_alive_chunk_same_rack
+            self.repair_hours = cross_rack_download * self.chunk_size / \
+                                float(self.network_setting[0]) / float(3600)
+
+
+    ##
+    # Get the stripes on the disks, together with the replication of each stripe
+    #
+    def gather_stripes(self, reps, disks):
+        lengths = self.stripe_offsets[disks + 1] - self.stripe_offsets[disks]
+        total = lengths.sum()
+        if total == 0:
+            return (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+        ends = np.cumsum(lengths)
+        idx = np.arange(total) + np.repeat(self.stripe_offsets[disks] - (ends - lengths), lengths)
+        return (np.repeat(reps, lengths), self.stripe_ids[idx])
+
+
+    ##
+    # Fail the disks of the (reps, disks) pairs at times t and schedule their repairs
+    #
+    def fail_disks(self, reps, disks, t):
+        self.failed[reps, disks] = True
+        self.fail_start[reps, disks] = t
+
+        if self.use_network:
+            # first-come-first-served repairs, one at a time
+            for i in xrange(len(reps)):
+                start = max(t[i], self.server_free[reps[i]])
+                self.server_free[reps[i]] = start + self.repair_hours[disks[i]]
+                self.disk_repair_t[reps[i], disks[i]] = self.server_free[reps[i]]
+        else:
+            self.disk_repair_t[reps, disks] = t + self.disk_repair_dists.draw_many(len(reps))
+
+        (stripe_reps, stripe_ids) = self.gather_stripes(reps, disks)
+        np.add.at(self.counts, (stripe_reps, stripe_ids), 1)
+        counts = self.counts[stripe_reps, stripe_ids]
+        single = np.bincount(stripe_reps[counts == 1], minlength=self.num_reps)
+        self.num_stripes_repaired += np.bincount(stripe_reps, minlength=self.num_reps)
+        self.num_stripes_repaired_single_chunk += single
+
+        # replications with data loss
+        return np.unique(stripe_reps[counts > (self.n - self.k)])
+
+
+    ##
+    # Repair the disks of the (reps, disks) pairs at times t
+    #
+    def repair_disks(self, reps, disks, t):
+        self.failed[reps, disks] = False
+        self.unavail_time[reps] += (t - self.fail_start[reps, disks]) * self.chunks_per_disk[disks]
+        self.disk_repair_t[reps, disks] = np.inf
+
+        # schedule the next failure of each disk in a free slot
+        free = np.isinf(self.disk_fail_t[reps, disks])
+        if not free.any(axis=1).all():
+            self.disk_fail_t = np.concatenate((self.disk_fail_t, np.full(self.disk_fail_t.shape[:2] + (1,), np.inf)),
+                                              axis=2)
+            free = np.isinf(self.disk_fail_t[reps, disks])
+        self.disk_fail_t[reps, disks, free.argmax(axis=1)] = t + self.disk_fail_dists.draw_many(len(reps))
+
+        (stripe_reps, stripe_ids) = self.gather_stripes(reps, disks)
+        np.add.at(self.counts, (stripe_reps, stripe_ids), -1)
+
+        # the crashed node is repaired when all of its disks are repaired
+        nodes = disks / self.disks_per_node
+        crashed = self.node_crashed[reps, nodes]
+        for (rep, node_idx, time) in zip(reps[crashed], nodes[crashed], t[crashed]):
+            if not self.failed[rep, node_idx * self.disks_per_node:(node_idx + 1) * self.disks_per_node].any():
+                self.node_crashed[rep, node_idx] = False
+                self.node_fail_t[rep, node_idx] = time + self.node_fail_dists.draw()
+
+
+    ##
+    # Get the blocked ratio of replication rep at time curr_time
+    #
+    def get_blocked_ratio(self, rep, curr_time):
+        failed = self.failed[rep]
+        sum_unavail_time = self.unavail_time[rep] + \
+                           ((curr_time - self.fail_start[rep, failed]) * self.chunks_per_disk[failed]).sum()
+        return sum_unavail_time / (self.placement.num_chunks * curr_time)
+
+
+    def get_single_chunk_repair_ratio(self, rep):
+        if self.num_stripes_repaired[rep] == 0:
+            return float(0)
+        return float(self.num_stripes_repaired_single_chunk[rep]) / float(self.num_stripes_repaired[rep])
+
+
+    ##
+    # Run a batch of num_reps iterations in lockstep
+    #
+    def run_batch(self, num_reps, placement=None):
+        if placement is None:
+            placement = self.generate_placement()
+        self.set_placement(placement)
+
+        R = self.num_reps = num_reps
+        self.disk_fail_t = np.full((R, self.num_disks, 2), np.inf)
+        self.disk_fail_t[:, :, 0] = self.disk_fail_dists.draw_many((R, self.num_disks))
+        self.node_fail_t = self.node_fail_dists.draw_many((R, self.num_nodes))
+        self.disk_repair_t = np.full((R, self.num_disks), np.inf)
+        self.server_free = np.zeros(R)
+        self.failed = np.zeros((R, self.num_disks), dtype=bool)
+        self.node_crashed = np.zeros((R, self.num_nodes), dtype=bool)
+        self.fail_start = np.zeros((R, self.num_disks))
+        self.unavail_time = np.zeros(R)
+        self.counts = np.zeros((R, self.num_stripes), dtype=np.int8)
+        self.num_stripes_repaired = np.zeros(R, dtype=np.int64)
+        self.num_stripes_repaired_single_chunk = np.zeros(R, dtype=np.int64)
+
+        results = [None] * R
+        done = np.zeros(R, dtype=bool)
+        rows = np.arange(R)
+
+        while not done.all():
+            # next event of each replication
+            num_slots = self.disk_fail_t.shape[2]
+            disk_fail_t = self.disk_fail_t.reshape(R, -1)
+            next_slot = disk_fail_t.argmin(axis=1)
+            next_disk = next_slot / num_slots
+            next_node = self.node_fail_t.argmin(axis=1)
+            next_repair = self.disk_repair_t.argmin(axis=1)
+            times = np.vstack((disk_fail_t[rows, next_slot],
+                               self.node_fail_t[rows, next_node],
+                               self.disk_repair_t[rows, next_repair]))
+            kinds = times.argmin(axis=0)
+            t = times[kinds, rows]
+
+            # replications without data loss in the mission time
+            finished = ~done & (t > self.mission_time)
+            for rep in rows[finished]:
+                results[rep] = (0, "(0, 0, %f, %f)" % (self.get_blocked_ratio(rep, self.mission_time),
+                                                       self.get_single_chunk_repair_ratio(rep)))
+            done |= finished
+            active = ~done
+
+            # disk failures, the events of the failed disks are skipped
+            reps = rows[active & (kinds == 0)]
+            disks = next_disk[reps]
+            self.disk_fail_t[reps, disks, next_slot[reps] % num_slots] = np.inf
+            alive = ~self.failed[reps, disks]
+            fail_reps = [reps[alive]]
+            fail_disks = [disks[alive]]
+            # node failures, which fail all of the disks on the node
+            reps = rows[active & (kinds == 1)]
+            if len(reps) != 0:
+                nodes = next_node[reps]
+                self.node_crashed[reps, nodes] = True
+                self.node_fail_t[reps, nodes] = np.inf
+                for i in xrange(self.disks_per_node):
+                    disks = nodes * self.disks_per_node + i
+                    alive = ~self.failed[reps, disks]
+                    fail_reps.append(reps[alive])
+                    fail_disks.append(disks[alive])
+            fail_reps = np.concatenate(fail_reps)
+            fail_disks = np.concatenate(fail_disks)
+            if len(fail_reps) != 0:
+                for rep in self.fail_disks(fail_reps, fail_disks, t[fail_reps]):
+                    lost = self.counts[rep] > (self.n - self.k)
+                    results[rep] = (1, "(%d, %d, %f, %f)" % (lost.sum(), self.counts[rep][lost].sum(),
+                                                             self.get_blocked_ratio(rep, t[rep]),
+                                                             self.get_single_chunk_repair_ratio(rep)))
+                    if self.report_loss_time:
+                        results[rep] += ({"loss_time": float(t[rep])},)
+                    done[rep] = True
+                    # stop the events of this replication
+                    self.disk_fail_t[rep] = np.inf
+                    self.node_fail_t[rep] = np.inf
+                    self.disk_repair_t[rep] = np.inf
+
+            # disk repairs
+            reps = rows[~done & (kinds == 2)]
+            if len(reps) != 0:
+                self.repair_disks(reps, next_repair[reps], t[reps])
+
+        # The iterations of the batch share one placement, so they are not
+        # independent. The first one reports the size of the batch, so that
+        # the statistics are computed from the means of the batches.
+        if len(results[0]) < 3:
+            results[0] += (dict(),)
+        results[0][2]["batch_size"] = R
+        return results
+
+
+    ##
+    # Run num_iterations iterations in batches of batch_size
+    #
+    def run_iterations(self, num_iterations, placement=None):
+        results = []
+        while len(results) < num_iterations:
+            results += self.run_batch(min(self.batch_size, num_iterations - len(results)), placement)
+        return results
+
+
+    ##
+    # Run an iteration of the simulator
+    #
+    def run_iteration(self, ite=0, placement=None):
+        return self.run_batch(1, placement)[0]
@@ -0,0 +1,139 @@
+##
+# A fixed-size set of small integers, which is kept as the bits of
+# NumPy uint64 words.
+#
+# The number of members is counted in O(words) with a byte lookup table,
+# and the members are listed in O(words + popcount).  The set operations
+# are vectorized over the words, so the failed disks of a failure domain
+# (a node or a rack) are counted by intersecting with its domain mask.
+#
+
+import numpy as np
+
+WORD_BITS = 64
+
+# Number of set bits of each byte
+POPCOUNT_TABLE = np.array([bin(i).count("1") for i in xrange(256)], dtype=np.uint8)
+
+
+class Bitset:
+
+    def __init__(self, size, members=None):
+        self.size = size
+        self.words = np.zeros((size + WORD_BITS - 1) / WORD_BITS, dtype=np.uint64)
+        if members is not None:
+            for idx in members:
+                self.add(idx)
+
+
+    ##
+    # Bitset of the members in [start, start + length), e.g., the disks of a rack
+    #
+    @classmethod
+    def domain_mask(cls, size, start, length):
+        bitset = cls(size)
+        end = min(start + length, size)
+        if start >= end:
+            return bitset
+        (first_word, first_bit) = divmod(start, WORD_BITS)
+        (last_word, last_bit) = divmod(end - 1, WORD_BITS)
+        bitset.words[first_word:last_word + 1] = ~np.uint64(0)
+        bitset.words[first_word] &= np.uint64((~0 << first_bit) & ((1 << WORD_BITS) - 1))
+        bitset.words[last_word] &= np.uint64((1 << (last_bit + 1)) - 1)
+        return bitset
+
+
+    ##
+    # Bitsets of the consecutive domains of domain_size members
+    #
+    @classmethod
+    def domain_masks(cls, size, domain_size):
+        return [cls.domain_mask(size, start, domain_size) for start in xrange(0, size, domain_size)]
+
+
+    def copy(self):
+        bitset = Bitset(0)
+        bitset.size = self.size
+        bitset.words = self.words.copy()
+        return bitset
+
+
+    def add(self, idx):
+        self.words[idx / WORD_BITS] |= np.uint64(1 << (idx % WORD_BITS))
+
+
+    def discard(self, idx):
+        self.words[idx / WORD_BITS] &= ~np.uint64(1 << (idx % WORD_BITS))
+
+
+    def clear(self):
+        self.words[:] = 0
+
+
+    def __contains__(self, idx):
+        return (int(self.words[idx / WORD_BITS]) >> (idx % WORD_BITS)) & 1 == 1
+
+
+    ##
+    # Number of members (popcount)
+    #
+    def __len__(self):
+        return int(POPCOUNT_TABLE[self.words.view(np.uint8)].sum(dtype=np.int64))
+
+
+    ##
+    # Iterate over the members in ascending order
+    #
+    def __iter__(self):
+        for word_idx in np.flatnonzero(self.words):
+            word = int(self.words[word_idx])
+            base = int(word_idx) * WORD_BITS
+            while word:
+                low_bit = word & -word
+                yield base + low_bit.bit_length() - 1
+                word ^= low_bit
+
+
+    def to_list(self):
+        return list(self)
+
+
+    def __or__(self, other):
+        bitset = self.copy()
+        bitset.words |= other.words
+        return bitset
+
+
+    def __and__(self, other):
+        bitset = self.copy()
+        bitset.words &= other.words
+        return bitset
+
+
+    def __sub__(self, other):
+        bitset = self.copy()
+        bitset.words &= ~other.words
+        return bitset
+
+
+    def __eq__(self, other):
+        return self.size == other.size and np.array_equal(self.words, other.words)
+
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+
+    ##
+    # Number of common members of the two bitsets, without building their intersection
+    #
+    def count_and(self, other):
+        return int(POPCOUNT_TABLE[(self.words & other.words).view(np.uint8)].sum(dtype=np.int64))
+
+
+    def is_subset(self, other):
+        return not (self.words & ~other.words).any()
+
+
+    def __repr__(self):
+        return "Bitset(%d, %r)" % (self.size, self.to_list())
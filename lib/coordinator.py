@@ -0,0 +1,354 @@
+##
+# A lightweight coordinator that hands out the jobs of a campaign to
+# workers over TCP and merges the results streamed back by them.
+#
+# A job is (iter_num, rseed) + the parameters from get_parms(), so it
+# carries the configuration, the number of iterations and the seed.
+# Workers can join and leave at any time: the job of a worker whose
+# connection is lost is handed out again.
+#
+# The messages are plain data (jobs and results) encoded as Python
+# literals and decoded with ast.literal_eval(), so a peer cannot run code by
+# sending a message. A worker has to send the shared secret of the campaign
+# in its first message before it gets any job.
+#
+
+import sys
+import ast
+import hmac
+import math
+import time
+import struct
+import socket
+import logging
+import threading
+import traceback
+
+formatter = logging.Formatter('%(asctime)-15s - %(name)s - %(levelname)s - %(message)s')
+console = logging.StreamHandler()
+console.setFormatter(formatter)
+
+MSG_HELLO = "hello"
+MSG_READY = "ready"
+MSG_TASK = "task"
+MSG_RESULT = "result"
+MSG_WAIT = "wait"
+MSG_DONE = "done"
+MSG_ERROR = "error"
+
+# Seconds for an idle worker to wait before asking for a job again
+WAIT_INTERVAL = 1.0
+
+# Maximum size (bytes) of the first message of a worker, which carries the secret
+MAX_HELLO_SIZE = 4096
+
+# Number of times that a job may fail on the workers before the campaign is aborted
+MAX_JOB_ERRORS = 3
+
+
+##
+# Encode plain data (None, bools, numbers, strings, and tuples, lists and
+# dicts of them) as a Python literal. The other numbers, e.g., of mpmath and
+# numpy, are sent as floats.
+#
+def encode_literal(obj):
+    if obj is None or isinstance(obj, (bool, int, long, str, unicode)):
+        return repr(obj)
+    elif isinstance(obj, tuple):
+        items = [encode_literal(each) for each in obj]
+        if len(items) == 1:
+            return "(%s,)" % items[0]
+        return "(%s)" % ", ".join(items)
+    elif isinstance(obj, list):
+        return "[%s]" % ", ".join([encode_literal(each) for each in obj])
+    elif isinstance(obj, dict):
+        return "{%s}" % ", ".join(["%s: %s" % (encode_literal(key), encode_literal(value))
+                                   for (key, value) in obj.iteritems()])
+
+    try:
+        value = float(obj)
+    except (TypeError, ValueError):
+        raise TypeError("Cannot send %r in a message!" % (obj,))
+    if math.isnan(value):
+        raise ValueError("Cannot send nan in a message!")
+    if math.isinf(value):
+        # 1e999 is read back as inf
+        if value > 0:
+            return "1e999"
+        return "-1e999"
+    return repr(value)
+
+
+##
+# Send a message as a 4-byte length followed by the literal of the object
+#
+def send_msg(sock, obj):
+    send_data(sock, encode_literal(obj))
+
+
+def send_data(sock, data):
+    sock.sendall(struct.pack("!I", len(data)) + data)
+
+
+def recv_exactly(sock, size):
+    chunks = []
+    while size > 0:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return "".join(chunks)
+
+
+##
+# Receive a message, return None if the connection is closed or the
+# message is not valid
+#
+# @param max_size: maximum size of the message in bytes (None for no limit)
+#
+def recv_msg(sock, max_size=None):
+    header = recv_exactly(sock, 4)
+    if header is None:
+        return None
+    size = struct.unpack("!I", header)[0]
+    if max_size != None and size > max_size:
+        return None
+    data = recv_exactly(sock, size)
+    if data is None:
+        return None
+    try:
+        msg = ast.literal_eval(data)
+    except (ValueError, SyntaxError):
+        return None
+    if not isinstance(msg, tuple) or len(msg) == 0:
+        return None
+    return msg
+
+
+##
+# Parse "host:port" or "port", the coordinator listens on localhost by default
+#
+def parse_address(address, default_host="127.0.0.1"):
+    if ":" in address:
+        (host, port) = address.rsplit(":", 1)
+    else:
+        (host, port) = (default_host, address)
+    return (host, int(port))
+
+
+class Coordinator:
+
+    ##
+    # @param secret: shared secret that the workers send in their first message
+    #
+    def __init__(self, host, port, secret):
+        self.host = host
+        self.port = port
+        self.secret = secret
+
+        self.lock = threading.Condition()
+        self.jobs = []
+        self.pending = []
+        # job index handed to each connection
+        self.in_flight = dict()
+        self.results = dict()
+        # number of times that each job failed on the workers
+        self.job_errors = dict()
+        # (job index, traceback) of the job that aborts the campaign
+        self.error = None
+        # called with (job index, result) when a job is finished
+        self.on_result = None
+        # whether the whole campaign is finished
+        self.finished = False
+
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(logging.INFO)
+        self.logger.addHandler(console)
+        self.logger.propagate = False
+
+        self.server_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server_sock.bind((self.host, self.port))
+        self.server_sock.listen(128)
+        # the real port when port 0 is given
+        self.port = self.server_sock.getsockname()[1]
+
+        accept_thread = threading.Thread(target=self.accept_workers)
+        accept_thread.daemon = True
+        accept_thread.start()
+
+
+    ##
+    # Hand out the jobs to the workers and return the list of results of each job
+    #
+    # @param on_result: function called with (job index, result) as each job is
+    #                   finished, e.g., to report the statistics so far
+    #
+    def run(self, jobs, on_result=None):
+        with self.lock:
+            self.jobs = list(jobs)
+            self.pending = range(len(self.jobs))
+            self.in_flight = dict()
+            self.results = dict()
+            self.job_errors = dict()
+            self.on_result = on_result
+            self.logger.info("Coordinator %s:%d: %d jobs to run" % (self.host, self.port, len(self.jobs)))
+            while len(self.results) < len(self.jobs) and self.error is None:
+                self.lock.wait(WAIT_INTERVAL)
+
+        if self.error is not None:
+            (job_idx, trace) = self.error
+            self.close()
+            print "Job %d failed %d times on the workers, the campaign is aborted!" % (job_idx, MAX_JOB_ERRORS)
+            print trace
+            sys.exit(2)
+
+        return [self.results[idx] for idx in xrange(len(self.jobs))]
+
+
+    def accept_workers(self):
+        while True:
+            try:
+                (sock, address) = self.server_sock.accept()
+            except socket.error:
+                return
+            worker_thread = threading.Thread(target=self.serve_worker, args=(sock, address))
+            worker_thread.daemon = True
+            worker_thread.start()
+
+
+    ##
+    # Serve the requests of a worker until it leaves
+    #
+    def serve_worker(self, sock, address):
+        conn_id = "%s:%d" % address
+        try:
+            msg = recv_msg(sock, MAX_HELLO_SIZE)
+            if msg is None or len(msg) != 2 or msg[0] != MSG_HELLO or not isinstance(msg[1], str) or \
+                    not hmac.compare_digest(msg[1], self.secret):
+                self.logger.warning("Connection from %s is refused: wrong secret!" % conn_id)
+                sock.close()
+                return
+        except socket.error:
+            sock.close()
+            return
+
+        self.logger.info("Worker %s joined" % conn_id)
+        try:
+            while True:
+                msg = recv_msg(sock)
+                if msg is None:
+                    break
+
+                if msg[0] == MSG_RESULT:
+                    (job_idx, result) = msg[1:]
+                    with self.lock:
+                        self.in_flight.pop(conn_id, None)
+                        if job_idx not in self.results:
+                            self.results[job_idx] = result
+                            self.logger.info("Job %d finished by worker %s (%d/%d)" %
+                                             (job_idx, conn_id, len(self.results), len(self.jobs)))
+                            if self.on_result is not None:
+                                self.on_result(job_idx, result)
+                        self.lock.notify_all()
+                elif msg[0] == MSG_ERROR:
+                    (job_idx, trace) = msg[1:]
+                    with self.lock:
+                        self.in_flight.pop(conn_id, None)
+                        self.job_errors[job_idx] = self.job_errors.get(job_idx, 0) + 1
+                        self.logger.error("Job %d failed on worker %s:\n%s" % (job_idx, conn_id, trace))
+                        if self.job_errors[job_idx] >= MAX_JOB_ERRORS:
+                            self.error = (job_idx, trace)
+                        elif job_idx not in self.results:
+                            self.pending.append(job_idx)
+                        self.lock.notify_all()
+                elif msg[0] != MSG_READY:
+                    self.logger.error("Wrong message from worker %s!" % conn_id)
+                    break
+
+                with self.lock:
+                    # give back the job that is finished by another worker
+                    while len(self.pending) > 0 and self.pending[0] in self.results:
+                        self.pending.pop(0)
+                    if len(self.pending) > 0:
+                        job_idx = self.pending.pop(0)
+                        self.in_flight[conn_id] = job_idx
+                        reply = (MSG_TASK, job_idx, self.jobs[job_idx])
+                    elif self.finished or self.error is not None:
+                        reply = (MSG_DONE,)
+                    else:
+                        reply = (MSG_WAIT, WAIT_INTERVAL)
+                send_msg(sock, reply)
+        except socket.error:
+            pass
+        finally:
+            with self.lock:
+                # hand out the job of the lost worker again
+                job_idx = self.in_flight.pop(conn_id, None)
+                if job_idx != None and job_idx not in self.results:
+                    self.pending.insert(0, job_idx)
+                    self.logger.info("Worker %s left, job %d is handed out again" % (conn_id, job_idx))
+                else:
+                    self.logger.info("Worker %s left" % conn_id)
+                self.lock.notify_all()
+            sock.close()
+
+
+    ##
+    # Finish the campaign, the workers leave when they ask for the next job
+    #
+    def close(self):
+        with self.lock:
+            self.finished = True
+        self.server_sock.close()
+
+
+##
+# Run jobs from the coordinator at (host, port) with job_func until
+# the campaign is done. A job that raises an exception is reported to
+# the coordinator with its traceback.
+#
+# @param secret: shared secret of the campaign
+# @param connect_timeout: seconds to keep retrying to connect to the coordinator
+#
+def run_worker(host, port, secret, job_func, connect_timeout=60):
+    begin = time.time()
+    while True:
+        try:
+            sock = socket.create_connection((host, port))
+            break
+        except socket.error:
+            if time.time() - begin > connect_timeout:
+                print "Cannot connect to the coordinator %s:%d!" % (host, port)
+                sys.exit(2)
+            time.sleep(WAIT_INTERVAL)
+
+    num_msgs = 0
+    try:
+        send_msg(sock, (MSG_HELLO, secret))
+        send_msg(sock, (MSG_READY,))
+        while True:
+            msg = recv_msg(sock)
+            if msg is None:
+                break
+            num_msgs += 1
+            if msg[0] == MSG_DONE:
+                break
+            elif msg[0] == MSG_WAIT:
+                time.sleep(msg[1])
+                send_msg(sock, (MSG_READY,))
+            elif msg[0] == MSG_TASK:
+                (job_idx, job) = msg[1:]
+                try:
+                    data = encode_literal((MSG_RESULT, job_idx, job_func(job)))
+                except Exception:
+                    data = encode_literal((MSG_ERROR, job_idx, traceback.format_exc()))
+                send_data(sock, data)
+    except socket.error:
+        pass
+    finally:
+        sock.close()
+
+    if num_msgs == 0:
+        print "The coordinator %s:%d closed the connection, check the secret!" % (host, port)
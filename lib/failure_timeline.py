@@ -0,0 +1,125 @@
+##
+# The failure and repair draws of the devices in an iteration, which are
+# recorded once and replayed by several configurations (e.g., different
+# codes and placements).
+#
+# The j-th draw of a kind (an event code, e.g., the failures of a disk) of a
+# device is the same in all the configurations that replay the timeline, no
+# matter when the configuration asks for it.  So the configurations are
+# compared with common random numbers, even though their repairs, and thus
+# the times of their later failures, are different.  The draws are made on
+# demand from the distribution and kept in memory.
+#
+# If the timeline has a seed, each kind of draws comes from its own named
+# stream, which is a numpy RandomState seeded by (seed, stream id), instead
+# of the global random stream.  So the draws of the disks, nodes and racks do
+# not shift one another, and iteration i of different runs can be paired.
+#
+
+import numpy.random as nprandom
+
+# Ids of the named streams besides the event codes
+STREAM_PLACEMENT = 100
+STREAM_OTHERS = 101
+
+class FailureTimeline:
+
+    ##
+    # @param seed: list of integers to seed the named streams (None to draw
+    #              from the global random stream)
+    #
+    def __init__(self, seed=None):
+        self.seed = seed
+        # stream id -> RandomState
+        self.streams = dict()
+        # (kind, distribution) -> list of the draws of each device
+        self.draws = dict()
+        # (kind, distribution) -> number of draws of each device that are replayed
+        self.positions = dict()
+        # recorded lists of events, e.g., the power outages of a rack
+        self.events = dict()
+
+
+    ##
+    # Start to replay the timeline from the beginning
+    #
+    def rewind(self):
+        self.positions = dict()
+
+
+    ##
+    # Get the named stream stream_id, or None if the timeline has no seed
+    #
+    def get_stream(self, stream_id):
+        if self.seed is None:
+            return None
+        if stream_id not in self.streams:
+            self.streams[stream_id] = nprandom.RandomState(list(self.seed) + [stream_id])
+        return self.streams[stream_id]
+
+
+    ##
+    # Get an integer seed from the named stream stream_id, e.g., to seed the
+    # global random streams before a placement is generated
+    #
+    def get_seed(self, stream_id):
+        return int(nprandom.RandomState(list(self.seed) + [stream_id]).randint(0, 2 ** 31 - 1))
+
+
+    def get_device_draws(self, kind, dist, num_devices):
+        key = (kind, repr(dist))
+        if key not in self.draws:
+            self.draws[key] = []
+        draws = self.draws[key]
+        if len(draws) < num_devices:
+            draws.extend([[] for i in xrange(num_devices - len(draws))])
+        if key not in self.positions:
+            self.positions[key] = [0] * len(draws)
+        positions = self.positions[key]
+        if len(positions) < num_devices:
+            positions.extend([0] * (num_devices - len(positions)))
+        return (draws, positions)
+
+
+    ##
+    # Get the next draw of dist for device_idx
+    #
+    def draw(self, kind, dist, device_idx):
+        (draws, positions) = self.get_device_draws(kind, dist, device_idx + 1)
+        pos = positions[device_idx]
+        if pos == len(draws[device_idx]):
+            rng = self.get_stream(kind)
+            if rng is None:
+                draws[device_idx].append(dist.draw())
+            else:
+                draws[device_idx].append(float(dist.draw_many(1, rng)[0]))
+        positions[device_idx] = pos + 1
+        return draws[device_idx][pos]
+
+
+    ##
+    # Get the next draws of dist for the devices 0, 1, ..., num_devices - 1
+    #
+    def draw_many(self, kind, dist, num_devices):
+        (draws, positions) = self.get_device_draws(kind, dist, num_devices)
+        missing = [device_idx for device_idx in xrange(num_devices)
+                   if positions[device_idx] == len(draws[device_idx])]
+        if len(missing) != 0:
+            values = dist.draw_many(len(missing), self.get_stream(kind)).tolist()
+            for idx in xrange(len(missing)):
+                draws[missing[idx]].append(values[idx])
+        vals = []
+        for device_idx in xrange(num_devices):
+            vals.append(draws[device_idx][positions[device_idx]])
+            positions[device_idx] += 1
+        return vals
+
+
+    ##
+    # Get the recorded list of events of key, which is generated by
+    # generate() the first time
+    #
+    def get_events(self, key, generate):
+        if key not in self.events:
+            self.events[key] = generate()
+        return self.events[key]
@@ -5,7 +5,7 @@ import numpy.random as nprandom
 from heapq import *
 from simulation import Simulation
 from state import State
-from smp_data_structures import Rack, Node, Disk
+from smp_data_structures import Rack, Node, Disk, EVENT_NAMES
 from placement import Placement
 
 formatter = logging.Formatter('%(asctime)-15s - %(name)s - %(levelname)s - %(message)s')
@@ -22,7 +22,11 @@ class UnifBFBSimulation(Simulation):
     ##
     # Initialize UnifBFBSimulation
     #
-    def init(self):
+    # @param report_loss_time: whether to report the time of data loss of each iteration
+    # @param sensitivity: whether to report the scores of the disk failure, node failure
+    #                     and disk repair scales of each iteration with data loss
+    #
+    def init(self, report_loss_time=False, sensitivity=False):
         self.logger = logging.getLogger(__name__)
         # self.logger.setLevel(logging.ERROR)
         self.logger.setLevel(logging.INFO)
@@ -37,14 +41,18 @@ class UnifBFBSimulation(Simulation):
         # Likelihood ratio
         self.lr = float(1.)
 
+        self.report_loss_time = report_loss_time
+        self.sensitivity = sensitivity
+
         self.logger.debug("UnifBFBSimulation init() - fb_prob = %.6f, poisson_rate = %.6f",
              self.fb_prob, self.poisson_rate)
 
 
     ##
     # Reset the simulator
+    # If placement is None, a new placement is generated
     #
-    def reset(self):
+    def reset(self, ite=0, placement=None):
         # Reset clocks and state for each disk
         for disk in self.disks:
             disk.init_clock(0)
@@ -60,20 +68,24 @@ class UnifBFBSimulation(Simulation):
             rack.init_state()
 
         # Reset system state
-        self.state = State(self.num_disks, self.num_nodes)
+        self.state = State(self.num_disks, self.num_nodes, self.nodes_per_rack)
 
         # Rest repair queue
         self.repair_queue = []
 
         # Regenerate new placement
-        self.placement = Placement(self.num_racks, self.nodes_per_rack,
-                                   self.disks_per_node, self.capacity_per_disk,
-                                   self.num_stripes, self.chunk_size,
-                                   self.code_type, self.n, self.k,
-                                   self.place_type,
-                                   self.chunk_rack_config, self.l)
+        if placement is None:
+            self.placement = self.generate_placement()
+        else:
+            self.placement = placement
         # Reset LR
         self.lr = float(1.)
+        # Reset the derivatives of the log-likelihood of the iteration with
+        # respect to the log of the scales of disk failures, node failures and
+        # disk repairs
+        self.disk_fail_score = float(0)
+        self.node_fail_score = float(0)
+        self.repair_score = float(0)
 
         self.total_failure_rate = 0.;
         self.total_failrue_rate_cnt = 0;
@@ -98,6 +110,49 @@ class UnifBFBSimulation(Simulation):
         return fail_rate
 
 
+    ##
+    # Add the scores of the failure rates of the disks and nodes
+    # for a pseudo event, whose probability is 1 - failure_rate / poisson_rate
+    #
+    def add_pseudo_event_scores(self):
+        disk_fail_rate = float(0)
+        node_fail_rate = float(0)
+        for disk in self.disks:
+            # d(hazard rate) / d(ln(scale)) = -shape * hazard rate
+            disk_fail_rate += disk.disk_fail_distr.shape * disk.curr_disk_fail_rate()
+        for node in self.nodes:
+            node_fail_rate += node.node_fail_distr.shape * node.curr_node_fail_rate()
+
+        remain_rate = self.poisson_rate - self.get_failure_rate()
+        self.disk_fail_score += disk_fail_rate / remain_rate
+        self.node_fail_score += node_fail_rate / remain_rate
+
+
+    ##
+    # Add the scores of the first failure after the clocks of the disks and
+    # nodes, which fails the subsystem subsystem_idx of next_event_type at
+    # curr_time + duration while the other disks and nodes survive
+    #
+    def add_first_failure_scores(self, duration, next_event_type, subsystem_idx):
+        # d(ln(survival)) / d(ln(scale)) = shape * (cumulative hazard of the duration)
+        for disk in self.disks:
+            clock = float(disk.read_clock())
+            distr = disk.disk_fail_distr
+            self.disk_fail_score += distr.shape * (distr.cum_hazard_eval(clock + duration) -
+                                                   distr.cum_hazard_eval(clock))
+        for node in self.nodes:
+            clock = float(node.read_clock())
+            distr = node.node_fail_distr
+            self.node_fail_score += distr.shape * (distr.cum_hazard_eval(clock + duration) -
+                                                   distr.cum_hazard_eval(clock))
+
+        # d(ln(hazard rate)) / d(ln(scale)) = -shape
+        if next_event_type == Disk.EVENT_DISK_FAIL:
+            self.disk_fail_score -= self.disks[subsystem_idx].disk_fail_distr.shape
+        else:
+            self.node_fail_score -= self.nodes[subsystem_idx].node_fail_distr.shape
+
+
     ##
     # Get the probability of node failure
     # To decide whether a failure event is node failure or disk failure
@@ -120,7 +175,12 @@ class UnifBFBSimulation(Simulation):
     def get_disk_repair_duration(self, disk_idx):
         if not self.use_network:
             # get the repair time from a pre-defined repair distribution
-            return self.disk_repair_dists.draw()
+            repair_duration = self.disk_repair_dists.draw()
+            self.total_repair_rate += 1. / repair_duration
+            self.total_repair_rate_cnt += 1
+            if self.sensitivity:
+                self.repair_score += self.disk_repair_dists.log_scale_score_eval(repair_duration)
+            return repair_duration
         else:
             # repair time = cross-rack repair traffic / available cross-rack bandwidth
             rack_id = disk_idx / (self.nodes_per_rack * self.disks_per_node)
@@ -280,6 +340,9 @@ class UnifBFBSimulation(Simulation):
 
             heapify(failure_queue)
             (next_event_time, next_event_type, next_event_subsystem) = heappop(failure_queue)
+            if self.sensitivity:
+                self.add_first_failure_scores(float(next_event_time - curr_time), next_event_type,
+                                              next_event_subsystem)
 
             if next_event_type == Disk.EVENT_DISK_FAIL:
                 self.disks[next_event_subsystem].fail_disk(next_event_time)
@@ -329,6 +392,8 @@ class UnifBFBSimulation(Simulation):
             # Determine whether it is a "real" event or "pseudo" event
             if draw > self.fb_prob:
                 # It is a pseudo event
+                if self.sensitivity:
+                    self.add_pseudo_event_scores()
                 old_lr = self.lr
                 self.lr *=  (1. - self.get_failure_rate() / self.poisson_rate) / (1. - self.fb_prob)
                 self.logger.debug("get_next_event(): pseudo event - old_lr = %.10f, update, lr = %.10f", old_lr, self.lr)
@@ -348,6 +413,8 @@ class UnifBFBSimulation(Simulation):
                     #            / (self.fb_prob * (1 - prob_node_failure) / len(avail_disks))
                     # The above equation equals to the following
                     self.lr *= (self.get_failure_rate() / self.poisson_rate) / self.fb_prob
+                    # the probability of the disk failure is its hazard rate / poisson_rate
+                    self.disk_fail_score -= self.disks[fail_disk_idx].disk_fail_distr.shape
                     self.logger.debug("get_next_event(): disk failure event, lr = %.10f, update, lr = %.10f",
                                       old_lr, self.lr)
 
@@ -365,6 +432,7 @@ class UnifBFBSimulation(Simulation):
                     #            / (self.fb_prob * prob_node_failure / len(avail_nodes))
                     # The above equation equals to the following
                     self.lr *= (self.get_failure_rate() / self.poisson_rate) / self.fb_prob
+                    self.node_fail_score -= self.nodes[fail_node_idx].node_fail_distr.shape
                     self.logger.debug("get_next_event(): node failure event - old_lr = %.10f, update, lr = %.10f",
                                       old_lr, self.lr)
 
@@ -383,8 +451,8 @@ class UnifBFBSimulation(Simulation):
     ##
     # Run an iteration in UnifBFBSimulation
     #
-    def run_iteration(self, ite=0):
-        self.reset()
+    def run_iteration(self, ite=0, placement=None):
+        self.reset(ite, placement)
         curr_time = 0
         self.logger.info("UnifBFBSimulator: begin an iteration %d, num_failed_disks = %d, "
                          "avail_cross_rack_bwth = %d"
@@ -401,7 +469,7 @@ class UnifBFBSimulation(Simulation):
             if event_type != None:
                 self.logger.debug("Time: %.3f, event = %s, subsystem = %d, "
                                   "number_failed_disks = %d, number_failed_nodes = %d" %
-                              (event_time, event_type, subsystem_idx,
+                              (event_time, EVENT_NAMES[event_type], subsystem_idx,
                                self.state.get_num_failed_disks(), self.state.get_num_failed_nodes()))
 
                 if not self.state.update_state_unifbfb(event_type, subsystem_idx):
@@ -415,8 +483,30 @@ class UnifBFBSimulation(Simulation):
                     (num_failed_stripes, num_lost_chunks) = self.placement.get_num_failed_status(failed_disks)
                     self.logger.info("avg_failure_rate = %.6f" % (self.total_failure_rate / self.total_failrue_rate_cnt))
                     self.logger.info("avg_repair_rate = %.6f" % (self.total_repair_rate / self.total_repair_rate_cnt))
-                    return (min(self.lr, 1), "(%d, %d, 0, 0)" % (num_failed_stripes, num_lost_chunks))
+                    return self.get_result(min(self.lr, 1), "(%d, %d, 0, 0)" % (num_failed_stripes, num_lost_chunks),
+                                           curr_time)
 
         # No data loss
         self.logger.debug("END of one iteration, self.lr = 0 because no data loss")
         return (0, "(0, 0, 0, 0)")
+
+
+    ##
+    # Return the result of an iteration with data loss at loss_time
+    # The extra outputs of the iteration are appended in a dict if enabled
+    #
+    def get_result(self, sample, ori_pattern, loss_time):
+        extras = dict()
+        if self.report_loss_time:
+            # the likelihood ratio of the iteration is that at the time of data loss
+            extras["loss_time"] = float(loss_time)
+        if self.sensitivity:
+            # the sample is clamped at 1, while the score products need the raw ratio
+            extras["lr"] = float(self.lr)
+            extras["disk_fail_score"] = self.disk_fail_score
+            extras["node_fail_score"] = self.node_fail_score
+            if not self.use_network:
+                extras["repair_score"] = self.repair_score
+        if len(extras) == 0:
+            return (sample, ori_pattern)
+        return (sample, ori_pattern, extras)
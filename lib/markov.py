@@ -0,0 +1,78 @@
+##
+# Continuous-time Markov chains of the number of failed disks, whose
+# transient probabilities are solved with the matrix exponential.
+#
+# A LossChain is a birth-death chain with an absorbing state of data loss,
+# which is solved for PDL and MTTDL by the analytic (markov) simulation.
+#
+
+import numpy as np
+import scipy.sparse
+from scipy.sparse.linalg import expm as sparse_expm, spsolve
+
+
+##
+# Birth-death chain on the states 0, 1, ..., num_states - 1 with an absorbing
+# state of data loss (num_states), where a birth from j goes to the loss state
+# with probability loss_probs[j]. The births from the last state all go to the
+# loss state.
+#
+class LossChain:
+
+    ##
+    # @param birth_rates: birth_rates[j] is the rate of the births from j
+    # @param death_rates: death_rates[j] is the rate of the transition j -> j-1
+    #                     (death_rates[0] is not used)
+    # @param loss_probs: loss_probs[j] is the probability that a birth from j is a loss
+    #
+    def __init__(self, birth_rates, death_rates, loss_probs):
+        self.birth_rates = [float(rate) for rate in birth_rates]
+        self.death_rates = [float(rate) for rate in death_rates]
+        self.loss_probs = [float(prob) for prob in loss_probs]
+        self.loss_probs[-1] = 1.
+        self.num_states = len(self.birth_rates)
+
+
+    ##
+    # Get the sparse generator matrix, whose last row and column are the loss state
+    #
+    def get_generator(self):
+        loss_state = self.num_states
+        rows = []
+        cols = []
+        rates = []
+        for j in xrange(self.num_states):
+            out_rate = 0.
+            transitions = [(loss_state, self.birth_rates[j] * self.loss_probs[j])]
+            if j + 1 < self.num_states:
+                transitions.append((j + 1, self.birth_rates[j] * (1 - self.loss_probs[j])))
+            if j > 0:
+                transitions.append((j - 1, self.death_rates[j]))
+            for (state, rate) in transitions:
+                if rate > 0:
+                    rows.append(j)
+                    cols.append(state)
+                    rates.append(rate)
+                    out_rate += rate
+            rows.append(j)
+            cols.append(j)
+            rates.append(-out_rate)
+        return scipy.sparse.csc_matrix((rates, (rows, cols)), shape=(loss_state + 1, loss_state + 1))
+
+
+    ##
+    # Probability of data loss by time t, starting from state 0
+    #
+    def get_pdl(self, t):
+        transition = sparse_expm(self.get_generator() * float(t))
+        return float(transition[0, self.num_states])
+
+
+    ##
+    # Mean time to data loss, starting from state 0
+    #
+    def get_mttdl(self):
+        generator = self.get_generator()[:self.num_states, :self.num_states]
+        times = spsolve(-generator.tocsc(), np.ones(self.num_states))
+        return float(np.atleast_1d(times)[0])
+
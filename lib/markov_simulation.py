@@ -0,0 +1,194 @@
+##
+# Analytic solution of the reliability of a configuration with a
+# continuous-time Markov chain, instead of simulating its iterations.
+#
+# The state of the chain is the number of failed disks j. Each disk fails at
+# the rate of its disk and node failures, and the failed disks are repaired
+# independently (or one at a time over the cross-rack network, which is used
+# up by a repair). A failure from j goes to data loss with the probability
+# that the failed disks of j+1 lose a stripe but those of j do not, where the
+# failed disks are taken as a random subset of the disks and the stripes as
+# independent.
+#
+# The chain is exact for the exponential failures and repairs. The other
+# distributions are replaced by the exponential ones with the same means.
+#
+
+import math
+import itertools
+from simulation import Simulation
+from placement import Placement, LRC_DATA_GROUP, LRC_LOCAL_PARITY, LRC_GLOBAL_PARITY, is_stripe_lost
+from markov import LossChain
+
+# The states whose (unnormalized) probability is below it are cut off from the chain
+MIN_STATE_WEIGHT = 1e-30
+
+# This class is inherited from Simulation
+class MarkovSimulation(Simulation):
+
+    def init(self):
+        self.fail_rate = 1. / self.disk_fail_dists.get_mean()
+        # a permanent node failure fails each disk on the node
+        if self.node_fail_dists is not None:
+            self.fail_rate += 1. / self.node_fail_dists.get_mean()
+
+        self.chain = self.get_chain()
+
+
+    ##
+    # Whether the chain is exact for the configuration
+    #
+    def is_exact(self):
+        dists = [self.disk_fail_dists]
+        if self.node_fail_dists is not None:
+            dists.append(self.node_fail_dists)
+        if not self.use_network:
+            dists.append(self.disk_repair_dists)
+        for dist in dists:
+            if not dist.is_exponential():
+                return False
+        return self.disks_per_node == 1 and not self.use_power_outage
+
+
+    ##
+    # Fraction of the patterns of i failed chunks of a stripe that lose data,
+    # for i = 0, 1, ..., n
+    #
+    def get_loss_fractions(self):
+        fractions = []
+        for i in xrange(self.n + 1):
+            num_patterns = 0
+            num_lost = 0
+            for failed_idxs in itertools.combinations(xrange(self.n), i):
+                num_patterns += 1
+                if is_stripe_lost(self.code_type, self.n, self.k, self.l, set(failed_idxs)):
+                    num_lost += 1
+            fractions.append(float(num_lost) / num_patterns)
+        return fractions
+
+
+    ##
+    # Probability that no stripe is lost when j random disks fail
+    #
+    def get_survival_prob(self, j, loss_fractions):
+        # the number of failed chunks of a stripe is hypergeometric
+        log_total = log_comb(self.num_disks, j)
+        stripe_loss_prob = 0.
+        for i in xrange(max(0, j - (self.num_disks - self.n)), min(self.n, j) + 1):
+            if loss_fractions[i] == 0:
+                continue
+            log_prob = log_comb(self.n, i) + log_comb(self.num_disks - self.n, j - i) - log_total
+            stripe_loss_prob += math.exp(log_prob) * loss_fractions[i]
+        if stripe_loss_prob >= 1:
+            return 0.
+        return math.exp(self.num_stripes * math.log1p(-stripe_loss_prob))
+
+
+    ##
+    # Average number of chunks downloaded across racks to repair a chunk,
+    # which follows set_disk_repair() of the regular simulation
+    #
+    def get_repair_download(self):
+        # the rack of each chunk of a stripe
+        if self.place_type == Placement.PLACE_TYPE_FLAT:
+            racks = range(self.n)
+        else:
+            racks = []
+            for rack_idx in xrange(len(self.chunk_rack_config)):
+                racks += [rack_idx] * self.chunk_rack_config[rack_idx]
+
+        download = 0.
+        for idx in xrange(self.n):
+            same_rack = [each for each in xrange(self.n) if each != idx and racks[each] == racks[idx]]
+            if self.code_type == Placement.CODE_TYPE_DRC and self.n == 9 and self.k == 5:
+                download += 1.
+            elif self.code_type == Placement.CODE_TYPE_DRC and self.n == 9 and self.k == 6:
+                download += 2.
+            elif self.code_type == Placement.CODE_TYPE_LRC and idx not in LRC_GLOBAL_PARITY:
+                gid = 0
+                for each in xrange(self.l):
+                    if idx in LRC_DATA_GROUP[each] or idx == LRC_LOCAL_PARITY[each]:
+                        gid = each
+                        break
+                same_group = [each for each in same_rack if each in LRC_DATA_GROUP[gid]]
+                download += max(self.k / self.l - len(same_group), 0)
+            else:
+                download += max(self.k - len(same_rack), 0)
+        return download / self.n
+
+
+    ##
+    # Repair rate of a failed disk
+    #
+    def get_repair_rate(self):
+        if not self.use_network:
+            return 1. / self.disk_repair_dists.get_mean()
+        # repair time = cross-rack repair traffic of the chunks on the disk / cross-rack bandwidth
+        chunks_per_disk = float(self.num_stripes * self.n) / self.num_disks
+        repair_time = chunks_per_disk * self.get_repair_download() * self.chunk_size / \
+                      float(self.network_setting[0]) / 3600.
+        return 1. / repair_time
+
+
+    ##
+    # Rate of the repairs when j disks fail
+    #
+    def get_death_rate(self, j, repair_rate):
+        if j == 0:
+            return 0.
+        if self.use_network:
+            # the repairs use up the cross-rack bandwidth one at a time
+            return repair_rate
+        return j * repair_rate
+
+
+    ##
+    # Build the chain of the number of failed disks, which is cut off at the
+    # state whose probability is negligible
+    #
+    def get_chain(self):
+        loss_fractions = self.get_loss_fractions()
+        repair_rate = self.get_repair_rate()
+
+        birth_rates = []
+        death_rates = []
+        loss_probs = []
+        survival_prob = 1.
+        weight = 1.
+        for j in xrange(self.num_disks + 1):
+            birth_rates.append((self.num_disks - j) * self.fail_rate)
+            death_rates.append(self.get_death_rate(j, repair_rate))
+            if j == self.num_disks:
+                loss_probs.append(1.)
+                break
+
+            next_survival_prob = self.get_survival_prob(j + 1, loss_fractions)
+            loss_probs.append(1. - next_survival_prob / survival_prob)
+            survival_prob = next_survival_prob
+            # the probability of j+1 relative to 0 in the chain without loss
+            weight *= birth_rates[j] * (1 - loss_probs[j]) / self.get_death_rate(j + 1, repair_rate)
+            if survival_prob == 0 or weight < MIN_STATE_WEIGHT:
+                break
+
+        return LossChain(birth_rates, death_rates, loss_probs)
+
+
+    ##
+    # Get the PDL by the mission time and the MTTDL (hours)
+    #
+    def solve(self):
+        return (self.chain.get_pdl(self.mission_time), self.chain.get_mttdl())
+
+
+    ##
+    # The iterations are not simulated
+    #
+    def run_iteration(self, ite=0, placement=None):
+        return None
+
+
+##
+# Logarithm of the binomial coefficient C(n, r)
+#
+def log_comb(n, r):
+    return math.lgamma(n + 1) - math.lgamma(r + 1) - math.lgamma(n - r + 1)
@@ -1,5 +1,8 @@
+import os
 import random
 import logging
+import numpy as np
+import numpy.random as nprandom
 
 ##
 # Print debug messages
@@ -7,6 +10,11 @@ formatter = logging.Formatter('%(asctime)-15s - %(name)s - %(levelname)s - %(mes
 console = logging.StreamHandler()
 console.setFormatter(formatter)
 
+# Positions of the chunks of a stripe of LRC
+LRC_DATA_GROUP = [[0,1,2,3,4,5],[8,9,10,11,12,13]]
+LRC_LOCAL_PARITY = [6,14]
+LRC_GLOBAL_PARITY = [7,15]
+
 
 class Placement:
     CODE_TYPE_RS = "Reed-Solomon Codes"
@@ -19,7 +27,7 @@ class Placement:
 
     def __init__(self, num_racks, nodes_per_rack, disks_per_node, capacity_per_disk,
                  num_stripes, chunk_size, code_type, code_n, code_k, place_type,
-                 chunk_rack_config=None, code_l=0):
+                 chunk_rack_config=None, code_l=0, placement_dir=None):
         self.num_racks = num_racks
         self.nodes_per_rack = nodes_per_rack
         self.disks_per_node = disks_per_node
@@ -38,9 +46,9 @@ class Placement:
 
         # for LRC code
         self.l = code_l
-        self.lrc_data_group = [[0,1,2,3,4,5],[8,9,10,11,12,13]]
-        self.lrc_local_parity = [6,14]
-        self.lrc_global_parity = [7,15]
+        self.lrc_data_group = [list(group) for group in LRC_DATA_GROUP]
+        self.lrc_local_parity = list(LRC_LOCAL_PARITY)
+        self.lrc_global_parity = list(LRC_GLOBAL_PARITY)
 
         self.logger = logging.getLogger(__name__)
         self.logger.setLevel(logging.ERROR)
@@ -56,6 +64,11 @@ class Placement:
             if sum != self.n:
                 logging.error('The chunk_rack_config is NOT valid!')
 
+        # Attach the placement generated by generate_placement_files()
+        if placement_dir != None:
+            self.attach_placement_files(placement_dir)
+            return
+
         # stripes_location, keeps record of the disks that each stripe resides in
         # E.g., stripes_location[0], is the list of disk index that stripe0 locates on
         self.stripes_location = []
@@ -68,6 +81,29 @@ class Placement:
         self.num_chunks_per_disk = self.generate_num_chunks_per_disk()
 
 
+    ##
+    # Attach the placement arrays in placement_dir read-only. The arrays are
+    # memory-mapped, so all the processes share one copy of them.
+    #
+    def attach_placement_files(self, placement_dir):
+        meta = read_placement_meta(placement_dir)
+        if meta != get_placement_meta(self.num_racks, self.nodes_per_rack, self.disks_per_node,
+                                      self.num_stripes, self.code_type, self.n, self.k,
+                                      self.place_type, self.chunk_rack_config):
+            self.logger.error('The placement in %s does not match the configuration!' % placement_dir)
+            raise ValueError(placement_dir)
+
+        if self.code_type == Placement.CODE_TYPE_DRC:
+            self.chunk_rack_config = [3, 3, 3]
+        self.stripes_location = RowView(np.load(os.path.join(placement_dir, "stripes_location.npy"),
+                                                mmap_mode="r"))
+        offsets = np.load(os.path.join(placement_dir, "stripes_per_disk_offsets.npy"), mmap_mode="r")
+        self.stripes_per_disk = CSRView(offsets,
+                                        np.load(os.path.join(placement_dir, "stripes_per_disk.npy"),
+                                                mmap_mode="r"))
+        self.num_chunks_per_disk = np.diff(offsets).tolist()
+
+
     # Generate placement for different code_type
     def generate_placement(self):
         if self.code_type == Placement.CODE_TYPE_RS or self.code_type == Placement.CODE_TYPE_LRC:
@@ -373,3 +409,174 @@ class Placement:
             self.logger.error('Wrong failed_disk_id in get_num_stripes_to_repair!')
 
         return len(self.stripes_per_disk[failed_disk_id])
+
+
+##
+# Read-only view of the rows of a 2-D array, whose rows are returned as lists
+#
+class RowView:
+    def __init__(self, array):
+        self.array = array
+
+    def __getitem__(self, idx):
+        return self.array[idx].tolist()
+
+    def __len__(self):
+        return len(self.array)
+
+    def __iter__(self):
+        for idx in xrange(len(self.array)):
+            yield self.array[idx].tolist()
+
+
+##
+# Read-only view of a list of lists, which is stored as offsets and values
+#
+class CSRView:
+    def __init__(self, offsets, values):
+        self.offsets = offsets
+        self.values = values
+
+    def __getitem__(self, idx):
+        return self.values[self.offsets[idx]:self.offsets[idx+1]].tolist()
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+
+##
+# Check whether a stripe loses data when its chunks at the positions
+# failed_idxs fail, which follows check_data_loss()
+#
+def is_stripe_lost(code_type, code_n, code_k, code_l, failed_idxs):
+    if code_type != Placement.CODE_TYPE_LRC:
+        return len(failed_idxs) > code_n - code_k
+
+    group_failed_num = [0] * code_l
+    global_failed_num = 0
+    for idx in xrange(code_n):
+        if idx in failed_idxs:
+            if idx in LRC_GLOBAL_PARITY:
+                global_failed_num += 1
+            elif idx not in LRC_LOCAL_PARITY:
+                for gid in xrange(code_l):
+                    if idx in LRC_DATA_GROUP[gid]:
+                        group_failed_num[gid] += 1
+                        break
+        else:
+            # the local parity repairs a failed data chunk of its group
+            for gid in xrange(code_l):
+                if idx == LRC_LOCAL_PARITY[gid] and group_failed_num[gid] > 0:
+                    group_failed_num[gid] -= 1
+                    break
+    return global_failed_num + sum(group_failed_num) > code_n - code_k - code_l
+
+
+def get_placement_meta(num_racks, nodes_per_rack, disks_per_node, num_stripes,
+                       code_type, code_n, code_k, place_type, chunk_rack_config):
+    if chunk_rack_config != None:
+        chunk_rack_config = list(chunk_rack_config)
+    return repr((num_racks, nodes_per_rack, disks_per_node, num_stripes,
+                 code_type, code_n, code_k, place_type, chunk_rack_config))
+
+
+def read_placement_meta(placement_dir):
+    meta_file = os.path.join(placement_dir, "meta.txt")
+    if not os.path.exists(meta_file):
+        return None
+    with open(meta_file, "r") as f:
+        return f.read().strip()
+
+
+##
+# Generate a placement into memory-mapped files under placement_dir with
+# numpy.random, which is attached by Placement(..., placement_dir=placement_dir).
+# The stripes are generated in blocks, so the placement of a large number of
+# stripes is never kept in lists.
+#
+# The files are
+# - stripes_location.npy: the disks of each stripe, (num_stripes, code_n)
+# - stripes_per_disk_offsets.npy, stripes_per_disk.npy: the stripes on each disk
+# - meta.txt: the configuration of the placement
+#
+def generate_placement_files(placement_dir, num_racks, nodes_per_rack, disks_per_node,
+                             num_stripes, code_type, code_n, code_k, place_type,
+                             chunk_rack_config=None, block_size=65536):
+    meta = get_placement_meta(num_racks, nodes_per_rack, disks_per_node, num_stripes,
+                              code_type, code_n, code_k, place_type, chunk_rack_config)
+
+    if code_type == Placement.CODE_TYPE_DRC:
+        if code_n != 9 or (code_k != 6 and code_k != 5):
+            return False
+        chunk_rack_config = [3, 3, 3]
+    elif code_k < 1 or code_n <= code_k:
+        return False
+
+    if place_type == Placement.PLACE_TYPE_FLAT:
+        # Put each chunk of a stripe in different rack
+        if chunk_rack_config != None or num_racks < code_n:
+            return False
+        chunk_rack_config = [1] * code_n
+    elif place_type == Placement.PLACE_TYPE_HIERARCHICAL:
+        if chunk_rack_config == None or sum(chunk_rack_config) != code_n or \
+                num_racks < len(chunk_rack_config) or nodes_per_rack < max(chunk_rack_config):
+            return False
+    else:
+        return False
+
+    if not os.path.isdir(placement_dir):
+        os.makedirs(placement_dir)
+    num_disks = num_racks * nodes_per_rack * disks_per_node
+    disks_per_rack = nodes_per_rack * disks_per_node
+    stripes_location = np.lib.format.open_memmap(os.path.join(placement_dir, "stripes_location.npy"),
+                                                 mode="w+", dtype=np.int32, shape=(num_stripes, code_n))
+
+    # Generate the disks of the stripes block by block
+    num_chunks_per_disk = np.zeros(num_disks, dtype=np.int64)
+    for start in xrange(0, num_stripes, block_size):
+        end = min(start + block_size, num_stripes)
+        size = end - start
+        # different racks for each stripe
+        racks = np.argsort(nprandom.random_sample((size, num_racks)), axis=1)[:, :len(chunk_rack_config)]
+        col = 0
+        for i in xrange(len(chunk_rack_config)):
+            num_chunks = chunk_rack_config[i]
+            if place_type == Placement.PLACE_TYPE_FLAT:
+                # a random disk in the rack
+                disks = racks[:, i:i+1] * disks_per_rack + nprandom.randint(0, disks_per_rack, (size, 1))
+            else:
+                # random disks on different nodes in the rack
+                nodes = np.argsort(nprandom.random_sample((size, nodes_per_rack)), axis=1)[:, :num_chunks]
+                nodes += racks[:, i:i+1] * nodes_per_rack
+                disks = nodes * disks_per_node + nprandom.randint(0, disks_per_node, (size, num_chunks))
+            stripes_location[start:end, col:col+num_chunks] = disks
+            col += num_chunks
+        num_chunks_per_disk += np.bincount(stripes_location[start:end].ravel(), minlength=num_disks)
+
+    offsets = np.zeros(num_disks + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(num_chunks_per_disk)
+    np.save(os.path.join(placement_dir, "stripes_per_disk_offsets.npy"), offsets)
+
+    # Fill the stripes of each disk in the increasing order of stripe_id
+    stripes_per_disk = np.lib.format.open_memmap(os.path.join(placement_dir, "stripes_per_disk.npy"),
+                                                 mode="w+", dtype=np.int32, shape=(int(offsets[-1]),))
+    cursor = np.zeros(num_disks, dtype=np.int64)
+    for start in xrange(0, num_stripes, block_size):
+        end = min(start + block_size, num_stripes)
+        disks = stripes_location[start:end].ravel()
+        stripe_ids = np.repeat(np.arange(start, end, dtype=np.int32), code_n)
+        order = np.argsort(disks, kind="mergesort")
+        sorted_disks = disks[order]
+        counts = np.bincount(sorted_disks, minlength=num_disks)
+        rank = np.arange(len(sorted_disks)) - (np.cumsum(counts) - counts)[sorted_disks]
+        stripes_per_disk[offsets[sorted_disks] + cursor[sorted_disks] + rank] = stripe_ids[order]
+        cursor += counts
+
+    stripes_location.flush()
+    stripes_per_disk.flush()
+    del stripes_location
+    del stripes_per_disk
+    with open(os.path.join(placement_dir, "meta.txt"), "w") as f:
+        f.write(meta + "\n")
+
+    return True
@@ -3,10 +3,11 @@ import random
 import numpy.random as nprandom
 from heapq import *
 from simulation import Simulation
-from state import State
-from smp_data_structures import Rack, Node, Disk
+from state import State, BlockedRatioAccumulator
+from smp_data_structures import Rack, Node, Disk, EVENT_NAMES
 from placement import Placement
-from lib.tracelib.trace import Trace
+from lib.tracelib.trace import Trace, ResampledTrace, NodeMapping, get_trace_store
+from lib.tracelib.trace import TRACE_MODE_REPLAY, TRACE_MODE_BOOTSTRAP, NODE_MAPPING_EXACT
 from network import Network
 
 formatter = logging.Formatter('%(asctime)-15s - %(name)s - %(levelname)s - %(message)s')
@@ -22,12 +23,45 @@ class RegularSimulation(Simulation):
     ##
     # Initialize the simulation
     #
-    def init(self):
+    # @param br_buckets: number of periods of the mission time to report the blocked
+    #                    ratio of each period (0 for none)
+    # @param trace_mode: TRACE_MODE_REPLAY to replay the node events in the trace, or
+    #                    TRACE_MODE_BOOTSTRAP to resample them in each iteration
+    # @param block_size: number of consecutive intervals of a block in TRACE_MODE_BOOTSTRAP
+    # @param node_mapping: type of the mapping of the nodes to the trace nodes in
+    #                      TRACE_MODE_REPLAY, e.g., NODE_MAPPING_TILE
+    # @param control_variate: whether to report the number of disks whose first lifetime
+    #                         (of the disk or its node) ends by the mission time for the
+    #                         control variate
+    # @param report_loss_time: whether to report the time of data loss of each iteration
+    #
+    def init(self, br_buckets=0,
+             trace_mode=TRACE_MODE_REPLAY, block_size=4, node_mapping=NODE_MAPPING_EXACT,
+             control_variate=False, report_loss_time=False):
         # Initialize the state of the system
-        self.state = State(self.num_disks)
+        self.state = State(self.num_disks, self.num_nodes, self.nodes_per_rack)
+
+        # Node transient and permanent failure events from trace, which are
+        # loaded once and shared by the iterations
+        self.trace_mode = trace_mode
+        if self.use_trace and trace_mode == TRACE_MODE_BOOTSTRAP:
+            for i in xrange(self.num_nodes):
+                self.nodes[i] = Node(None, None, None,
+                                     ResampledTrace(self.trace_id, 'p', self.mission_time, block_size),
+                                     ResampledTrace(self.trace_id, 't', self.mission_time, block_size))
+        elif self.use_trace:
+            self.node_mapping = NodeMapping(node_mapping, self.num_nodes,
+                                            get_trace_store(self.trace_id).num_nodes, self.trace_id)
+            for i in xrange(self.num_nodes):
+                trace_node = self.node_mapping.get_trace_node(i)
+                copy = self.node_mapping.get_copy(i)
+                self.nodes[i] = Node(None, None, None, Trace(self.trace_id, trace_node, 'p', self.mission_time, copy),
+                                     Trace(self.trace_id, trace_node, 't', self.mission_time, copy))
 
         # Employ priority queue to keep all the failures and repairs
-        # The element in the queue is (event_time, event_type, device_id)
+        # The element in the queue is (event_time, event_type, device_id, payload),
+        # where event_type is an event code and payload is the repair bandwidth
+        # of a disk repair over the network (0 otherwise)
         self.events_queue = []
 
         # Keep failed disks awaiting repair
@@ -36,9 +70,31 @@ class RegularSimulation(Simulation):
         # Keep delayed stripes due to unavailable nodes
         # Key is the disk_idx delayed, value is the list of delayed stripes
         self.delayed_repair_dict = dict()
+        # Reverse index of delayed_repair_dict
+        # Key is a disk_idx, value is the set of keys of delayed_repair_dict whose
+        # delayed stripes have a chunk on the disk
+        self.delayed_repair_index = dict()
 
         self.enable_transient_failures = False
 
+        self.br_buckets = br_buckets
+        self.control_variate = control_variate
+        self.report_loss_time = report_loss_time
+
+        # The failure timeline replayed by the iterations (None to draw the
+        # failures and repairs directly from the distributions)
+        self.timeline = None
+
+        # Handler of each event code
+        self.event_handlers = [None] * len(EVENT_NAMES)
+        self.event_handlers[Disk.EVENT_DISK_FAIL] = self.handle_disk_fail
+        self.event_handlers[Disk.EVENT_DISK_REPAIR] = self.handle_disk_repair
+        self.event_handlers[Node.EVENT_NODE_FAIL] = self.handle_node_fail
+        self.event_handlers[Node.EVENT_NODE_TRANSIENT_FAIL] = self.handle_node_transient_fail
+        self.event_handlers[Node.EVENT_NODE_TRANSIENT_REPAIR] = self.handle_node_transient_repair
+        self.event_handlers[Rack.EVENT_RACK_FAIL] = self.handle_rack_fail
+        self.event_handlers[Rack.EVENT_RACK_REPAIR] = self.handle_rack_repair
+
         self.logger = logging.getLogger(__name__)
         self.logger.setLevel(logging.ERROR)
         # self.logger.setLevel(logging.INFO)
@@ -47,16 +103,38 @@ class RegularSimulation(Simulation):
 
 
     ##
-    # Reset the simulation
+    # Replay the failures and repairs of timeline in the following iterations,
+    # so that the configurations replaying the same timeline are compared with
+    # common random numbers
     #
-    def reset(self, ite=0):
-        # Generate node transient and permanent failure events from trace
-        if self.use_trace:
-            for i in xrange(self.num_nodes):
-                self.nodes[i] = Node(None, None, None, Trace(self.trace_id, i, 'p'),
-                                     Trace(self.trace_id, i, 't'), Trace(self.trace_id, i, 'r'))
+    def set_timeline(self, timeline):
+        self.timeline = timeline
+
 
-        self.state = State(self.num_disks)
+    ##
+    # Get the next draw of dist for the device device_idx, whose events are of kind
+    #
+    def draw(self, kind, dist, device_idx):
+        if self.timeline is None:
+            return dist.draw()
+        return self.timeline.draw(kind, dist, device_idx)
+
+
+    ##
+    # Get the next draws of dist for the first num_devices devices
+    #
+    def draw_many(self, kind, dist, num_devices):
+        if self.timeline is None:
+            return dist.draw_many(num_devices).tolist()
+        return self.timeline.draw_many(kind, dist, num_devices)
+
+
+    ##
+    # Reset the simulation
+    # If placement is None, a new placement is generated
+    #
+    def reset(self, ite=0, placement=None):
+        self.state = State(self.num_disks, self.num_nodes, self.nodes_per_rack)
 
         for disk in self.disks:
             disk.init_clock(0)
@@ -66,76 +144,126 @@ class RegularSimulation(Simulation):
         for rack in self.racks:
             rack.init_state()
 
-        self.events_queue = []
+        # the initial events, which are heapified into events_queue at once
+        events = []
         self.wait_repair_queue = []
         self.delayed_repair_dict = dict()
+        self.delayed_repair_index = dict()
+        # iterators of the trace events of each node
+        self.node_fail_traces = [None] * self.num_nodes
+        self.node_transient_fail_traces = [None] * self.num_nodes
+        if self.timeline is not None:
+            self.timeline.rewind()
 
         # generate disk failures and put them into events_queue
+        disk_fail_times = self.draw_many(Disk.EVENT_DISK_FAIL, self.disk_fail_dists, len(self.disks))
         for disk_id in xrange(len(self.disks)):
-            disk_fail_time = self.disk_fail_dists.draw()
+            disk_fail_time = disk_fail_times[disk_id]
             if disk_fail_time <= self.mission_time:
-                self.events_queue.append((disk_fail_time, Disk.EVENT_DISK_FAIL, disk_id))
-        # generate node failures and push them into events_queue
+                events.append((disk_fail_time, Disk.EVENT_DISK_FAIL, disk_id, 0))
+        # generate node failures and put them into events_queue
+        if not self.use_trace:
+            node_fail_times = self.draw_many(Node.EVENT_NODE_FAIL, self.node_fail_dists, self.num_nodes)
+            if self.enable_transient_failures:
+                node_transient_fail_times = self.draw_many(Node.EVENT_NODE_TRANSIENT_FAIL,
+                                                           self.node_transient_fail_dists, self.num_nodes)
+            # the control variate only depends on the first lifetimes, which are
+            # independent, so its expectation is exact under any distributions
+            if self.control_variate:
+                self.num_early_failures = 0
+                for disk_id in xrange(len(self.disks)):
+                    if min(disk_fail_times[disk_id],
+                           node_fail_times[disk_id / self.disks_per_node]) <= self.mission_time:
+                        self.num_early_failures += 1
         for node_id in xrange(self.num_nodes):
             if not self.use_trace:
-                self.events_queue.append((self.node_fail_dists.draw(),
-                                          Node.EVENT_NODE_FAIL, node_id))
+                events.append((node_fail_times[node_id],
+                                          Node.EVENT_NODE_FAIL, node_id, 0))
                 if self.enable_transient_failures:
-                    self.events_queue.append((self.node_transient_fail_dists.draw(),
-                                          Node.EVENT_NODE_TRANSIENT_FAIL, node_id))
+                    events.append((node_transient_fail_times[node_id],
+                                          Node.EVENT_NODE_TRANSIENT_FAIL, node_id, 0))
             else:
-                for node_failure_time in self.nodes[node_id].node_fail_trace.get_trace_ls():
-                    # push node failure event to event_queue
-                    self.events_queue.append((node_failure_time, Node.EVENT_NODE_FAIL, node_id))
-                node_transient_failure_ls = self.nodes[node_id].node_transient_fail_trace.get_trace_ls()
-                node_transient_repair_ls = self.nodes[node_id].node_transient_repair_trace.get_trace_ls()
-                for ls_idx in xrange(len(node_transient_failure_ls)):
-                    node_transient_failure_time = node_transient_failure_ls[ls_idx]
-                    node_transient_repair_time = node_transient_repair_ls[ls_idx]
-                    self.events_queue.append((node_transient_failure_time, Node.EVENT_NODE_TRANSIENT_FAIL, node_id))
-                    self.events_queue.append((node_transient_failure_time + node_transient_repair_time,
-                                              Node.EVENT_NODE_TRANSIENT_REPAIR, node_id))
-
-        # generate rack failures and push them into events_queue
+                # the events of the trace are generated one by one: the next
+                # event of a node is pushed when its current event is handled
+                self.node_fail_traces[node_id] = iter(self.nodes[node_id].node_fail_trace)
+                self.node_transient_fail_traces[node_id] = iter(self.nodes[node_id].node_transient_fail_trace)
+                for event in self.get_node_trace_events(node_id, Node.EVENT_NODE_FAIL) + \
+                             self.get_node_trace_events(node_id, Node.EVENT_NODE_TRANSIENT_FAIL):
+                    events.append(event)
+
+        # generate rack failures and put them into events_queue
         if not self.use_power_outage and self.enable_transient_failures:
+            rack_fail_times = self.draw_many(Rack.EVENT_RACK_FAIL, self.rack_fail_dists, len(self.racks))
             for rack_id in xrange(len(self.racks)):
-                self.events_queue.append((self.rack_fail_dists.draw(), Rack.EVENT_RACK_FAIL, rack_id))
+                events.append((rack_fail_times[rack_id], Rack.EVENT_RACK_FAIL, rack_id, 0))
 
         # correlated failures caused by power outage
         if (not self.use_trace) and self.use_power_outage:
             for rack_id in xrange(self.num_racks):
-                occur_time = float(0) + self.power_outage_dist.draw()
-                while occur_time < self.mission_time:
-                    self.events_queue.append((occur_time, Rack.EVENT_RACK_FAIL, rack_id))
-                    occur_time += random.expovariate((1/float(self.power_outage_duration)))
-                    self.events_queue.append((occur_time, Rack.EVENT_RACK_REPAIR, rack_id))
-                    for i in xrange(self.nodes_per_rack):
-                        # draw a bernoulli distribution
-                        if nprandom.binomial(1, 0.01):
-                            self.events_queue.append((occur_time, Node.EVENT_NODE_FAIL,
-                                                      (self.nodes_per_rack * rack_id + i)))
-                    occur_time += self.power_outage_dist.draw()
-
-        heapify(self.events_queue)
-        self.placement = Placement(self.num_racks, self.nodes_per_rack,
-                                   self.disks_per_node, self.capacity_per_disk,
-                                   self.num_stripes, self.chunk_size,
-                                   self.code_type, self.n, self.k,
-                                   self.place_type,
-                                   self.chunk_rack_config, self.l)
+                if self.timeline is None:
+                    events.extend(self.get_power_outage_events(rack_id))
+                else:
+                    events.extend(self.timeline.get_events(
+                        ("power_outage", rack_id, repr(self.power_outage_dist), self.power_outage_duration,
+                         self.nodes_per_rack, self.mission_time),
+                        lambda: self.get_power_outage_events(rack_id,
+                                                             self.timeline.get_stream(Rack.EVENT_RACK_FAIL))))
+
+        heapify(events)
+        self.events_queue = events
+        if placement is None:
+            self.placement = self.generate_placement()
+        else:
+            self.placement = placement
 
         self.network = Network(self.num_racks, self.nodes_per_rack, self.network_setting)
 
+        # The disks update the blocked ratio when they become unavailable or available
+        self.blocked_ratio = BlockedRatioAccumulator(self.placement.num_chunks, self.mission_time, self.br_buckets)
+        for disk_id in xrange(self.num_disks):
+            self.disks[disk_id].set_blocked_ratio(self.blocked_ratio, self.placement.get_num_chunks_per_disk(disk_id))
+
         self.num_stripes_repaired = 0
         self.num_stripes_repaired_single_chunk = 0
         self.num_stripes_delayed = 0
 
 
+    ##
+    # Generate the correlated failures of rack_id caused by power outage
+    #
+    # @param rng: the numpy RandomState to draw from (None for the global random streams)
+    #
+    def get_power_outage_events(self, rack_id, rng=None):
+        if rng is None:
+            draw_outage = self.power_outage_dist.draw
+            draw_duration = lambda: random.expovariate((1/float(self.power_outage_duration)))
+            draw_node_fail = lambda: nprandom.binomial(1, 0.01)
+        else:
+            draw_outage = lambda: float(self.power_outage_dist.draw_many(1, rng)[0])
+            draw_duration = lambda: rng.exponential(float(self.power_outage_duration))
+            draw_node_fail = lambda: rng.binomial(1, 0.01)
+
+        events = []
+        occur_time = float(0) + draw_outage()
+        while occur_time < self.mission_time:
+            events.append((occur_time, Rack.EVENT_RACK_FAIL, rack_id, 0))
+            occur_time += draw_duration()
+            events.append((occur_time, Rack.EVENT_RACK_REPAIR, rack_id, 0))
+            for i in xrange(self.nodes_per_rack):
+                # draw a bernoulli distribution
+                if draw_node_fail():
+                    events.append((occur_time, Node.EVENT_NODE_FAIL,
+                                   (self.nodes_per_rack * rack_id + i), 0))
+            occur_time += draw_outage()
+        return events
+
+
     ##
     # Generate permanent disk failure event
     #
     def set_disk_fail(self, disk_idx, curr_time):
-        heappush(self.events_queue, (self.disk_fail_dists.draw()+curr_time, Disk.EVENT_DISK_FAIL, disk_idx))
+        heappush(self.events_queue, (self.draw(Disk.EVENT_DISK_FAIL, self.disk_fail_dists, disk_idx)+curr_time,
+                                     Disk.EVENT_DISK_FAIL, disk_idx, 0))
 
 
     ##
@@ -144,8 +272,9 @@ class RegularSimulation(Simulation):
     def set_disk_repair(self, disk_idx, curr_time):
         if not self.use_network:
             # get the repair time from a pre-defined repair distribution
-            heappush(self.events_queue, (self.disk_repair_dists.draw()+curr_time,
-                                         Disk.EVENT_DISK_REPAIR, disk_idx))
+            heappush(self.events_queue, (self.draw(Disk.EVENT_DISK_REPAIR, self.disk_repair_dists,
+                                                   disk_idx)+curr_time,
+                                         Disk.EVENT_DISK_REPAIR, disk_idx, 0))
         else:
             # repair time = cross-rack repair traffic / available cross-rack bandwidth
             rack_id = disk_idx / (self.nodes_per_rack * self.disks_per_node)
@@ -253,7 +382,7 @@ class RegularSimulation(Simulation):
 
                 if len(stripes_to_delay) != 0:
                     self.num_stripes_delayed += len(stripes_to_delay)
-                    self.delayed_repair_dict[disk_idx] = stripes_to_delay
+                    self.set_delayed_repair(disk_idx, stripes_to_delay)
 
                 self.logger.debug("repair_time = %d, repair_bwth = %d" % (repair_time, repair_bwth))
                 heappush(self.events_queue, (repair_time+curr_time, Disk.EVENT_DISK_REPAIR, disk_idx, repair_bwth))
@@ -263,7 +392,35 @@ class RegularSimulation(Simulation):
     # Generate permanent node failure event
     #
     def set_node_fail(self, node_idx, curr_time):
-        heappush(self.events_queue, (self.node_fail_dists.draw()+curr_time, Node.EVENT_NODE_FAIL, node_idx))
+        heappush(self.events_queue, (self.draw(Node.EVENT_NODE_FAIL, self.node_fail_dists, node_idx)+curr_time,
+                                     Node.EVENT_NODE_FAIL, node_idx, 0))
+
+
+    ##
+    # Get the events of the next failure of node_idx in its trace, which is a
+    # permanent failure, or a transient failure together with its repair
+    #
+    def get_node_trace_events(self, node_idx, event_type):
+        if event_type == Node.EVENT_NODE_FAIL:
+            event = next(self.node_fail_traces[node_idx], None)
+            if event is None:
+                return []
+            return [(event[0], Node.EVENT_NODE_FAIL, node_idx, 0)]
+        else:
+            event = next(self.node_transient_fail_traces[node_idx], None)
+            if event is None:
+                return []
+            (fail_time, repair_time) = event
+            return [(fail_time, Node.EVENT_NODE_TRANSIENT_FAIL, node_idx, 0),
+                    (fail_time + repair_time, Node.EVENT_NODE_TRANSIENT_REPAIR, node_idx, 0)]
+
+
+    ##
+    # Generate the next failure of node_idx in its trace
+    #
+    def set_node_trace_fail(self, node_idx, event_type):
+        for event in self.get_node_trace_events(node_idx, event_type):
+            heappush(self.events_queue, event)
 
 
     ##
@@ -280,255 +437,323 @@ class RegularSimulation(Simulation):
     # Generate transient node failure event
     #
     def set_node_transient_fail(self, node_idx, curr_time):
-        heappush(self.events_queue, (self.nodes[node_idx].node_transient_fail_distr.draw()+curr_time,
-                                     Node.EVENT_NODE_TRANSIENT_FAIL, node_idx))
+        heappush(self.events_queue, (self.draw(Node.EVENT_NODE_TRANSIENT_FAIL,
+                                               self.nodes[node_idx].node_transient_fail_distr, node_idx)+curr_time,
+                                     Node.EVENT_NODE_TRANSIENT_FAIL, node_idx, 0))
 
 
     ##
     # Generate repair event for transient node failure
     #
     def set_node_transient_repair(self, node_idx, curr_time):
-        heappush(self.events_queue, (self.nodes[node_idx].node_transient_repair_distr.draw()+curr_time,
-                                     Node.EVENT_NODE_TRANSIENT_REPAIR, node_idx))
+        heappush(self.events_queue, (self.draw(Node.EVENT_NODE_TRANSIENT_REPAIR,
+                                               self.nodes[node_idx].node_transient_repair_distr, node_idx)+curr_time,
+                                     Node.EVENT_NODE_TRANSIENT_REPAIR, node_idx, 0))
 
 
     ##
     # Generate transient rack failure
     #
     def set_rack_fail(self, rack_idx, curr_time):
-        heappush(self.events_queue, (self.rack_fail_dists.draw()+curr_time, Rack.EVENT_RACK_FAIL, rack_idx))
+        heappush(self.events_queue, (self.draw(Rack.EVENT_RACK_FAIL, self.rack_fail_dists, rack_idx)+curr_time,
+                                     Rack.EVENT_RACK_FAIL, rack_idx, 0))
 
 
     ##
     # Generate repair for transient rack failure
     #
     def set_rack_repair(self, rack_idx, curr_time):
-        heappush(self.events_queue, (self.rack_repair_dists.draw()+curr_time, Rack.EVENT_RACK_REPAIR, rack_idx))
+        heappush(self.events_queue, (self.draw(Rack.EVENT_RACK_REPAIR, self.rack_repair_dists, rack_idx)+curr_time,
+                                     Rack.EVENT_RACK_REPAIR, rack_idx, 0))
 
 
     ##
-    # Get the next event from the event queue
+    # Keep the delayed stripes of the repair of disk_idx
     #
-    def get_next_event(self, curr_time):
-        self.logger.debug("len(delayed_repair_dict) = %d, len(wait_repair_queue) = %d" %
-                         (len(self.delayed_repair_dict), len(self.wait_repair_queue)))
-        # If there are some stripes delayed
-        if len(self.delayed_repair_dict) != 0:
-            items_to_remove = [] # keep the key of the items to remove
-            for key in self.delayed_repair_dict:
-                tmp_dict_value = []
-                for stripe_id in self.delayed_repair_dict[key]:
-                    repair_delay = False
-                    num_unavail_chunk = 0
-                    for disk_idx in self.placement.get_stripe_location(stripe_id):
-                        if self.disks[disk_idx].state != Disk.STATE_NORMAL:
-                            num_unavail_chunk += 1
-                        if num_unavail_chunk > (self.n - self.k):
-                            repair_delay = True
-                            break
-                    if repair_delay: # stripe whose repair is delayed
-                        tmp_dict_value.append(stripe_id)
-                if len(tmp_dict_value) == 0:
-                    items_to_remove.append(key)
+    def set_delayed_repair(self, disk_idx, stripes_to_delay):
+        self.delayed_repair_dict[disk_idx] = stripes_to_delay
+        for stripe_id in stripes_to_delay:
+            for disk_id in self.placement.get_stripe_location(stripe_id):
+                if disk_id in self.delayed_repair_index:
+                    self.delayed_repair_index[disk_id].add(disk_idx)
                 else:
-                    self.delayed_repair_dict[key] = tmp_dict_value
-            for key in items_to_remove:
+                    self.delayed_repair_index[disk_id] = set([disk_idx])
+
+
+    ##
+    # Check whether the repair of a stripe is delayed, i.e., more than n-k
+    # chunks of the stripe are unavailable
+    #
+    def is_repair_delayed(self, stripe_id):
+        num_unavail_chunk = 0
+        for disk_idx in self.placement.get_stripe_location(stripe_id):
+            if self.disks[disk_idx].state != Disk.STATE_NORMAL:
+                num_unavail_chunk += 1
+            if num_unavail_chunk > (self.n - self.k):
+                return True
+        return False
+
+
+    ##
+    # Check the delayed stripes with a chunk on disk_idx again when the disk
+    # becomes normal, and drop the stripes whose repair is not delayed any more
+    #
+    def recheck_delayed_repairs(self, disk_idx):
+        keys = self.delayed_repair_index.get(disk_idx)
+        if keys is None:
+            return
+        for key in list(keys):
+            if not self.delayed_repair_dict.has_key(key):
+                keys.discard(key)
+                continue
+            stripes_to_delay = [stripe_id for stripe_id in self.delayed_repair_dict[key]
+                                if self.is_repair_delayed(stripe_id)]
+            if len(stripes_to_delay) == 0:
                 self.delayed_repair_dict.pop(key)
+                keys.discard(key)
+            else:
+                self.delayed_repair_dict[key] = stripes_to_delay
+        if len(keys) == 0:
+            self.delayed_repair_index.pop(disk_idx)
+
 
-        # If there are some failed disks awaiting repair
-        if len(self.wait_repair_queue) != 0:
-            disk_id = self.wait_repair_queue[0][1]
+    ##
+    # Start the repairs of the failed disks awaiting repair in the order of
+    # their failures, as long as there is available cross-rack bandwidth.
+    # The disks whose racks are unavailable keep waiting without blocking
+    # the disks behind them.
+    #
+    # It is called when the bandwidth is returned or a rack is repaired.
+    #
+    def release_waiting_repairs(self, curr_time):
+        blocked = []
+        while len(self.wait_repair_queue) != 0 and self.network.get_avail_cross_rack_repair_bwth() != 0:
+            (wait_time, disk_id) = heappop(self.wait_repair_queue)
             rack_id = disk_id / (self.nodes_per_rack * self.disks_per_node)
-            if self.use_network and self.network.get_avail_cross_rack_repair_bwth() != 0 and \
-                self.network.get_avail_intra_rack_repair_bwth(rack_id) != 0 and \
+            if self.network.get_avail_intra_rack_repair_bwth(rack_id) != 0 and \
                 self.racks[rack_id].get_curr_state() == Rack.STATE_RACK_NORMAL:
-                heappop(self.wait_repair_queue)
                 self.set_disk_repair(disk_id, curr_time)
+            else:
+                blocked.append((wait_time, disk_id))
+        for each in blocked:
+            heappush(self.wait_repair_queue, each)
 
+
+    ##
+    # Get the next event from the event queue
+    #
+    def get_next_event(self, curr_time):
+        self.logger.debug("len(delayed_repair_dict) = %d, len(wait_repair_queue) = %d" %
+                         (len(self.delayed_repair_dict), len(self.wait_repair_queue)))
         next_event = heappop(self.events_queue)
         next_event_time = next_event[0]
         next_event_type = next_event[1]
         if next_event_time > self.mission_time:
             return (next_event_time, None, None)
 
-        device_idx_set = []
-        device_idx_set.append(next_event[2])
-        repair_bwth_set = []
-        # If use network bandwidth to calculate repair_time
-        if self.use_network and next_event_type == Disk.EVENT_DISK_REPAIR:
-            repair_bwth_set.append(next_event[3])
+        device_idx_set = [next_event[2]]
+        payload_set = [next_event[3]]
 
         # Gather the events with the same occurring time and event type
-        while self.events_queue[0][0] == next_event_time and self.events_queue[0][1] == next_event_type:
-            next_event = heappop(self.events_queue)
+        events_queue = self.events_queue
+        while len(events_queue) != 0 and events_queue[0][0] == next_event_time and \
+                events_queue[0][1] == next_event_type:
+            next_event = heappop(events_queue)
             device_idx_set.append(next_event[2])
-            if self.use_network and next_event_type == Disk.EVENT_DISK_REPAIR:
-                repair_bwth_set.append(next_event[3])
-
-        # disk permanent failure
-        if next_event_type == Disk.EVENT_DISK_FAIL:
-            fail_time = next_event_time
-            for device_idx in device_idx_set:
-                # avoid the case that this disk is under repair
-                if self.disks[device_idx].get_curr_state() != Disk.STATE_CRASHED:
-                    if self.delayed_repair_dict.has_key(device_idx):
-                        self.delayed_repair_dict.pop(device_idx)
-                    # update the state of the disk
-                    self.disks[device_idx].fail_disk(fail_time)
-                    # generate the repair event
-                    self.set_disk_repair(device_idx, fail_time)
-            return (fail_time, Disk.EVENT_DISK_FAIL, device_idx_set)
-
-        # node permanent failure
-        elif next_event_type == Node.EVENT_NODE_FAIL:
-            failed_disks_set = set([])
-            fail_time = next_event_time
-            for device_idx in device_idx_set:
-                # avoid the case that the node is under repair
-                if self.nodes[device_idx].get_curr_state() != Node.STATE_NODE_CRASHED:
-                    # update the state of node
-                    self.nodes[device_idx].fail_node(fail_time)
-                    for i in xrange(self.disks_per_node):
-                        disk_idx = device_idx * self.disks_per_node + i
-                        failed_disks_set.add(disk_idx)
-                        # avoid the case that the disk is under repair
-                        if self.disks[disk_idx].get_curr_state() != Disk.STATE_CRASHED:
-                            if self.delayed_repair_dict.has_key(device_idx):
-                                self.delayed_repair_dict.pop(device_idx)
-                            # update the state of the disk
-                            self.disks[disk_idx].fail_disk(fail_time)
-                            # generate the repair event
-                            self.set_disk_repair(disk_idx, fail_time)
-            return (fail_time, Node.EVENT_NODE_FAIL, failed_disks_set)
-
-        # node transient failure
-        elif next_event_type == Node.EVENT_NODE_TRANSIENT_FAIL:
-            fail_time = next_event_time
-            for device_idx in device_idx_set:
-                if self.nodes[device_idx].get_curr_state() == Node.STATE_NODE_NORMAL:
-                    # update the state of node
-                    self.nodes[device_idx].offline_node()
-                    for i in xrange(self.disks_per_node):
-                        disk_id = device_idx * self.disks_per_node + i
-                        if self.disks[disk_id].get_curr_state() == Disk.STATE_NORMAL:
-                            # update the state of disk
-                            self.disks[disk_id].offline_disk(fail_time)
-                # generate the repair event
-                if not self.use_trace:
-                    self.set_node_transient_repair(device_idx, fail_time)
-
-            return (fail_time, Node.EVENT_NODE_TRANSIENT_FAIL, None)
-
-        # transient rack failure
-        elif next_event_type == Rack.EVENT_RACK_FAIL:
-            fail_time = next_event_time
-            for device_idx in device_idx_set:
-                if self.racks[device_idx].get_curr_state() == Rack.STATE_RACK_NORMAL:
-                    # update the state of the rack
-                    self.racks[device_idx].fail_rack(fail_time)
-                    for i in xrange(self.nodes_per_rack):
-                        # update the state of the node
-                        node_idx = device_idx * self.nodes_per_rack + i
-                        if self.nodes[node_idx].get_curr_state() == Node.STATE_NODE_NORMAL:
-                            self.nodes[node_idx].offline_node()
-                            for j in xrange(self.disks_per_node):
-                                # update the state of the disk
-                                disk_idx = node_idx * self.disks_per_node + j
-                                if self.disks[disk_idx].get_curr_state() == Disk.STATE_NORMAL:
-                                    self.disks[disk_idx].offline_disk(fail_time)
-                # generate the repair event
-                if not self.use_power_outage:
-                    self.set_rack_repair(device_idx, fail_time)
-
-            return (fail_time, Rack.EVENT_RACK_FAIL, None)
-
-        # repair for permanent disk failure
-        elif next_event_type == Disk.EVENT_DISK_REPAIR:
-            repair_time = next_event_time
-            for repair_disk_idx in device_idx_set:
-                if self.disks[repair_disk_idx].get_curr_state() == Disk.STATE_CRASHED:
-                    # update the state of the disk
-                    self.disks[repair_disk_idx].repair_disk(repair_time)
-                    # generate next permanent disk failure
-                    self.set_disk_fail(repair_disk_idx, repair_time)
-
-                # if the repair event is caused by permanent node failure
-                node_idx = repair_disk_idx / self.disks_per_node
-                if self.nodes[node_idx].get_curr_state() == Node.STATE_NODE_CRASHED:
-                    all_disk_ok = True
-                    for i in xrange(self.disks_per_node):
-                        disk = self.disks[node_idx * self.disks_per_node + i]
-                        if disk.get_curr_state() != disk.STATE_NORMAL:
-                            all_disk_ok = False
-                            break
-                    if all_disk_ok:
-                        # update the state of the node
-                        self.nodes[node_idx].repair_node()
-                        # generate next permanent node failure
-                        if not self.use_trace:
-                            self.set_node_fail(node_idx, repair_time)
-            # update the network status
-            if self.use_network:
-                idx = 0
-                for repair_disk_idx in device_idx_set:
-                    repair_bwth = repair_bwth_set[idx]
-                    self.network.update_avail_cross_rack_repair_bwth(
-                        self.network.get_avail_cross_rack_repair_bwth() + repair_bwth)
-                    idx += 1
-
-            # return the set of repaired disks
-            return (repair_time, Disk.EVENT_DISK_REPAIR, device_idx_set)
-
-        # repair for node transient failure
-        elif next_event_type == Node.EVENT_NODE_TRANSIENT_REPAIR:
-            repair_time = next_event_time
-            for repair_node_idx in device_idx_set:
-                # update the state of the node
-                if self.nodes[repair_node_idx].get_curr_state() == Node.STATE_NODE_UNAVAILABLE:
-                    self.nodes[repair_node_idx].online_node()
-                    # update the state of the disk
-                    for i in xrange(self.disks_per_node):
-                        disk_id = repair_node_idx * self.disks_per_node + i
-                        if self.disks[disk_id].get_curr_state() == Disk.STATE_UNAVAILABLE:
-                            self.disks[disk_id].online_disk(repair_time)
-                # generate the next transient node failure
-                if not self.use_trace:
-                    self.set_node_transient_fail(repair_node_idx, repair_time)
-            return (repair_time, Node.EVENT_NODE_TRANSIENT_REPAIR, None)
-
-        # repair for rack transient failure
-        elif next_event_type == Rack.EVENT_RACK_REPAIR:
-            repair_time = next_event_time
-            for repair_rack_idx in device_idx_set:
-                if self.racks[repair_rack_idx].get_curr_state() == Rack.STATE_RACK_UNAVAILABLE:
-                    # update the state of the rack
-                    self.racks[repair_rack_idx].repair_rack()
-                    for i in xrange(self.nodes_per_rack):
-                        node_idx = repair_rack_idx * self.nodes_per_rack + i
-                        # update the state of the node
-                        if self.nodes[node_idx].get_curr_state() == Node.STATE_NODE_UNAVAILABLE:
-                            self.nodes[node_idx].online_node()
-                            for j in xrange(self.disks_per_node):
-                                disk_idx = node_idx * self.disks_per_node + j
-                                # update the state of the disk
-                                if self.disks[disk_idx].get_curr_state() == Disk.STATE_UNAVAILABLE:
-                                    self.disks[disk_idx].online_disk(repair_time)
-                # generate the next transient rack failure
-                if not self.use_power_outage:
-                    self.set_rack_fail(repair_rack_idx, repair_time)
-
-            return (repair_time, Rack.EVENT_RACK_REPAIR, None)
+            payload_set.append(next_event[3])
 
-        else:
+        handler = self.event_handlers[next_event_type]
+        if handler is None:
             self.logger.error('Wrong type of next_event in get_next_event()!')
             return None
+        return handler(next_event_time, device_idx_set, payload_set)
+
+
+    ##
+    # Handle permanent disk failures
+    #
+    def handle_disk_fail(self, fail_time, device_idx_set, payload_set):
+        for device_idx in device_idx_set:
+            # avoid the case that this disk is under repair
+            if self.disks[device_idx].get_curr_state() != Disk.STATE_CRASHED:
+                if self.delayed_repair_dict.has_key(device_idx):
+                    self.delayed_repair_dict.pop(device_idx)
+                # update the state of the disk
+                self.disks[device_idx].fail_disk(fail_time)
+                # generate the repair event
+                self.set_disk_repair(device_idx, fail_time)
+        return (fail_time, Disk.EVENT_DISK_FAIL, device_idx_set)
+
+
+    ##
+    # Handle permanent node failures
+    #
+    def handle_node_fail(self, fail_time, device_idx_set, payload_set):
+        failed_disks_set = set([])
+        for device_idx in device_idx_set:
+            # avoid the case that the node is under repair
+            if self.nodes[device_idx].get_curr_state() != Node.STATE_NODE_CRASHED:
+                # update the state of node
+                self.nodes[device_idx].fail_node(fail_time)
+                for i in xrange(self.disks_per_node):
+                    disk_idx = device_idx * self.disks_per_node + i
+                    failed_disks_set.add(disk_idx)
+                    # avoid the case that the disk is under repair
+                    if self.disks[disk_idx].get_curr_state() != Disk.STATE_CRASHED:
+                        if self.delayed_repair_dict.has_key(device_idx):
+                            self.delayed_repair_dict.pop(device_idx)
+                        # update the state of the disk
+                        self.disks[disk_idx].fail_disk(fail_time)
+                        # generate the repair event
+                        self.set_disk_repair(disk_idx, fail_time)
+            # generate the next node failure in the trace
+            if self.use_trace:
+                self.set_node_trace_fail(device_idx, Node.EVENT_NODE_FAIL)
+        return (fail_time, Node.EVENT_NODE_FAIL, failed_disks_set)
+
+
+    ##
+    # Handle transient node failures
+    #
+    def handle_node_transient_fail(self, fail_time, device_idx_set, payload_set):
+        for device_idx in device_idx_set:
+            if self.nodes[device_idx].get_curr_state() == Node.STATE_NODE_NORMAL:
+                # update the state of node
+                self.nodes[device_idx].offline_node()
+                for i in xrange(self.disks_per_node):
+                    disk_id = device_idx * self.disks_per_node + i
+                    if self.disks[disk_id].get_curr_state() == Disk.STATE_NORMAL:
+                        # update the state of disk
+                        self.disks[disk_id].offline_disk(fail_time)
+            # generate the repair event
+            if not self.use_trace:
+                self.set_node_transient_repair(device_idx, fail_time)
+            else:
+                # generate the next transient failure in the trace with its repair
+                self.set_node_trace_fail(device_idx, Node.EVENT_NODE_TRANSIENT_FAIL)
+
+        return (fail_time, Node.EVENT_NODE_TRANSIENT_FAIL, None)
+
+
+    ##
+    # Handle transient rack failures
+    #
+    def handle_rack_fail(self, fail_time, device_idx_set, payload_set):
+        for device_idx in device_idx_set:
+            if self.racks[device_idx].get_curr_state() == Rack.STATE_RACK_NORMAL:
+                # update the state of the rack
+                self.racks[device_idx].fail_rack(fail_time)
+                for i in xrange(self.nodes_per_rack):
+                    # update the state of the node
+                    node_idx = device_idx * self.nodes_per_rack + i
+                    if self.nodes[node_idx].get_curr_state() == Node.STATE_NODE_NORMAL:
+                        self.nodes[node_idx].offline_node()
+                        for j in xrange(self.disks_per_node):
+                            # update the state of the disk
+                            disk_idx = node_idx * self.disks_per_node + j
+                            if self.disks[disk_idx].get_curr_state() == Disk.STATE_NORMAL:
+                                self.disks[disk_idx].offline_disk(fail_time)
+            # generate the repair event
+            if not self.use_power_outage:
+                self.set_rack_repair(device_idx, fail_time)
+
+        return (fail_time, Rack.EVENT_RACK_FAIL, None)
+
+
+    ##
+    # Handle repairs for permanent disk failures
+    # The payload of each repair is the repair bandwidth it holds
+    #
+    def handle_disk_repair(self, repair_time, device_idx_set, payload_set):
+        for repair_disk_idx in device_idx_set:
+            if self.disks[repair_disk_idx].get_curr_state() == Disk.STATE_CRASHED:
+                # update the state of the disk
+                self.disks[repair_disk_idx].repair_disk(repair_time)
+                self.recheck_delayed_repairs(repair_disk_idx)
+                # generate next permanent disk failure
+                self.set_disk_fail(repair_disk_idx, repair_time)
+
+            # if the repair event is caused by permanent node failure
+            node_idx = repair_disk_idx / self.disks_per_node
+            if self.nodes[node_idx].get_curr_state() == Node.STATE_NODE_CRASHED:
+                all_disk_ok = True
+                for i in xrange(self.disks_per_node):
+                    disk = self.disks[node_idx * self.disks_per_node + i]
+                    if disk.get_curr_state() != disk.STATE_NORMAL:
+                        all_disk_ok = False
+                        break
+                if all_disk_ok:
+                    # update the state of the node
+                    self.nodes[node_idx].repair_node()
+                    # generate next permanent node failure
+                    if not self.use_trace:
+                        self.set_node_fail(node_idx, repair_time)
+        # update the network status
+        if self.use_network:
+            for repair_bwth in payload_set:
+                self.network.update_avail_cross_rack_repair_bwth(
+                    self.network.get_avail_cross_rack_repair_bwth() + repair_bwth)
+            # start the repairs awaiting the bandwidth
+            self.release_waiting_repairs(repair_time)
+
+        # return the set of repaired disks
+        return (repair_time, Disk.EVENT_DISK_REPAIR, device_idx_set)
+
+
+    ##
+    # Handle repairs for transient node failures
+    #
+    def handle_node_transient_repair(self, repair_time, device_idx_set, payload_set):
+        for repair_node_idx in device_idx_set:
+            # update the state of the node
+            if self.nodes[repair_node_idx].get_curr_state() == Node.STATE_NODE_UNAVAILABLE:
+                self.nodes[repair_node_idx].online_node()
+                # update the state of the disk
+                for i in xrange(self.disks_per_node):
+                    disk_id = repair_node_idx * self.disks_per_node + i
+                    if self.disks[disk_id].get_curr_state() == Disk.STATE_UNAVAILABLE:
+                        self.disks[disk_id].online_disk(repair_time)
+                        self.recheck_delayed_repairs(disk_id)
+            # generate the next transient node failure
+            if not self.use_trace:
+                self.set_node_transient_fail(repair_node_idx, repair_time)
+        return (repair_time, Node.EVENT_NODE_TRANSIENT_REPAIR, None)
+
+
+    ##
+    # Handle repairs for transient rack failures
+    #
+    def handle_rack_repair(self, repair_time, device_idx_set, payload_set):
+        for repair_rack_idx in device_idx_set:
+            if self.racks[repair_rack_idx].get_curr_state() == Rack.STATE_RACK_UNAVAILABLE:
+                # update the state of the rack
+                self.racks[repair_rack_idx].repair_rack()
+                for i in xrange(self.nodes_per_rack):
+                    node_idx = repair_rack_idx * self.nodes_per_rack + i
+                    # update the state of the node
+                    if self.nodes[node_idx].get_curr_state() == Node.STATE_NODE_UNAVAILABLE:
+                        self.nodes[node_idx].online_node()
+                        for j in xrange(self.disks_per_node):
+                            disk_idx = node_idx * self.disks_per_node + j
+                            # update the state of the disk
+                            if self.disks[disk_idx].get_curr_state() == Disk.STATE_UNAVAILABLE:
+                                self.disks[disk_idx].online_disk(repair_time)
+                                self.recheck_delayed_repairs(disk_idx)
+            # generate the next transient rack failure
+            if not self.use_power_outage:
+                self.set_rack_fail(repair_rack_idx, repair_time)
+        # start the repairs awaiting the repaired racks
+        if self.use_network:
+            self.release_waiting_repairs(repair_time)
+
+        return (repair_time, Rack.EVENT_RACK_REPAIR, None)
 
 
     ##
     # Run an iteration of the simulator
     #
-    def run_iteration(self, ite=0):
-        self.reset()
+    def run_iteration(self, ite=0, placement=None):
+        self.reset(ite, placement)
         curr_time = 0
 
         self.logger.info("Regular Simulator: begin an iteration %d, num_failed_disks = %d, "
@@ -546,13 +771,13 @@ class RegularSimulation(Simulation):
                 self.logger.error('update_state failed!')
             if event_type != None:
                 self.logger.debug("Time %s, Event type: %s, Number of failed disks: %s\n" %
-                              (event_time, event_type, self.state.get_num_failed_disks()))
+                              (event_time, EVENT_NAMES[event_type], self.state.get_num_failed_disks()))
 
             # Check durability when disk_failure/node_failure happens
             if event_type == Disk.EVENT_DISK_FAIL or event_type == Node.EVENT_NODE_FAIL:
                 if ite == 1:
                     self.logger.info("Time %s, Event type: %s, Number of failed disks: %s\n" %
-                                  (event_time, event_type, self.state.get_num_failed_disks()))
+                                  (event_time, EVENT_NAMES[event_type], self.state.get_num_failed_disks()))
                 failed_disks = self.state.get_failed_disks()
                 if self.placement.check_data_loss(failed_disks):
                     # the number of failed stripes and the number of lost chunks
@@ -563,11 +788,7 @@ class RegularSimulation(Simulation):
                             num_failed_stripes += len(self.delayed_repair_dict[key])
                             num_lost_chunks += len(self.delayed_repair_dict[key])
                     # Calculate blocked ratio
-                    sum_unavail_time = 0
-                    for disk_id in xrange(self.num_disks):
-                        sum_unavail_time += self.disks[disk_id].get_unavail_time(curr_time) * \
-                                            self.placement.get_num_chunks_per_disk(disk_id)
-                    blocked_ratio = sum_unavail_time / (self.placement.num_chunks * curr_time)
+                    blocked_ratio = self.blocked_ratio.get_blocked_ratio(curr_time)
                     # Calculate the single-chunk repair ratio
                     single_chunk_repair_ratio = 0
                     self.logger.info("num_stripes_repaired_single_chunk = %d, num_stripes_repaired = %d" %
@@ -577,20 +798,34 @@ class RegularSimulation(Simulation):
                         single_chunk_repair_ratio = float(self.num_stripes_repaired_single_chunk) / \
                                                     float(self.num_stripes_repaired)
 
-                    return (1, "(%d, %d, %f, %f)" % (num_failed_stripes, num_lost_chunks, blocked_ratio,
-                                                     single_chunk_repair_ratio))
+                    return self.get_result(1, "(%d, %d, %f, %f)" % (num_failed_stripes, num_lost_chunks,
+                                                                    blocked_ratio, single_chunk_repair_ratio),
+                                           curr_time)
 
         # No data loss
         # Calculate blocked ratio
-        sum_unavail_time = 0
-        for disk_id in xrange(self.num_disks):
-            sum_unavail_time += self.disks[disk_id].get_unavail_time(self.mission_time) * \
-                                self.placement.get_num_chunks_per_disk(disk_id)
-        blocked_ratio = sum_unavail_time / (self.placement.num_chunks * self.mission_time)
+        blocked_ratio = self.blocked_ratio.get_blocked_ratio(self.mission_time)
         # Calculate the single-chunk repair ratio
         single_chunk_repair_ratio = 0
         if self.num_stripes_repaired != 0:
             single_chunk_repair_ratio = float(self.num_stripes_repaired_single_chunk) / \
                                         float(self.num_stripes_repaired)
 
-        return (0, "(0, 0, %f, %f)" % (blocked_ratio, single_chunk_repair_ratio))
+        return self.get_result(0, "(0, 0, %f, %f)" % (blocked_ratio, single_chunk_repair_ratio), self.mission_time)
+
+
+    ##
+    # Return the result of an iteration, which ends at end_time
+    # The extra outputs of the iteration are appended in a dict if enabled
+    #
+    def get_result(self, sample, ori_pattern, end_time):
+        extras = dict()
+        if self.br_buckets != 0:
+            extras["br_series"] = self.blocked_ratio.get_blocked_ratio_series(end_time)
+        if self.control_variate:
+            extras["num_early_failures"] = self.num_early_failures
+        if self.report_loss_time and sample != 0:
+            extras["loss_time"] = end_time
+        if len(extras) == 0:
+            return (sample, ori_pattern)
+        return (sample, ori_pattern, extras)
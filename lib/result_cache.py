@@ -0,0 +1,157 @@
+##
+# A local store of finished iteration batches, which is keyed by a
+# canonical hash of the simulated configuration.
+#
+# Each batch is kept in <cache_dir>/<key>/<seed>-<num_iterations>.txt.
+# The first line of the file is the sufficient statistics of the batch and
+# the second line is the list of results of the iterations, both as Python
+# literals written by encode_literal().
+#
+
+import os
+import ast
+import math
+import hashlib
+
+from lib.coordinator import encode_literal
+
+##
+# Source files whose contents define the version of the simulator
+#
+def get_code_version(root_dir=None):
+    if root_dir is None:
+        root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    file_names = [os.path.join(root_dir, "simedc.py")]
+    for dir_name in [os.path.join(root_dir, "lib"), os.path.join(root_dir, "lib", "tracelib")]:
+        for file_name in sorted(os.listdir(dir_name)):
+            if file_name.endswith(".py"):
+                file_names.append(os.path.join(dir_name, file_name))
+
+    sha = hashlib.sha1()
+    for file_name in file_names:
+        if os.path.exists(file_name):
+            with open(file_name, "rb") as f:
+                sha.update(f.read())
+    return sha.hexdigest()
+
+
+class ResultCache:
+
+    def __init__(self, cache_dir, code_version=None):
+        self.cache_dir = cache_dir
+        if code_version is None:
+            code_version = get_code_version()
+        self.code_version = code_version
+
+
+    ##
+    # Get the key of a configuration
+    #
+    # @param params_tuple: the simulation parameters from get_parms()
+    # @param dists: the failure and repair distributions of the configuration
+    #
+    def get_key(self, params_tuple, dists):
+        canonical = repr((tuple(params_tuple), tuple(dists), self.code_version))
+        return hashlib.sha1(canonical).hexdigest()
+
+
+    def get_key_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+
+    ##
+    # Return the list of (stats, results) of the cached batches of key,
+    # which is sorted by the seed of the batch
+    #
+    def load_batches(self, key):
+        key_dir = self.get_key_dir(key)
+        batches = []
+        if not os.path.isdir(key_dir):
+            return batches
+
+        for file_name in os.listdir(key_dir):
+            if not file_name.endswith(".txt"):
+                continue
+            with open(os.path.join(key_dir, file_name), "r") as f:
+                lines = f.readlines()
+            # skip the batch that was not completely written or cannot be read
+            if len(lines) != 2:
+                continue
+            try:
+                stats = ast.literal_eval(lines[0].strip())
+                results = ast.literal_eval(lines[1].strip())
+                if stats["iterations"] != len(results):
+                    continue
+            except (ValueError, SyntaxError, TypeError, KeyError):
+                continue
+            batches.append((stats, results))
+
+        batches.sort(key=lambda batch: batch[0]["seed"])
+        return batches
+
+
+    ##
+    # Store a finished batch of iterations and return its sufficient statistics
+    #
+    def save_batch(self, key, seed, results):
+        key_dir = self.get_key_dir(key)
+        if not os.path.isdir(key_dir):
+            try:
+                os.makedirs(key_dir)
+            except OSError:
+                if not os.path.isdir(key_dir):
+                    raise
+
+        stats = self.get_stats(seed, results)
+        file_name = os.path.join(key_dir, "%d-%d.txt" % (seed, len(results)))
+        tmp_file_name = file_name + ".tmp.%d" % os.getpid()
+        with open(tmp_file_name, "w") as f:
+            f.write(encode_literal(stats) + "\n")
+            f.write(encode_literal([(float(each[0]),) + tuple(each[1:]) for each in results]) + "\n")
+        os.rename(tmp_file_name, file_name)
+        return stats
+
+
+    ##
+    # Sufficient statistics of the samples of a batch
+    #
+    def get_stats(self, seed, results):
+        stats = {"seed": seed, "iterations": len(results),
+                 "num_zeroes": 0, "sum": float(0), "sum_sq": float(0)}
+        for each in results:
+            sample = float(each[0])
+            if sample == 0:
+                stats["num_zeroes"] += 1
+            stats["sum"] += sample
+            stats["sum_sq"] += sample * sample
+        return stats
+
+
+##
+# Sufficient statistics of no samples, which the statistics of batches are added to
+#
+def new_stats():
+    return {"iterations": 0, "num_zeroes": 0, "sum": float(0), "sum_sq": float(0)}
+
+
+def add_stats(totals, stats):
+    for name in ["iterations", "num_zeroes", "sum", "sum_sq"]:
+        totals[name] += stats[name]
+
+
+##
+# Relative error (%) of the mean of the samples from their sufficient
+# statistics, or None if all the samples are zeroes
+#
+# @param z: quantile of the confidence level, e.g., 1.96 for 95%
+#
+def get_relative_error(stats, z):
+    num = stats["iterations"]
+    if stats["num_zeroes"] == num:
+        return None
+    mean = stats["sum"] / num
+    if num == 1:
+        return float(0)
+    variance = max(stats["sum_sq"] - num * mean * mean, 0) / (num - 1)
+    return 100. * z * math.sqrt(variance / num) / mean
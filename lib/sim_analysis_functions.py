@@ -129,6 +129,136 @@ class Samples:
 	def get_num_zeroes(self):
 		return self.num_zeroes
 
+
+#
+# Samples that can be negative, e.g., the differences of paired samples,
+# whose statistics are signed
+#
+class SignedSamples(Samples):
+
+	#
+	# Calculate the sample mean
+	#
+	def calcMean(self):
+		sum = mpf(0)
+		for sample in self.samples:
+			sum += sample
+
+		self.sample_mean = sum / self.num_samples
+
+		return self.sample_mean
+
+	#
+	# Calculate the standard deviation, which is not 0 when the mean is 0
+	#
+	def calcStdDev(self):
+		sample_mean = self.calcMean()
+		sum = mpf(0)
+		for sample in self.samples:
+			sum += power(sample - sample_mean, 2)
+
+		if self.num_samples == 1:
+			self.std_dev = mpf(0)
+		else:
+			self.std_dev = sqrt((mpf(1)/(self.num_samples-1)) * sum)
+
+		return self.std_dev
+
+	#
+	# Calculate the (signed) confidence interval around the sample mean
+	#
+	def calcConfInterval(self, conf_level="0.90"):
+		if conf_level not in self.conf_lvl_lku.keys():
+			print "%s not a valid confidence level!" % conf_level
+			return None
+
+		self.calcStdDev()
+		half_width = self.conf_lvl_lku[conf_level] * (self.std_dev / sqrt(self.num_samples))
+
+		return (self.sample_mean - half_width, self.sample_mean + half_width)
+
+#
+# The differences of paired samples of two configurations, e.g., the
+# iterations of the configurations that replay the same failures
+#
+class PairedSamples(SignedSamples):
+
+	#
+	# @param samples_a: the samples of the first configuration
+	# @param samples_b: the samples of the second configuration, where
+	#                   samples_b[i] is paired with samples_a[i]
+	#
+	def __init__(self, samples_a, samples_b):
+		if len(samples_a) != len(samples_b):
+			raise ValueError("The paired samples must have the same length!")
+		SignedSamples.__init__(self, [b - a for (a, b) in zip(samples_a, samples_b)])
+		self.samples_a = Samples(samples_a)
+		self.samples_b = Samples(samples_b)
+
+	#
+	# Ratio of the variance of the difference of independent runs to that
+	# of the paired runs, i.e., how many times of iterations the independent
+	# runs need for the same confidence interval (0 if the differences are
+	# all the same)
+	#
+	def calcVarianceReduction(self):
+		var_paired = power(self.calcStdDev(), 2)
+		if var_paired == 0:
+			return mpf(0)
+		var_a = power(self.samples_a.calcStdDev(), 2)
+		var_b = power(self.samples_b.calcStdDev(), 2)
+		return (var_a + var_b) / var_paired
+
+#
+# Samples adjusted by a control variate, i.e., a quantity of each sample
+# whose expectation is known:
+#
+#   sample - beta * (control - control_mean)
+#
+# where beta = Cov(sample, control) / Var(control) minimizes the variance.
+# The adjusted mean is unbiased if control_mean is exact.
+#
+class ControlVariateSamples(SignedSamples):
+
+	#
+	# @param samples: the raw samples
+	# @param controls: the control variate of each sample
+	# @param control_mean: the expectation of the control variate
+	#
+	def __init__(self, samples, controls, control_mean):
+		if len(samples) != len(controls):
+			raise ValueError("Each sample must have a control variate!")
+		self.raw = Samples(samples)
+		self.control_mean = mpf(control_mean)
+
+		num_samples = mpf(len(samples))
+		sample_mean = mpf(0)
+		controls_mean = mpf(0)
+		for idx in xrange(len(samples)):
+			sample_mean += samples[idx]
+			controls_mean += controls[idx]
+		sample_mean /= num_samples
+		controls_mean /= num_samples
+
+		cov = mpf(0)
+		var_control = mpf(0)
+		var_sample = mpf(0)
+		for idx in xrange(len(samples)):
+			cov += (samples[idx] - sample_mean) * (controls[idx] - controls_mean)
+			var_control += power(controls[idx] - controls_mean, 2)
+			var_sample += power(samples[idx] - sample_mean, 2)
+
+		self.controls_mean = controls_mean
+		self.beta = mpf(0)
+		self.correlation = mpf(0)
+		if var_control != 0:
+			self.beta = cov / var_control
+			if var_sample != 0:
+				self.correlation = cov / sqrt(var_control * var_sample)
+
+		SignedSamples.__init__(self, [samples[idx] - self.beta * (controls[idx] - self.control_mean)
+		                              for idx in xrange(len(samples))])
+
 #
 # Generate samples from a known distribution and verify the statistics
 #
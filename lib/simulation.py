@@ -4,6 +4,7 @@
 import sys
 from smp_data_structures import Rack, Node, Disk
 from network import Network
+from placement import Placement
 
 ##
 # Container for importance sampling parameters
@@ -17,6 +18,8 @@ class ISParms:
 class Simulation:
     REGULAR="regular"
     UNIFBFB = "uniformization_balanced_failure_biasing"
+    BATCHED = "batched"
+    MARKOV = "markov"
     FAILURE="failure"
     REPAIR="repair"
 
@@ -90,7 +93,7 @@ class Simulation:
             self.nodes = [Node(self.node_fail_dists, self.node_transient_fail_dists ,
                                self.node_transient_repair_dists) for i in xrange(self.num_nodes)]
         else:
-            # It will generate in reset() of Regular Simualtion
+            # It will generate in init() of Regular Simualtion
             self.nodes = [Node(None, None, None) for i in xrange(self.num_nodes)]
 
         self.disks = [Disk(self.disk_fail_dists, None) for i in xrange(self.num_disks)]
@@ -106,10 +109,23 @@ class Simulation:
         return None
 
 
+    ##
+    # Generate a new placement of the stripes for this topology and code
+    #
+    def generate_placement(self):
+        return Placement(self.num_racks, self.nodes_per_rack,
+                         self.disks_per_node, self.capacity_per_disk,
+                         self.num_stripes, self.chunk_size,
+                         self.code_type, self.n, self.k,
+                         self.place_type,
+                         self.chunk_rack_config, self.l)
+
+
     ##
     # Reset the simulator
+    # If placement is None, a new placement is generated
     #
-    def reset(self, ite_count=0):
+    def reset(self, ite_count=0, placement=None):
         return None
 
 
@@ -123,5 +139,5 @@ class Simulation:
     ##
     # Run an iteration of the simulator
     #
-    def run_iteration(self, ite_count=0):
+    def run_iteration(self, ite_count=0, placement=None):
         return None
@@ -14,6 +14,8 @@ from mpmath import mpf
 from mpmath import ln
 from mpmath import findroot
 import random
+import weakref
+import numpy.random as nprandom
 
 
 ##
@@ -22,6 +24,23 @@ import random
 mpmath.mp.prec += 100
 mpmath.mp.dps = 100
 
+##
+# Number of values drawn at once to refill the buffer of a distribution
+#
+DRAW_BUFFER_SIZE = 65536
+
+# All the Weibull objects, whose buffers are dropped by reset_draw_buffers()
+all_weibulls = weakref.WeakSet()
+
+##
+# Drop the buffered draws of all the distributions, so the values drawn
+# next come from the random stream after it is seeded
+#
+def reset_draw_buffers():
+    for dist in all_weibulls:
+        dist.reset_buffer()
+
+
 ##
 # Contains parameters, distribution functions and hazard rate function
 # for a 3-parameter Weibull distribution based on shape, scale and location.
@@ -37,6 +56,15 @@ class Weibull:
         self.scale = float(scale)
         self.location = float(location)
 
+        # values drawn in advance by numpy and handed out by draw()
+        self.buffer = []
+        self.buffer_pos = 0
+        all_weibulls.add(self)
+
+
+    def __repr__(self):
+        return "Weibull(shape=%r, scale=%r, location=%r)" % (self.shape, self.scale, self.location)
+
 
     ##
     # Get the probability density of Weibull(shape, scale, location) at x
@@ -96,6 +124,38 @@ class Weibull:
             return float(abs(self.pdf_eval(x) / (float(1) - self.cdf_eval(x))))
 
 
+    ##
+    # Return the mean of Weibull(shape, scale, location)
+    #
+    def get_mean(self):
+        return self.location + self.scale * float(mpmath.gamma(1 + 1 / self.shape))
+
+
+    ##
+    # Return whether this is an Exponential distribution, i.e., shape == 1
+    # and location == 0
+    #
+    def is_exponential(self):
+        return self.shape == 1 and self.location == 0
+
+
+    ##
+    # Return the cumulative hazard at x, i.e., -ln(1 - CDF(x))
+    #
+    def cum_hazard_eval(self, x):
+        if x <= self.location:
+            return float(0)
+        return ((float(x) - self.location) / self.scale) ** self.shape
+
+
+    ##
+    # Return the derivative of ln(pdf(x)) with respect to ln(scale), i.e.,
+    # the score of a value x drawn from this distribution
+    #
+    def log_scale_score_eval(self, x):
+        return self.shape * (self.cum_hazard_eval(x) - 1)
+
+
     ##
     # When the shape parameter is not 1, then the hazard rate will
     # change with time.  When simulating a semi-Markov process using
@@ -148,7 +208,33 @@ class Weibull:
     # Draw a random value from this distribution
     #
     def draw(self):
-        return random.weibullvariate(self.scale, self.shape) + self.location
+        if self.buffer_pos == len(self.buffer):
+            self.buffer = self.draw_many(DRAW_BUFFER_SIZE).tolist()
+            self.buffer_pos = 0
+        val = self.buffer[self.buffer_pos]
+        self.buffer_pos += 1
+        return val
+
+
+    ##
+    # Draw random values from this distribution with numpy
+    #
+    # @param size: the number (or shape) of values to draw
+    # @param rng: the numpy RandomState to draw from (None for numpy.random)
+    # @return numpy array of the values
+    #
+    def draw_many(self, size, rng=None):
+        if rng is None:
+            rng = nprandom
+        return rng.weibull(self.shape, size) * self.scale + self.location
+
+
+    ##
+    # Drop the values drawn in advance
+    #
+    def reset_buffer(self):
+        self.buffer = []
+        self.buffer_pos = 0
 
 
     ##
@@ -191,9 +277,11 @@ class Rack:
 
     ##
     # Possible failure events
+    # The event codes keep the order of the former event names, by which the
+    # events with the same time are ordered in the event queues
     #
-    EVENT_RACK_FAIL = "transient rack failure"
-    EVENT_RACK_REPAIR = "repair for transient rack failure"
+    EVENT_RACK_REPAIR = 6
+    EVENT_RACK_FAIL = 7
 
 
     def __init__(self, rack_fail_distr, rack_repair_distr):
@@ -243,14 +331,14 @@ class Node:
     ##
     # Possible failure events
     #
-    EVENT_NODE_FAIL = "node failure"
-    EVENT_NODE_REPAIR = "node repair"
-    EVENT_NODE_TRANSIENT_FAIL = "node transient failure"
-    EVENT_NODE_TRANSIENT_REPAIR = "node transient repair"
+    EVENT_NODE_FAIL = 2
+    EVENT_NODE_REPAIR = 3
+    EVENT_NODE_TRANSIENT_FAIL = 4
+    EVENT_NODE_TRANSIENT_REPAIR = 5
 
 
     def __init__(self, node_fail_distr, node_transient_fail_distr, node_transient_repair_distr,
-                 node_fail_trace=None, node_transient_fail_trace=None, node_transient_repair_trace=None):
+                 node_fail_trace=None, node_transient_fail_trace=None):
         # Current state
         self.state = self.STATE_NODE_NORMAL
 
@@ -261,9 +349,8 @@ class Node:
 
         # Add node fail events for trace
         self.node_fail_trace = node_fail_trace
-        # Add node transient failure events from trace
+        # Add node transient failure events, together with their repairs, from trace
         self.node_transient_fail_trace = node_transient_fail_trace
-        self.node_transient_repair_trace = node_transient_repair_trace
 
         # The following is for importance sampling
         self.last_time_update = mpf(0)
@@ -401,8 +488,8 @@ class Disk:
     ##
     # Possible failure events
     #
-    EVENT_DISK_FAIL = "disk failure"
-    EVENT_DISK_REPAIR = "disk repair"
+    EVENT_DISK_FAIL = 0
+    EVENT_DISK_REPAIR = 1
 
 
     ##
@@ -418,6 +505,10 @@ class Disk:
         # keep record of the unavailable time of this disk
         self.unavail_start = mpf(0)
         self.unavail_clock = mpf(0)
+        # accumulator of the blocked ratio, which is notified when this disk
+        # becomes unavailable or available, and the number of chunks on this disk
+        self.blocked_ratio = None
+        self.num_chunks = 0
 
         # Failure and repair distributions
         self.disk_fail_distr = disk_fail_distr
@@ -458,6 +549,14 @@ class Disk:
         self.state = self.STATE_NORMAL
 
 
+    ##
+    # Set the accumulator of the blocked ratio and the number of chunks on this disk
+    #
+    def set_blocked_ratio(self, blocked_ratio, num_chunks):
+        self.blocked_ratio = blocked_ratio
+        self.num_chunks = num_chunks
+
+
     ##
     # Update disk clocks.  There are three main clocks to update:
     # the disk clock, the repair clock (if there is an ongoing repair)
@@ -510,6 +609,8 @@ class Disk:
     def fail_disk(self, curr_time):
         if self.state == self.STATE_NORMAL:
             self.unavail_start = curr_time
+            if self.blocked_ratio is not None:
+                self.blocked_ratio.add_unavail(curr_time, self.num_chunks)
         self.state = self.STATE_CRASHED
         self.repair_clock = float(0)
         self.repair_start = curr_time
@@ -519,6 +620,8 @@ class Disk:
     # Repair this disk.
     #
     def repair_disk(self, curr_time):
+        if self.state != self.STATE_NORMAL and self.blocked_ratio is not None:
+            self.blocked_ratio.remove_unavail(curr_time, self.num_chunks)
         self.state = self.STATE_NORMAL
         self.unavail_clock += curr_time - self.unavail_start
         self.begin_time = self.last_time_update
@@ -533,6 +636,8 @@ class Disk:
         if self.state == self.STATE_NORMAL:
             self.state = self.STATE_UNAVAILABLE
             self.unavail_start = curr_time
+            if self.blocked_ratio is not None:
+                self.blocked_ratio.add_unavail(curr_time, self.num_chunks)
 
 
     ##
@@ -542,6 +647,8 @@ class Disk:
         if self.state == self.STATE_UNAVAILABLE:
             self.state = self.STATE_NORMAL
             self.unavail_clock += curr_time - self.unavail_start
+            if self.blocked_ratio is not None:
+                self.blocked_ratio.remove_unavail(curr_time, self.num_chunks)
 
 
     ##
@@ -585,6 +692,19 @@ class Disk:
         return self.curr_disk_fail_rate() + self.curr_disk_repair_rate()
 
 
+##
+# Names of the event codes, used in logs
+#
+EVENT_NAMES = {Disk.EVENT_DISK_FAIL: "disk failure",
+               Disk.EVENT_DISK_REPAIR: "disk repair",
+               Node.EVENT_NODE_FAIL: "node failure",
+               Node.EVENT_NODE_REPAIR: "node repair",
+               Node.EVENT_NODE_TRANSIENT_FAIL: "node transient failure",
+               Node.EVENT_NODE_TRANSIENT_REPAIR: "node transient repair",
+               Rack.EVENT_RACK_REPAIR: "repair for transient rack failure",
+               Rack.EVENT_RACK_FAIL: "transient rack failure"}
+
+
 def test():
     # Basic test of the Weibull functions
     w = Weibull(shape=float(2.0), scale=float(12), location=6)
@@ -1,6 +1,7 @@
 import sys
 import logging
-from bm_ops import *
+import numpy as np
+from bitset import Bitset
 from smp_data_structures import Disk, Node, Rack
 
 ##
@@ -15,6 +16,12 @@ console.setFormatter(formatter)
 ##
 # This encapsulated system state of the disks
 #
+# The available disks and nodes are kept in boolean arrays, and the failed
+# disks and nodes are kept in bitsets, so the failed devices are listed in
+# O(words + #failed) and counted in O(1).  The numbers of failed and
+# unavailable disks on each node and rack are maintained as well, so the
+# failure of a node or rack is derived in O(1).
+#
 class State:
     CURR_STATE_OK = "system is operational"
     CURR_STATE_DEGRADED = "system has at least one failure"
@@ -23,30 +30,39 @@ class State:
     #  Given a list of disk IDs construct the data
     #  structures needed to capture system state.
     #
-    def __init__(self, num_disks=0, num_nodes=0):
+    def __init__(self, num_disks=0, num_nodes=0, nodes_per_rack=0):
         self.num_disks = num_disks
         self.num_nodes = num_nodes
         self.disks_per_node = 0
         if self.num_disks != 0 and self.num_nodes != 0:
             self.disks_per_node = self.num_disks / self.num_nodes
-
-        # Bit-map of available disks
-        # If self.num_disks = 5, then avail_disk = 31
-        # 31's binary form is 11111
-        self.avail_disk = (1 << self.num_disks) - 1
-        # Bit-map of failed disks
-        self.failed_disks = 0
+        self.disks_per_rack = 0
+        if self.disks_per_node != 0 and nodes_per_rack != 0:
+            self.disks_per_rack = nodes_per_rack * self.disks_per_node
+
+        # Available disks
+        self.avail_disk = np.ones(self.num_disks, dtype=bool)
+        # Failed disks
+        self.failed_disk = Bitset(self.num_disks)
         # Keep track of number of disk failures
         self.num_failed_disks = 0
         # Keep track of the unavailable disks
-        self.unavailable_disk = 0
+        self.unavailable_disk = np.zeros(self.num_disks, dtype=bool)
         self.num_unavailable_disk = 0
 
-        self.avail_nodes = (1 << self.num_nodes) - 1
-        # Bit-map of failed nodes
-        self.failed_nodes = 0
+        self.avail_nodes = np.ones(self.num_nodes, dtype=bool)
+        # Failed nodes
+        self.failed_node = Bitset(self.num_nodes)
         self.num_failed_nodes = 0
 
+        # Number of failed and unavailable disks on each node and rack
+        num_racks = 0
+        if self.disks_per_rack != 0:
+            num_racks = self.num_disks / self.disks_per_rack
+        self.node_failed_disks = np.zeros(self.num_nodes, dtype=np.int32)
+        self.rack_failed_disks = np.zeros(num_racks, dtype=np.int32)
+        self.rack_unavailable_disks = np.zeros(num_racks, dtype=np.int32)
+
         # System state
         self.sys_state = self.CURR_STATE_OK
 
@@ -65,10 +81,14 @@ class State:
         self.num_disks = state.num_disks
         # self.disks = state.disks[:]
         self.num_failed_disks = state.num_failed_disks
-        self.failed_disks = state.failed_disks
+        self.failed_disk = state.failed_disk.copy()
         self.num_unavailable_disk = state.num_unavailable_disk
-        self.unavailable_disk = state.unavailable_disk
-        self.avail_disk = state.avail_disk
+        self.unavailable_disk = state.unavailable_disk.copy()
+        self.avail_disk = state.avail_disk.copy()
+        self.disks_per_rack = state.disks_per_rack
+        self.node_failed_disks = state.node_failed_disks.copy()
+        self.rack_failed_disks = state.rack_failed_disks.copy()
+        self.rack_unavailable_disks = state.rack_unavailable_disks.copy()
         self.sys_state = state.sys_state
 
     ##
@@ -119,24 +139,12 @@ class State:
         if event_type == Disk.EVENT_DISK_FAIL:
             self.fail_disk(subsystem_idx)
             node_idx = subsystem_idx / self.disks_per_node
-            node_fail = True
-            for i in range(self.disks_per_node):
-                disk_idx = node_idx * self.disks_per_node + i
-                if disk_idx not in set(self.get_failed_disks()):
-                    node_fail = False
-                    break
-            if node_fail:
+            if self.node_failed_disks[node_idx] == self.disks_per_node:
                 self.fail_node(node_idx)
         elif event_type == Disk.EVENT_DISK_REPAIR:
             self.repair_disk(subsystem_idx)
             node_idx = subsystem_idx / self.disks_per_node
-            node_repair = True
-            for i in range(self.disks_per_node):
-                disk_idx = node_idx * self.disks_per_node + i
-                if disk_idx in set(self.get_failed_disks()):
-                    node_repair = False
-                    break
-            if node_repair and bm_in(node_idx, self.failed_nodes):
+            if self.node_failed_disks[node_idx] == 0 and node_idx in self.failed_node:
                 self.repair_node(node_idx)
         elif event_type == Node.EVENT_NODE_FAIL:
             self.fail_node(subsystem_idx)
@@ -161,10 +169,12 @@ class State:
     # Set the disk as unavailable because of rack failure
     #
     def set_disk_offline(self, disk_id):
-        self.avail_disk = bm_rm(self.avail_disk, disk_id)
-        self.unavailable_disk = bm_insert(self.unavailable_disk, disk_id)
-
-        self.num_unavailable_disk += 1
+        self.avail_disk[disk_id] = False
+        if not self.unavailable_disk[disk_id]:
+            self.unavailable_disk[disk_id] = True
+            self.num_unavailable_disk += 1
+            if self.disks_per_rack != 0:
+                self.rack_unavailable_disks[disk_id / self.disks_per_rack] += 1
         self.logger.debug("Disk %s is offline" % disk_id)
 
 
@@ -172,11 +182,13 @@ class State:
     # Set the disk as available because of rack repair
     #
     def set_disk_online(self, disk_id):
-        if bm_in(disk_id, self.unavailable_disk):
-            self.unavailable_disk = bm_rm(self.unavailable_disk, disk_id)
-            self.avail_disk = bm_insert(self.avail_disk, disk_id)
+        if self.unavailable_disk[disk_id]:
+            self.unavailable_disk[disk_id] = False
+            self.avail_disk[disk_id] = True
 
             self.num_unavailable_disk -= 1
+            if self.disks_per_rack != 0:
+                self.rack_unavailable_disks[disk_id / self.disks_per_rack] -= 1
             self.logger.debug("Disk %s is online" % disk_id)
         else:
             self.logger.debug("Disk %s is not in self.unavail_disk" % disk_id)
@@ -190,32 +202,44 @@ class State:
             self.logger.error("State - fail_disk(): wrong disk_id!")
             sys.exit(2)
 
-        # Insert into bitmap of disk failures
-        self.failed_disks = bm_insert(self.failed_disks, disk_id)
-        self.avail_disk = bm_rm(self.avail_disk, disk_id)
-        # Increment disk failure count
-        self.num_failed_disks += 1
+        # Mark the disk as failed, failing a failed disk again changes nothing
+        if disk_id not in self.failed_disk:
+            self.failed_disk.add(disk_id)
+            # Increment disk failure count
+            self.num_failed_disks += 1
+            self.update_device_counts(disk_id, 1)
+        self.avail_disk[disk_id] = False
         self.logger.debug("Disk %s has failed" % disk_id)
 
 
     ##
-    # "Repair" a disk by removing it from the failed disk list
+    # "Repair" a disk by removing it from the failed disks
     #
     def repair_disk(self, disk_id):
         if disk_id >= self.num_disks or disk_id < 0:
             self.logger.error("State - repair_disk(): wrong disk_id!")
             sys.exit(2)
 
-        # Remove entry from the failed disk bitmap
-        self.failed_disks = bm_rm(self.failed_disks, disk_id)
-        self.avail_disk = bm_insert(self.avail_disk, disk_id)
-
-        # Decrement disk failure count
-        self.num_failed_disks -= 1
+        if disk_id in self.failed_disk:
+            self.failed_disk.discard(disk_id)
+            # Decrement disk failure count
+            self.num_failed_disks -= 1
+            self.update_device_counts(disk_id, -1)
+        self.avail_disk[disk_id] = True
 
         self.logger.debug("Disk %s has been repaired" % disk_id)
 
 
+    ##
+    # Add delta to the failed-disk counters of the node and rack of a disk
+    #
+    def update_device_counts(self, disk_id, delta):
+        if self.disks_per_node != 0:
+            self.node_failed_disks[disk_id / self.disks_per_node] += delta
+        if self.disks_per_rack != 0:
+            self.rack_failed_disks[disk_id / self.disks_per_rack] += delta
+
+
     ##
     # Set a node as failed
     #
@@ -224,28 +248,28 @@ class State:
             self.logger.error("State - fail_node(): wrong node_id!")
             sys.exit(2)
 
-        # Insert into bitmap of node failures
-        self.failed_nodes = bm_insert(self.failed_nodes, node_id)
-        self.avail_nodes = bm_rm(self.avail_nodes, node_id)
-        # Update the number of failed nodes
-        self.num_failed_nodes = len(bm_to_list(self.failed_nodes))
+        if node_id not in self.failed_node:
+            self.failed_node.add(node_id)
+            # Update the number of failed nodes
+            self.num_failed_nodes += 1
+        self.avail_nodes[node_id] = False
 
         self.logger.debug("Node %s has failed" % node_id)
 
 
     ##
-    # "Repair" a node by removing it from the failed node list
+    # "Repair" a node by removing it from the failed nodes
     #
     def repair_node(self, node_id):
         if node_id >= self.num_nodes or node_id < 0:
             self.logger.error("State - repair_node(): wrong node_id!")
             sys.exit(2)
 
-        # Remove entry from the failed node bitmap
-        self.failed_nodes = bm_rm(self.failed_nodes, node_id)
-        self.avail_nodes = bm_insert(self.avail_nodes, node_id)
-        # Update the number of failed nodes
-        self.num_failed_nodes = len(bm_to_list(self.failed_nodes))
+        if node_id in self.failed_node:
+            self.failed_node.discard(node_id)
+            # Update the number of failed nodes
+            self.num_failed_nodes -= 1
+        self.avail_nodes[node_id] = True
 
         self.logger.debug("Node %s has been repaired" % node_id)
 
@@ -258,10 +282,10 @@ class State:
 
 
     ##
-    # Return a list of disk IDs of failed disks
+    # Return a sorted list of disk IDs of failed disks
     #
     def get_failed_disks(self):
-        return bm_to_list(self.failed_disks)
+        return self.failed_disk.to_list()
 
 
     ##
@@ -272,16 +296,16 @@ class State:
         return self.sys_state
 
     ##
-    # Return a list of disk IDs of available disks
+    # Return a sorted list of disk IDs of available disks
     #
     def get_avail_disks(self):
-        return bm_to_list(self.avail_disk)
+        return np.flatnonzero(self.avail_disk).tolist()
 
     ##
-    # Return a list of disk IDs of available disks
+    # Return a sorted list of node IDs of available nodes
     #
     def get_avail_nodes(self):
-        return bm_to_list(self.avail_nodes)
+        return np.flatnonzero(self.avail_nodes).tolist()
 
     ##
     # Get number of failed nodes
@@ -290,7 +314,113 @@ class State:
         return self.num_failed_nodes
 
     ##
-    # Return a list of disk IDs of failed disks
+    # Return a sorted list of node IDs of failed nodes
     #
     def get_failed_nodes(self):
-        return bm_to_list(self.failed_disks)
+        return self.failed_node.to_list()
+
+    ##
+    # Get number of failed disks on a node
+    #
+    def get_num_failed_disks_on_node(self, node_id):
+        return int(self.node_failed_disks[node_id])
+
+    ##
+    # Get number of failed disks on a rack
+    #
+    def get_num_failed_disks_on_rack(self, rack_id):
+        return int(self.rack_failed_disks[rack_id])
+
+    ##
+    # Get number of failed disks in a failure domain, which is given as a
+    # Bitset of disks, e.g., from Bitset.domain_mask()
+    #
+    def get_num_failed_disks_in(self, domain_mask):
+        return self.failed_disk.count_and(domain_mask)
+
+    ##
+    # Get number of unavailable disks on a rack
+    #
+    def get_num_unavailable_disks_on_rack(self, rack_id):
+        return int(self.rack_unavailable_disks[rack_id])
+
+
+##
+# Keep track of the blocked ratio, i.e., the fraction of the chunk-time
+# during which the chunks are unavailable
+#
+# The integral of the number of unavailable chunks over time is updated
+# whenever a disk becomes unavailable or available, so the blocked ratio
+# at any time is obtained in O(1).  If num_buckets is given, the integral
+# is also kept for each of num_buckets equal periods of the mission time.
+#
+class BlockedRatioAccumulator:
+
+    def __init__(self, num_chunks, mission_time=0, num_buckets=0):
+        self.num_chunks = num_chunks
+        # Number of chunks on the unavailable disks
+        self.unavail_chunks = 0
+        # Integral of unavail_chunks over [0, last_time]
+        self.unavail_time = float(0)
+        self.last_time = float(0)
+
+        self.num_buckets = num_buckets
+        if num_buckets != 0:
+            self.bucket_width = float(mission_time) / num_buckets
+        self.bucket_unavail_time = [float(0)] * num_buckets
+
+
+    ##
+    # Accumulate the unavailable chunk-time until curr_time
+    #
+    def advance(self, curr_time):
+        if self.unavail_chunks != 0 and curr_time > self.last_time:
+            self.unavail_time += self.unavail_chunks * (curr_time - self.last_time)
+
+            begin = self.last_time
+            bucket_idx = int(begin / self.bucket_width) if self.num_buckets != 0 else 0
+            while begin < curr_time and bucket_idx < self.num_buckets:
+                end = min(curr_time, (bucket_idx + 1) * self.bucket_width)
+                self.bucket_unavail_time[bucket_idx] += self.unavail_chunks * (end - begin)
+                begin = end
+                bucket_idx += 1
+        if curr_time > self.last_time:
+            self.last_time = curr_time
+
+
+    ##
+    # num_chunks chunks become unavailable at curr_time
+    #
+    def add_unavail(self, curr_time, num_chunks):
+        self.advance(curr_time)
+        self.unavail_chunks += num_chunks
+
+
+    ##
+    # num_chunks chunks become available at curr_time
+    #
+    def remove_unavail(self, curr_time, num_chunks):
+        self.advance(curr_time)
+        self.unavail_chunks -= num_chunks
+
+
+    ##
+    # Get the blocked ratio over [0, curr_time]
+    #
+    def get_blocked_ratio(self, curr_time):
+        sum_unavail_time = self.unavail_time + self.unavail_chunks * (curr_time - self.last_time)
+        return sum_unavail_time / (self.num_chunks * curr_time)
+
+
+    ##
+    # Get the blocked ratio of each period until curr_time
+    #
+    def get_blocked_ratio_series(self, curr_time):
+        self.advance(curr_time)
+        series = []
+        for bucket_idx in xrange(self.num_buckets):
+            covered = min(curr_time, (bucket_idx + 1) * self.bucket_width) - bucket_idx * self.bucket_width
+            if covered <= 0:
+                break
+            series.append(self.bucket_unavail_time[bucket_idx] / (self.num_chunks * covered))
+        return series
@@ -1,283 +1,541 @@
 import csv
-import time, datetime
+import re
 import os, sys
+import hashlib
+import numpy as np
+import numpy.random as nprandom
+from heapq import heappush, heappop
 
 
-# used to simulate
-class Trace:
-    def __init__(self, trace_id, i, op):
-        self.trace_ls = []
-        # permanent failure
-        if op == 'p':
-            path_name = "./lib/tracelib/failure_events/s"
-        elif op == 't':
-            path_name = "./lib/tracelib/transient_events/s"
-        elif op == 'r':
-            path_name = "./lib/tracelib/transient_repair/s"
-        fname = path_name + str(trace_id) + 'n' + str(i) + ".txt"
-        if os.path.exists(fname) is True:
-            tracefile = open(fname, "r")
-            for line in tracefile:
-                line = line.strip('\n')
-                self.trace_ls.append(float(line))
+TRACE_DIR = "./lib/tracelib/"
+TRACE_CSV = TRACE_DIR + "data/trace.csv"
 
-    def get_trace_ls(self):
-        return self.trace_ls
+# Binary store of the events of all systems in trace.csv
+STORE_FILE = TRACE_DIR + "traces.npz"
+# The parser of trace.csv
+PARSER_FILE = TRACE_DIR + "trace.py"
+
+# input trace id, which needs to be mapped to system_id in data.csv
+SYSTEM_IDS = [7, 24, 22, 8, 20, 21, 18, 19, 3, 4, 5, 6, 14, 9, 10, 11, 13, 12, 16, 2, 23, 15]
+
+MONTHS = dict((name, idx + 1) for (idx, name) in
+              enumerate(["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]))
+
+# Kinds of the events: permanent failures, transient failures and transient repairs
+TRACE_OPS = ['p', 't', 'r']
+
+# Replay the events of each node in the trace, or resample the failure
+# histories of the nodes from the trace in each iteration
+TRACE_MODE_REPLAY = "replay"
+TRACE_MODE_BOOTSTRAP = "bootstrap"
+
+# Map the nodes of the simulated cluster to the nodes of the trace: one to
+# one, tiled (node i to trace node i % num_trace_nodes), sampled at random,
+# or replicated (each trace node to consecutive nodes)
+NODE_MAPPING_EXACT = "exact"
+NODE_MAPPING_TILE = "tile"
+NODE_MAPPING_SAMPLE = "sample"
+NODE_MAPPING_REPLICATE = "replicate"
+
+# The copies of a trace node are shifted in time by fractions of its period,
+# which are spread by the golden ratio
+GOLDEN_RATIO_FRAC = 0.6180339887498949
+
+
+# number of days from 1970/01/01 to the dates, on arrays
+def days_from_civil(year, mon, day):
+    year = year - (mon <= 2)
+    era = year // 400
+    yoe = year - era * 400
+    doy = (153 * (mon + np.where(mon > 2, -3, 9)) + 2) // 5 + day - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    return era * 146097 + doe - 719468
 
 
-# parse trace
+# parse all systems of trace.csv in one pass into arrays of events
 class Parser:
 
     TRANSIENT = "transient failure without data loss"
     PERMANENT = "permanent failure with data loss"
 
-    def __init__(self, trace_id, mission_time=87600):
-        # pick up some systems and nodes from trace.csv and get failure/repair time
-        self.mission_time = mission_time
-        self.trace_entry = []
-        if os.path.exists("./lib/tracelib/failure_events/") is False:
-            os.mkdir("./lib/tracelib/failure_events/")
-        if os.path.exists("./lib/tracelib/transient_events/") is False:
-            os.mkdir("./lib/tracelib/transient_events/")
-        if os.path.exists("./lib/tracelib/transient_repair/") is False:
-            os.mkdir("./lib/tracelib/transient_repair/")
-        # input trace id, which needs to be mapped to system_id in data.csv     
-        self.id_dict = [7, 24, 22, 8, 20, 21, 18, 19, 3, 4, 5, 6, 14, 9, 10, 11, 13, 12, 16, 2, 23, 15]
-        self.system_id = self.id_dict[int(trace_id)-1] 
-        self.sum_nodes = 0
-        with open('./lib/tracelib/data/trace.csv', 'rb') as csvfile:
-            tracereader = csv.DictReader(csvfile)
-            for row in tracereader:
-                if int(row['System']) == self.system_id:
-                    if self.sum_nodes == 0:
-                        self.sum_nodes = int(row['nodes'])
-                    # here: may cause inaccuracy
-                    # the first record is in May, 1995
-                    if row['node prod'] == 'before tracking':
-                        (prod_y, prod_mon) = (1995, 1)
-                    else:
-                        (prod_y, prod_mon) = self.year_month_convert(row['node prod'])
-                    # here: may cause inaccuracy
-                    # the last record is on Sep 9, 2005
-                    if row['node decom'] == 'current':
-                        end_period = self.date_convert_hour(prod_y, prod_mon, '11/01/2005 0:0')
-                    else:
-                        (decom_year, decom_mon) = self.year_month_convert(row['node decom'])
-                        end_period = self.date_convert_hour(prod_y, prod_mon, str(decom_mon) + '/01/' + str(decom_year) + ' 0:0')
-                    root_cause = ""
-                    cause_id = 0
-                    if row['Facilities'] != "":
-                        cause_id = 1
-                        root_cause = row['Facilities']
-                    elif row['Hardware'] != "":
-                        cause_id = 2
-                        root_cause = row['Hardware']
-                    elif row['Human Error'] != "":
-                        cause_id = 3
-                        root_cause = row['Human Error']
-                    elif row['Network'] != "":
-                        cause_id = 4
-                        root_cause = row['Network']
-                    elif row['Undetermined'] != "":
-                        cause_id = 5
-                        root_cause = row['Undetermined']
-                    elif row['Software'] != "":
-                        cause_id = 6
-                        root_cause = row['Software']
-                    # print prod_y, prod_mon,row['Prob Started (mm/dd/yy hh:mm)']
-                    start_time = self.date_convert_hour(prod_y, prod_mon, row['Prob Started (mm/dd/yy hh:mm)'])
-                    end_time = self.date_convert_hour(prod_y, prod_mon, row['Prob Fixed (mm/dd/yy hh:mm)'])
-                    # here: It will be inaccurate from 'down time'
-                    down_hour = end_time - start_time
-                    type = self.category_failure(cause_id, root_cause, down_hour)
-                    self.trace_entry.append(
-                        (int(row['System']), int(row['nodenumz']), start_time, end_time, down_hour, end_period, type))
-        self.trace_entry = list(set(self.trace_entry))
-        self.trace_entry = sorted(self.trace_entry, key=lambda item: (item[0], item[1], item[2]))
-        print "sum_nodes", self.sum_nodes
-        return None
+    def __init__(self, csv_file=TRACE_CSV):
+        with open(csv_file, 'rb') as csvfile:
+            tracereader = csv.reader(csvfile)
+            header = tracereader.next()
+            col = dict((name, idx) for (idx, name) in enumerate(header))
+            system_names = set(str(system_id) for system_id in SYSTEM_IDS)
+            rows = [row for row in tracereader if row[col['System']] in system_names]
+        columns = zip(*rows)
+
+        trace_of_system = dict((system_id, idx + 1) for (idx, system_id) in enumerate(SYSTEM_IDS))
+        trace_ids = np.array([trace_of_system[int(system)] for system in columns[col['System']]], dtype=np.int64)
+        nodes = np.array(columns[col['nodenumz']], dtype=np.int64)
+
+        # the number of nodes of each system is in its first record
+        self.sum_nodes = np.zeros(len(SYSTEM_IDS) + 1, dtype=np.int64)
+        for idx in xrange(len(rows) - 1, -1, -1):
+            self.sum_nodes[trace_ids[idx]] = int(columns[col['nodes']][idx])
+
+        # here: may cause inaccuracy
+        # the first record is in May, 1995
+        (prod_y, prod_mon) = self.convert_months(columns[col['node prod']], {'before tracking': (1995, 1)})
+        # here: may cause inaccuracy
+        # the last record is on Sep 9, 2005
+        (decom_y, decom_mon) = self.convert_months(columns[col['node decom']], {'current': (2005, 11)})
+        prod_days = days_from_civil(prod_y, prod_mon, 1)
+        # hours are related to node production time. E.g., in system 3, node prod = 2003/09
+        end_period = (days_from_civil(decom_y, decom_mon, 1) - prod_days) * 86400 / float(3600)
+        start_time = self.convert_hours(columns[col['Prob Started (mm/dd/yy hh:mm)']], prod_days)
+        end_time = self.convert_hours(columns[col['Prob Fixed (mm/dd/yy hh:mm)']], prod_days)
+        # here: It will be inaccurate from 'down time'
+        down_hour = end_time - start_time
+        permanent = self.category_failure(columns, col, down_hour)
+
+        # remove the duplicated records, and sort the records of each node by time
+        order = np.lexsort((permanent, down_hour, end_period, end_time, start_time, nodes, trace_ids))
+        keys = np.vstack((trace_ids, nodes, start_time, end_time, end_period, permanent))[:, order]
+        unique = np.ones(len(order), dtype=bool)
+        unique[1:] = (keys[:, 1:] != keys[:, :-1]).any(axis=0)
+        order = order[unique]
+
+        self.trace_ids = trace_ids[order]
+        self.nodes = nodes[order]
+        self.start_time = start_time[order]
+        self.down_hour = down_hour[order]
+        self.permanent = permanent[order]
+        self.end_period = end_period[order]
+
+    # convert node production/decommission months, e.g., "5-Nov" and "Nov-96"
+    def convert_months(self, values, special):
+        months = dict(special)
+        for value in set(values):
+            if value in months:
+                continue
+            a, b = value.split('-')
+            if a.isdigit():
+                months[value] = (int('200' + a), MONTHS[b])
+            else:
+                months[value] = (int('19' + b), MONTHS[a])
+        year = np.array([months[value][0] for value in values], dtype=np.int64)
+        mon = np.array([months[value][1] for value in values], dtype=np.int64)
+        return (year, mon)
+
+    # convert dates "mm/dd/yyyy hh:mm" to hours since the production days
+    def convert_hours(self, values, prod_days):
+        fields = re.findall(r"(\d+)/(\d+)/(\d+) (\d+):(\d+)", "\n".join(values))
+        if len(fields) != len(values):
+            print "Wrong date in trace.csv!"
+            sys.exit(2)
+        fields = np.array(fields, dtype=np.int64)
+        days = days_from_civil(fields[:, 2], fields[:, 0], fields[:, 1]) - prod_days
+        return (days * 86400 + fields[:, 3] * 3600 + fields[:, 4] * 60) / float(3600)
 
     # category transient failure and permanent failure
-    def category_failure(self, cause_id, root_cause, down_hour):
+    def category_failure(self, columns, col, down_hour):
+        num_rows = len(down_hour)
+        # the root cause is the first non-empty one of the causes
+        cause_id = np.zeros(num_rows, dtype=np.int64)
+        root_cause = [""] * num_rows
+        causes = ['Facilities', 'Hardware', 'Human Error', 'Network', 'Undetermined', 'Software']
+        for idx in xrange(len(causes) - 1, -1, -1):
+            values = columns[col[causes[idx]]]
+            for row_idx in xrange(num_rows):
+                if values[row_idx] != "":
+                    cause_id[row_idx] = idx + 1
+                    root_cause[row_idx] = values[row_idx]
+        disk_related = np.array([re.search('Disk|SCSI|Drive|SAN', cause) is not None for cause in root_cause])
+
         # Facilities and Network are transient failures
-        if cause_id == 1 or cause_id == 4:
-            return self.TRANSIENT
+        transient = (cause_id == 1) | (cause_id == 4)
         # Hardware and Software
-        elif cause_id == 2 or cause_id == 6:
-            if root_cause.find('Disk') != -1 or root_cause.find('SCSI') != -1 or root_cause.find('Drive') != -1 \
-                    or root_cause.find('SAN') != -1:
-                return self.PERMANENT
-            else:
-                return self.TRANSIENT
+        transient |= ((cause_id == 2) | (cause_id == 6)) & ~disk_related
         # Human Error and Undetermined
-        elif cause_id == 3 or cause_id == 5:
-            if down_hour > float(0.25):
-                return self.PERMANENT
-            else:
-                return self.TRANSIENT
+        transient |= ((cause_id == 3) | (cause_id == 5)) & (down_hour <= float(0.25))
+        return ~transient
+
+    # The store is written to a temporary file and renamed, so the processes
+    # that build it at the same time never read a partial store
+    def save(self, file_name=STORE_FILE, version=""):
+        tmp_file_name = file_name + ".tmp.%d" % os.getpid()
+        with open(tmp_file_name, "wb") as f:
+            np.savez(f, version=np.array(version), sum_nodes=self.sum_nodes, trace_ids=self.trace_ids,
+                     nodes=self.nodes, start_time=self.start_time, down_hour=self.down_hour,
+                     permanent=self.permanent, end_period=self.end_period)
+        os.rename(tmp_file_name, file_name)
+
+
+# version of the binary store: a hash of trace.csv and the parser, so the
+# store is rebuilt when either of them changes
+def get_store_version(csv_file=TRACE_CSV, parser_file=PARSER_FILE):
+    sha = hashlib.sha1()
+    for name in [csv_file, parser_file]:
+        with open(name, "rb") as f:
+            sha.update(f.read())
+    return sha.hexdigest()
+
+
+# The events of all systems, loaded from the binary store.
+# The events are sorted by (trace_id, node, time).
+class TraceIndex:
+    def __init__(self, file_name=STORE_FILE):
+        version = get_store_version()
+        arrays = None
+        if os.path.exists(file_name):
+            arrays = np.load(file_name)
+            if "version" not in arrays.files or str(arrays["version"]) != version:
+                arrays = None
+        if arrays is None:
+            Parser().save(file_name, version)
+            arrays = np.load(file_name)
+        self.sum_nodes = arrays["sum_nodes"]
+        self.trace_ids = arrays["trace_ids"]
+        self.nodes = arrays["nodes"]
+        self.start_time = arrays["start_time"]
+        self.down_hour = arrays["down_hour"]
+        self.permanent = arrays["permanent"]
+        self.end_period = arrays["end_period"]
 
     # get the number of nodes in the system
-    def get_sum_nodes(self):
-        return self.sum_nodes
-
-    # get node production time
-    def year_month_convert(self, node_prod):
-        a, b = node_prod.split('-')
-        if a.isdigit():
-            year = '200' + a
-            mon = time.strptime(b, '%b').tm_mon
-        else:
-            year = '19' + b
-            mon = time.strptime(a, '%b').tm_mon
-        return (year, mon)
+    def get_sum_nodes(self, trace_id):
+        if trace_id <= 0 or trace_id >= len(self.sum_nodes):
+            return 0
+        return int(self.sum_nodes[trace_id])
+
+    # return the slice of the events of each node of trace_id
+    def get_node_slices(self, trace_id):
+        begin = np.searchsorted(self.trace_ids, trace_id, 'left')
+        end = np.searchsorted(self.trace_ids, trace_id, 'right')
+        (node_ids, firsts) = np.unique(self.nodes[begin:end], return_index=True)
+        lasts = np.append(firsts[1:], end - begin)
+        return [(int(node_id), slice(begin + first, begin + last))
+                for (node_id, first, last) in zip(node_ids, firsts, lasts)]
+
+
+# extend the events in a period to mission time lazily: the events are repeated
+# in each period, and the events after mission time are cut
+# (Noted that repair completed time may exceed the mission time)
+#
+# The sorted times of a period are given, and the generator yields
+# (time, index of the original event) in ascending order of time.  An event
+# may happen after the end of its period, so the copies of consecutive
+# periods are merged with a heap, which only holds the copies that overlap.
+#
+# With offset in [0, period), the extended events are shifted earlier by
+# offset, and the events before time 0 are skipped.
+def iter_extended_events(times, period, mission_time, offset=0.):
+    if len(times) == 0:
+        return
+    if period <= 0:
+        for idx in xrange(len(times)):
+            yield (times[idx], idx)
+        return
+    # cursors (time, copy, index), including the first event of the next copy
+    cursors = [(times[0] - offset, 0, 0)]
+    while len(cursors) != 0:
+        (time, copy, idx) = heappop(cursors)
+        if time > mission_time:
+            return
+        if time > 0 or offset == 0:
+            yield (time, idx)
+        if idx + 1 < len(times):
+            heappush(cursors, (times[idx + 1] + period * copy - offset, copy, idx + 1))
+        if idx == 0:
+            heappush(cursors, (times[0] + period * (copy + 1) - offset, copy + 1, 0))
+
+
+# The events in a period of all nodes of a trace, kept in contiguous arrays.
+# The times of node i of op are times[op][offsets[op][i]:offsets[op][i+1]],
+# and the repair times 'r' are aligned with the transient failures 't'.
+class TraceStore:
+    def __init__(self, trace_id, trace_index):
+        self.trace_id = trace_id
+
+        node_slices = trace_index.get_node_slices(trace_id)
+        self.num_nodes = trace_index.get_sum_nodes(trace_id)
+        if len(node_slices) != 0:
+            self.num_nodes = max(self.num_nodes, node_slices[-1][0] + 1)
+
+        self.periods = np.zeros(self.num_nodes)
+        node_times = dict((op, [np.zeros(0)] * self.num_nodes) for op in TRACE_OPS)
+        for (node_id, events) in node_slices:
+            permanent = trace_index.permanent[events]
+            self.periods[node_id] = trace_index.end_period[events][0]
+            node_times['p'][node_id] = trace_index.start_time[events][permanent]
+            node_times['t'][node_id] = trace_index.start_time[events][~permanent]
+            # In some system and its nodes, repair time is 0.
+            node_times['r'][node_id] = trace_index.down_hour[events][~permanent]
+
+        self.offsets = dict()
+        self.times = dict()
+        for op in TRACE_OPS:
+            self.offsets[op] = np.zeros(self.num_nodes + 1, dtype=np.int64)
+            self.offsets[op][1:] = np.cumsum([len(times) for times in node_times[op]])
+            if self.num_nodes != 0:
+                self.times[op] = np.concatenate(node_times[op])
+            else:
+                self.times[op] = np.zeros(0)
+
+    # return the list of event times in a period of node i of op
+    def get_period_ls(self, i, op):
+        return self.get_period_array(i, op).tolist()
 
-    # convert date to hour according to production time
-    def date_convert_hour(self, prod_y, prod_mon, date_time):
-        mdy, hm = date_time.split(' ')
-        mon, day, year = mdy.split('/')
-        hour, minute = hm.split(':')
-        t = datetime.datetime(int(year), int(mon), int(day), int(hour), int(minute))
-        # ret_hour is related to node production time. E.g., in system 3, node prod = 2003/09
-        ret_hour = float((t - datetime.datetime(int(prod_y), int(prod_mon), 1, 0, 0, 0)).total_seconds() * 1.0 / 3600)
-        return ret_hour
-
-    def get_trace_id(self, system_ID):
-        for idx in range(len(self.id_dict)):
-            if self.id_dict[idx] == system_ID:
-                return idx+1
-
-    # write failure events of each node to files
-    def write_failure_events(self, trace_ID, node, failure_event, type):
-        file_name = 's' + str(trace_ID) + 'n' + str(node) + '.txt'
-        # print type
-        if type == self.TRANSIENT:
-            path_name = "./lib/tracelib/transient_events/"
+    # return the event times in a period of node i of op, which is a view of the store
+    def get_period_array(self, i, op):
+        if i >= self.num_nodes:
+            return self.times[op][:0]
+        return self.times[op][self.offsets[op][i]:self.offsets[op][i+1]]
+
+    def get_period(self, i):
+        if i >= self.num_nodes:
+            return 0
+        return float(self.periods[i])
+
+
+# Alias table (Vose's method) to draw index i with probability
+# weights[i] / sum(weights) in O(1)
+class AliasTable:
+    def __init__(self, weights):
+        weights = np.asarray(weights, dtype=np.float64)
+        num = len(weights)
+        scaled = weights * num / weights.sum()
+        self.prob = np.ones(num)
+        self.alias = np.arange(num)
+        small = [idx for idx in xrange(num) if scaled[idx] < 1.0]
+        large = [idx for idx in xrange(num) if scaled[idx] >= 1.0]
+        while len(small) != 0 and len(large) != 0:
+            less = small.pop()
+            more = large.pop()
+            self.prob[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] = scaled[more] + scaled[less] - 1.0
+            if scaled[more] < 1.0:
+                small.append(more)
+            else:
+                large.append(more)
+        # the rest have probability 1 up to rounding errors
+
+    def draw(self):
+        idx = nprandom.randint(len(self.prob))
+        if nprandom.random_sample() < self.prob[idx]:
+            return idx
+        return int(self.alias[idx])
+
+    def draw_many(self, size):
+        idx = nprandom.randint(len(self.prob), size=size)
+        return np.where(nprandom.random_sample(size) < self.prob[idx], idx, self.alias[idx])
+
+
+# Block bootstrap of the failure histories of op ('p' or 't') of the nodes of a trace.
+#
+# The history of a node in its period is a sequence of intervals: the
+# inter-arrival times of its failures, and the interval from its last failure
+# to the end of its period, which has no failure.  The nodes without any
+# record in the trace have a single interval of the average period.  A
+# resampled history is made of blocks of block_size consecutive intervals of
+# a node, which wrap around the end of its sequence.  The start of each block
+# is drawn uniformly from all the intervals of the system: the sequence with
+# an alias table weighted by its length, and the start in the sequence.
+#
+# A history starts in the stationary state of the blocks: its first block is
+# drawn with probability proportional to the duration of the block, and the
+# history starts at a uniform point in the block.  Otherwise the blocks of
+# the nodes with many failures are more likely in the first block.
+class TraceBootstrap:
+    def __init__(self, trace_store, op, block_size):
+        self.block_size = block_size
+
+        intervals = []
+        has_event = []
+        repairs = []
+        lengths = []
+        periods = [trace_store.get_period(i) for i in xrange(trace_store.num_nodes)
+                   if trace_store.get_period(i) > 0]
+        for i in xrange(trace_store.num_nodes):
+            period = trace_store.get_period(i)
+            if period <= 0:
+                if len(periods) == 0:
+                    continue
+                # the node is not in the trace
+                period = sum(periods) / len(periods)
+            times = trace_store.get_period_ls(i, op)
+            if op == 't':
+                node_repairs = trace_store.get_period_ls(i, 'r')
+            else:
+                node_repairs = [0] * len(times)
+            bounds = [0.] + times + [max([period] + times)]
+            intervals += [bounds[idx + 1] - bounds[idx] for idx in xrange(len(times) + 1)]
+            has_event += [True] * len(times) + [False]
+            repairs += node_repairs + [0]
+            lengths.append(len(times) + 1)
+
+        self.intervals = np.array(intervals)
+        self.has_event = np.array(has_event, dtype=bool)
+        self.repairs = np.array(repairs)
+        self.offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        self.offsets[1:] = np.cumsum(lengths)
+        self.lengths = np.array(lengths, dtype=np.int64)
+        self.alias_table = None
+        if len(lengths) != 0 and self.intervals.sum() > 0:
+            self.alias_table = AliasTable(lengths)
+
+            # duration of the block that starts at each interval
+            self.block_durations = np.zeros(len(intervals))
+            self.block_seqs = np.zeros(len(intervals), dtype=np.int64)
+            for seq in xrange(len(lengths)):
+                seq_intervals = self.intervals[self.offsets[seq]:self.offsets[seq+1]]
+                sums = np.zeros(2 * lengths[seq] + 1)
+                sums[1:] = np.cumsum(np.append(seq_intervals, seq_intervals))
+                (cycles, rest) = divmod(block_size, lengths[seq])
+                starts = np.arange(lengths[seq])
+                self.block_durations[self.offsets[seq]:self.offsets[seq+1]] = \
+                    cycles * sums[lengths[seq]] + sums[starts + rest] - sums[starts]
+                self.block_seqs[self.offsets[seq]:self.offsets[seq+1]] = seq
+            self.first_alias_table = AliasTable(self.block_durations)
+
+    # generate a resampled history up to mission time, which yields (time, repair time)
+    def iter_events(self, mission_time):
+        if self.alias_table is None:
+            return
+        first = self.first_alias_table.draw()
+        seq = self.block_seqs[first]
+        start = first - self.offsets[seq]
+        time = -nprandom.random_sample() * self.block_durations[first]
+        while True:
+            length = self.lengths[seq]
+            for step in xrange(self.block_size):
+                idx = self.offsets[seq] + (start + step) % length
+                time += self.intervals[idx]
+                if time > mission_time:
+                    return
+                if self.has_event[idx] and time > 0:
+                    yield (time, self.repairs[idx])
+            seq = self.alias_table.draw()
+            start = nprandom.randint(self.lengths[seq])
+
+
+# TraceIndex, TraceStores and TraceBootstraps that are loaded in this process
+trace_index = []
+trace_stores = dict()
+trace_bootstraps = dict()
+
+
+# get the TraceIndex, which is loaded once and shared by all traces
+def get_trace_index():
+    if len(trace_index) == 0:
+        trace_index.append(TraceIndex())
+    return trace_index[0]
+
+
+# get the TraceStore of trace_id, which is built once and shared by the iterations
+def get_trace_store(trace_id):
+    if trace_id not in trace_stores:
+        trace_stores[trace_id] = TraceStore(trace_id, get_trace_index())
+    return trace_stores[trace_id]
+
+
+# get the TraceBootstrap of op of trace_id, which is built once and shared by the nodes
+def get_trace_bootstrap(trace_id, op, block_size):
+    if (trace_id, op, block_size) not in trace_bootstraps:
+        trace_bootstraps[(trace_id, op, block_size)] = TraceBootstrap(get_trace_store(trace_id), op, block_size)
+    return trace_bootstraps[(trace_id, op, block_size)]
+
+
+# the copy of each node, i.e., the number of earlier nodes mapped to the same trace node
+def count_copies(trace_nodes, num_trace_nodes):
+    copies = np.zeros(len(trace_nodes), dtype=np.int64)
+    num_copies = np.zeros(num_trace_nodes, dtype=np.int64)
+    for i in xrange(len(trace_nodes)):
+        copies[i] = num_copies[trace_nodes[i]]
+        num_copies[trace_nodes[i]] += 1
+    return copies
+
+
+# Map the nodes of the simulated cluster to the nodes of a trace.  A trace node
+# that is mapped to more than one node is used by its copies 0, 1, 2, ...,
+# and the copy c is shifted in time by get_offset(c, period).
+class NodeMapping:
+    def __init__(self, mapping_type, num_nodes, num_trace_nodes, seed=0):
+        self.mapping_type = mapping_type
+        node_ids = np.arange(num_nodes)
+        if num_trace_nodes == 0:
+            self.trace_nodes = np.zeros(num_nodes, dtype=np.int64)
+            self.copies = np.zeros(num_nodes, dtype=np.int64)
+        elif mapping_type == NODE_MAPPING_EXACT or mapping_type == NODE_MAPPING_TILE:
+            self.trace_nodes = node_ids % num_trace_nodes
+            self.copies = node_ids / num_trace_nodes
+        elif mapping_type == NODE_MAPPING_REPLICATE:
+            # the nodes are spread over the whole trace in proportion, so each
+            # trace node is replayed by floor or ceil(num_nodes / num_trace_nodes)
+            # consecutive nodes
+            self.trace_nodes = node_ids * num_trace_nodes / num_nodes
+            self.copies = count_copies(self.trace_nodes, num_trace_nodes)
+        elif mapping_type == NODE_MAPPING_SAMPLE:
+            # the mapping is fixed by the seed, so it is the same in all the iterations
+            self.trace_nodes = np.random.RandomState(seed).randint(num_trace_nodes, size=num_nodes)
+            self.copies = count_copies(self.trace_nodes, num_trace_nodes)
         else:
-            path_name = "./lib/tracelib/failure_events/"
-        with open(path_name + file_name, "w") as ff:
-            check = 0
-            if failure_event != None:
-                for item in failure_event:
-                    if check != 0:
-                        assert (item >= check)  # e.g., system 20 both node 171 and node 224 have two failures at the same time
-                    check = item
-                    ff.write(str(item))
-                    ff.write('\n')
-
-    def write_repair_events(self, trace_ID, node, repair_event):
-        file_name = 's' + str(trace_ID) + 'n' + str(node) + '.txt'
-        path_name = "./lib/tracelib/transient_repair/"
-        with open(path_name + file_name, "w") as fr:
-            for item in repair_event:
-                fr.write(str(item))
-                fr.write('\n')
-
-    # extend the failure and repair events to mission time
-    def extend_to_mission_time(self, period, mission_time, type, failure_event, repair_event=None):
-        failure_num = len(failure_event)
-        n = int(mission_time / period)
-        # print period, n
-        tmp_f = []
-
-        if type == self.PERMANENT:
-            for i in xrange(1, n):
-                # print i
-                tmp_f += [item + period * i for item in failure_event]
-            curr_time = period * n
-            for idx in range(failure_num):
-                # failure event time > mission time (Noted that repair completed time may exceed the mission time)
-                if curr_time + failure_event[idx] > mission_time:
-                    break
-                curr_time += failure_event[idx]
-                tmp_f.append(curr_time)
-                # In some system and its nodes, repair time is 0.
-            failure_event += tmp_f
-            return failure_event
-        elif type == self.TRANSIENT:
-            tmp_r = []
-            for i in xrange(1, n):
-                # print i
-                tmp_f += [item + period * i for item in failure_event]
-                tmp_r += [item for item in repair_event]
-            curr_time = period * n
-            for idx in range(failure_num):
-                # failure event time > mission time (Noted that repair completed time may exceed the mission time)
-                if curr_time + failure_event[idx] > mission_time:
-                    break
-                curr_time += failure_event[idx]
-                tmp_f.append(curr_time)
-                # In some system and its nodes, repair time is 0.
-                tmp_r.append(repair_event[idx])
-            failure_event += tmp_f
-            repair_event += tmp_r
-            return (failure_event, repair_event)
-
-    # parse trace of each nodes, extend to mission time and output to failure/repair files
-    def parse_traces(self):
-        failure_event = []
-        transient_event = []
-        transient_repair = []
-        system_ID = -1
-        node_ID = -1
-        period = -1
-        node_num = 0
-        sum_node = 0
-        for row in self.trace_entry:
-            if system_ID == -1:
-                system_ID = row[0]
-            if node_ID == -1:
-                node_ID = row[1]
-                period = row[5]
-            elif row[1] != node_ID or row[0] != system_ID:  # will go to next node
-                if row[6] == self. TRANSIENT:
-                    (transient_event, transient_repair) = self.extend_to_mission_time(period, self.mission_time, row[6],
-                                                                                  transient_event, transient_repair)
-                elif row[6] == self.PERMANENT:
-                    failure_event = self.extend_to_mission_time(period, self.mission_time, row[6], failure_event)
-                trace_ID = self.get_trace_id(system_ID)
-                self.write_failure_events(trace_ID, node_ID, transient_event, self.TRANSIENT)
-                self.write_repair_events(trace_ID, node_ID, transient_repair)
-                self.write_failure_events(trace_ID, node_ID, failure_event, self.PERMANENT)
-                node_ID = row[1]
-                if row[0] != system_ID:
-                    node_num += 1
-                    print "System %d has %d nodes with failure events." % (system_ID, node_num)
-                    system_ID = row[0]
-                    node_num = 0
-                else:
-                    node_num += 1
-                sum_node +=1
-                period = row[5]
-                transient_event = []
-                transient_repair = []
-                failure_event = []
-            if row[6] == self.TRANSIENT:
-                transient_event.append(row[2])
-                transient_repair.append(row[4])
+            print "ERROR: wrong node mapping %s!" % mapping_type
+            sys.exit(2)
+
+    def get_trace_node(self, i):
+        return int(self.trace_nodes[i])
+
+    def get_copy(self, i):
+        return int(self.copies[i])
+
+
+# the time shift of copy c of a trace node with period
+def get_offset(copy, period):
+    return (copy * GOLDEN_RATIO_FRAC % 1.0) * period
+
+
+# used to simulate
+# The events of node i of op ('p' or 't'), which are extended to mission time
+# when they are iterated.  Each event is (time, repair time), where the repair
+# time is the down time of a transient failure and 0 for a permanent failure.
+# The copy c of node i is shifted in time, and all the copies read the events
+# from the shared TraceStore.
+class Trace:
+    def __init__(self, trace_id, i, op, mission_time=87600, copy=0):
+        self.trace_store = get_trace_store(trace_id)
+        self.i = i
+        self.op = op
+        self.period = self.trace_store.get_period(i)
+        self.offset = get_offset(copy, self.period)
+        self.mission_time = mission_time
+
+    def __iter__(self):
+        times = self.trace_store.get_period_array(self.i, self.op)
+        if self.op == 't':
+            repairs = self.trace_store.get_period_array(self.i, 'r')
+        for (time, idx) in iter_extended_events(times, self.period, self.mission_time, self.offset):
+            if self.op == 't':
+                yield (time, repairs[idx])
             else:
-                failure_event.append(row[2])
-        # assert(len(failure_event)!=0)
-        # assert(len(transient_event)!=0)
-        (transient_event, transient_repair) = self.extend_to_mission_time(period, self.mission_time, self.TRANSIENT,
-                                                                          transient_event, transient_repair)
-        failure_event = self.extend_to_mission_time(period, self.mission_time, self.PERMANENT, failure_event)
-        trace_ID = self.get_trace_id(system_ID)
-        self.write_failure_events(trace_ID, node_ID, transient_event, self.TRANSIENT)
-        self.write_repair_events(trace_ID, node_ID, transient_repair)
-        self.write_failure_events(trace_ID, node_ID, failure_event, self.PERMANENT)
-        node_num += 1
-        sum_node += 1
-        print "System %d has %d nodes with failure events." %(trace_ID, node_num)
-        print "Sum nodes having failure events", sum_node
+                yield (time, 0)
 
+    # the list of all event times in mission time
+    def get_trace_ls(self):
+        return [time for (time, repair) in self]
+
+
+# used to simulate
+# The events of op ('p' or 't') of a node, which are resampled from the trace
+# by block bootstrap every time they are iterated
+class ResampledTrace:
+    def __init__(self, trace_id, op, mission_time=87600, block_size=4):
+        self.trace_bootstrap = get_trace_bootstrap(trace_id, op, block_size)
+        self.mission_time = mission_time
 
+    def __iter__(self):
+        return self.trace_bootstrap.iter_events(self.mission_time)
 
 
 if __name__ == '__main__':
-    system_id = 9
-    parser = Parser(system_id)
-    # print parser.trace_entry
-    parser.parse_traces()
-    test_trace = Trace(system_id, 0, 'p')
+    # rebuild the binary store from trace.csv
+    Parser().save(STORE_FILE, get_store_version())
+    trace_id = 9
+    print "sum_nodes", get_trace_index().get_sum_nodes(trace_id)
+    test_trace = Trace(trace_id, 0, 'p')
     trace_ls = test_trace.get_trace_ls()
     print trace_ls
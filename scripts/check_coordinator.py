@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+##
+# Check the coordinator and workers on localhost: start a coordinator and
+# three workers, kill one worker in the middle of the campaign, and check that
+# the merged result has all the requested iterations. A worker with a wrong
+# secret is refused.
+#
+# Usage: python scripts/check_coordinator.py
+#
+
+import os
+import sys
+import time
+import signal
+import socket
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SIMEDC = os.path.join(ROOT, "simedc.py")
+
+ITERATIONS = 60
+NUM_WORKERS = 3
+SECRET = "check-coordinator"
+SIM_ARGS = ["-A", "regular", "-R", "16", "-N", "4", "-S", "2000",
+            "-n", "9", "-k", "6", "-t", "rs", "-T", "flat"]
+
+
+def get_free_port():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def start(args):
+    # each process leads its own group, so a worker is killed with its children
+    return subprocess.Popen([sys.executable, "-u", SIMEDC] + args, cwd=ROOT,
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                            preexec_fn=os.setsid)
+
+
+def main():
+    address = "127.0.0.1:%d" % get_free_port()
+    coordinator = start(SIM_ARGS + ["-i", str(ITERATIONS), "--serve", address,
+                                    "--secret", SECRET, "--job_iterations", "2"])
+    workers = [start(["-p", "1", "--worker", address, "--secret", SECRET])
+               for i in xrange(NUM_WORKERS)]
+    intruder = start(["-p", "1", "--worker", address, "--secret", "wrong"])
+
+    output = []
+    killed = False
+    while True:
+        line = coordinator.stdout.readline()
+        if not line:
+            break
+        output.append(line)
+        if line.startswith("Progress:") and not killed:
+            os.killpg(workers[0].pid, signal.SIGKILL)
+            killed = True
+            print "Killed worker 0 after: %s" % line.strip()
+    coordinator.wait()
+
+    for worker in workers[1:] + [intruder]:
+        worker.wait()
+    intruder_output = intruder.stdout.read()
+
+    text = "".join(output)
+    ok = True
+    if coordinator.returncode != 0:
+        print "The coordinator exited with %d!" % coordinator.returncode
+        ok = False
+    if "merged_iterations = %d\n" % ITERATIONS not in text:
+        print "The merged result does not have %d iterations!" % ITERATIONS
+        ok = False
+    if "check the secret" not in intruder_output:
+        print "The worker with a wrong secret is not refused!"
+        ok = False
+    print "Jobs handed out again: %d" % text.count("is handed out again")
+
+    if not ok:
+        print text
+        sys.exit(1)
+    print "OK"
+
+
+if __name__ == "__main__":
+    main()
@@ -4,14 +4,21 @@ import multiprocessing
 import getopt
 import random
 import numpy.random as nprandom
+from collections import namedtuple
 
 from lib.simulation import Simulation, ISParms
 from lib.regular_simulation import RegularSimulation
 from lib.is_simulation import UnifBFBSimulation
-from lib.placement import Placement
-from lib.smp_data_structures import Weibull
-from lib.sim_analysis_functions import Samples
-from lib.tracelib.trace import Parser
+from lib.batched_simulation import BatchedSimulation
+from lib.markov_simulation import MarkovSimulation
+from lib.placement import Placement, generate_placement_files, read_placement_meta, get_placement_meta
+from lib.smp_data_structures import Weibull, reset_draw_buffers
+from lib.sim_analysis_functions import Samples, SignedSamples, PairedSamples, ControlVariateSamples
+from lib.result_cache import ResultCache, new_stats, add_stats, get_relative_error
+from lib.failure_timeline import FailureTimeline, STREAM_PLACEMENT, STREAM_OTHERS
+from lib.coordinator import Coordinator, run_worker, parse_address
+from lib.tracelib.trace import get_trace_index, get_trace_store, TRACE_MODE_REPLAY, TRACE_MODE_BOOTSTRAP
+from lib.tracelib.trace import NODE_MAPPING_EXACT, NODE_MAPPING_TILE, NODE_MAPPING_SAMPLE, NODE_MAPPING_REPLICATE
 
 class Simulate:
     def __init__(self, mission_time,
@@ -25,8 +32,12 @@ class Simulate:
                  use_network, network_setting,
                  use_power_outage, power_outage_dist, power_outage_duration,
                  use_trace=False, trace_id=0,
-                 sim_type=Simulation.REGULAR, is_parms=None):
+                 sim_type=Simulation.REGULAR, is_parms=None, batch_size=64,
+                 br_buckets=0,
+                 trace_mode=TRACE_MODE_REPLAY, block_size=4, node_mapping=NODE_MAPPING_EXACT,
+                 control_variate=False, pdl_times=(), sensitivity=False):
 
+        self.sim_type = sim_type
 
         if sim_type == Simulation.REGULAR:
             # call simulation's __init__
@@ -44,7 +55,8 @@ class Simulate:
                                      use_trace, trace_id)
 
             # call RegularSimulation's init()
-            self.sim.init()
+            self.sim.init(br_buckets, trace_mode, block_size, node_mapping, control_variate,
+                          len(pdl_times) != 0)
         elif sim_type == Simulation.UNIFBFB:
             # call simulation's __init__
             self.sim = UnifBFBSimulation(mission_time,
@@ -61,17 +73,54 @@ class Simulate:
                                          use_trace, trace_id, is_parms)
 
             # call UnifBFBSimulation's init()
+            self.sim.init(len(pdl_times) != 0, sensitivity)
+        elif sim_type == Simulation.BATCHED:
+            # call simulation's __init__
+            self.sim = BatchedSimulation(mission_time,
+                                         num_racks, nodes_per_rack, disks_per_node, capacity_per_disk,
+                                         chunk_size, num_stripes,
+                                         code_type, code_n, code_k,
+                                         place_type, chunk_rack_config,
+                                         rack_fail_dists, rack_repair_dist, node_fail_dists,
+                                         node_transient_fail_dists, node_transient_repair_dists,
+                                         disk_fail_dists, disk_repair_dists,
+                                         use_network, network_setting,
+                                         use_power_outage, power_outage_dist, power_outage_duration,
+                                         code_l,
+                                         use_trace, trace_id)
+
+            # call BatchedSimulation's init()
+            self.sim.init(batch_size, len(pdl_times) != 0)
+        elif sim_type == Simulation.MARKOV:
+            # call simulation's __init__
+            self.sim = MarkovSimulation(mission_time,
+                                        num_racks, nodes_per_rack, disks_per_node, capacity_per_disk,
+                                        chunk_size, num_stripes,
+                                        code_type, code_n, code_k,
+                                        place_type, chunk_rack_config,
+                                        rack_fail_dists, rack_repair_dist, node_fail_dists,
+                                        node_transient_fail_dists, node_transient_repair_dists,
+                                        disk_fail_dists, disk_repair_dists,
+                                        use_network, network_setting,
+                                        use_power_outage, power_outage_dist, power_outage_duration,
+                                        code_l,
+                                        use_trace, trace_id)
+
+            # call MarkovSimulation's init()
             self.sim.init()
         else:
-            print "ERROR: wrong sim_type, which should be of REGULAR or UNIFBFB!"
+            print "ERROR: wrong sim_type, which should be of REGULAR, UNIFBFB, BATCHED or MARKOV!"
             sys.exit(2)
 
 
-    def run_simulation(self, num_iterations=1000):
+    def run_simulation(self, num_iterations=1000, placement=None):
+        if self.sim_type == Simulation.BATCHED:
+            return self.sim.run_iterations(num_iterations, placement)
+
         rst_list = []
         # print "num_iterations = %d" % num_iterations
         for i in xrange(num_iterations):
-            rst_list.append(self.sim.run_iteration(i))
+            rst_list.append(self.sim.run_iteration(i, placement))
         return rst_list
 
 
@@ -101,9 +150,32 @@ def usage(arg):
     print "-O <use_power_outage> [--use_power_outage <use_power_outage>]"
     print "-F <use_trace> [--use_trace <use_trace>]"
     print "-d <trace_id> [--trace_id <trace_id>]"
+    print "--sweep <sweep_file>"
+    print "--replay"
+    print "--compare <options>"
+    print "--cache_dir <cache_dir>"
+    print "--target_re <target_re>"
+    print "--max_iterations <max_iterations>"
+    print "--serve <[host:]port>"
+    print "--worker <host:port>"
+    print "--secret <secret>"
+    print "--job_iterations <job_iterations>"
+    print "--shared_placement <placement_dir>"
+    print "--batch_size <batch_size>"
+    print "--br_buckets <br_buckets>"
+    print "--trace_mode <trace_mode>"
+    print "--block_size <block_size>"
+    print "--node_mapping <node_mapping>"
+    print "--control_variate <control_variate>"
+    print "--pdl_times <pdl_times>"
+    print "--sensitivity <sensitivity>"
     print ""
     print "Detail:"
-    print "sim_type =  \"regular\" (Regular), \"unifbfb\" (Enable importance sampling)"
+    print "sim_type =  \"regular\" (Regular), \"unifbfb\" (Enable importance sampling),"
+    print "            \"batched\" (Regular model without transient failures, which runs batch_size iterations"
+    print "            in lockstep with numpy; the iterations of a batch share one placement),"
+    print "            \"markov\" (Solve PDL and MTTDL analytically with the Markov chain of the number of"
+    print "            failed disks, which is exact for exponential failures and repairs without iterations)"
     print "fb_prob = probability of failure biasing"
     print "beta = a value that is close to the average repair rate"
     print "total_iterations = total number of simulation runs."
@@ -120,12 +192,63 @@ def usage(arg):
     print "chunk_rack_config = number of chunks in each rack. This must agree with the erasure code."
     print "use_network = False / True. If using network, network_setting = [cross_rack_repair_bwth, intra_rack_repair_bwth]"
     print "use_trace = False / True. If using trace, trace_id is in (4~11, 13~18)."
+    print "sweep_file = file of configurations to run as a sweep. Each line is an axis of alternatives"
+    print "             separated by \"|\", e.g., \"-T flat | -T hie -g 3,3,3\". Every alternative is a set of"
+    print "             options added to the command line, and the sweep runs the cartesian product of the axes."
+    print "             total_iterations, num_processes and rseed_plus are taken from the command line."
+    print "replay = record the failures and repairs of each iteration of a sweep once, and replay them in all"
+    print "         the configurations (e.g., codes and placements) of the regular simulation, so that the"
+    print "         configurations are compared with common random numbers."
+    print "compare = options added to the command line for the second configuration of a paired comparison"
+    print "          in the regular simulation, e.g., \"-T hie -g 3,3,3\". Iteration i of both configurations"
+    print "          draws the failures and repairs of the disks, nodes and racks and the placement from the same"
+    print "          named random streams, and the difference of PDL is reported with its confidence interval."
+    print "cache_dir = directory of the result cache. The finished batches of a configuration are reused,"
+    print "            and only the extra iterations are simulated."
+    print "target_re = run more iterations until RE (%) is not larger than target_re (needs cache_dir)."
+    print "max_iterations = maximum number of iterations to reach target_re (default: 100 * total_iterations)."
+    print "serve = run as the coordinator, which hands out the jobs to the workers over TCP instead of"
+    print "        running them in local processes. Workers can join and leave at any time."
+    print "        The host is 127.0.0.1 by default; set 0.0.0.0 to serve the workers on other machines."
+    print "worker = run num_processes workers for the coordinator at host:port."
+    print "secret = shared secret of the coordinator and its workers (default: $SIMEDC_SECRET)."
+    print "job_iterations = number of iterations of each job handed out by the coordinator (default: 10)."
+    print "shared_placement = use one placement in all the iterations, which is generated once into"
+    print "                   memory-mapped files in placement_dir (if it does not exist yet) and is"
+    print "                   shared read-only by all the processes."
+    print "batch_size = number of iterations that run in lockstep in the batched simulation."
+    print "br_buckets = number of equal periods of the mission time to report the BR of each period"
+    print "             in the regular simulation (0 for none)."
+    print "trace_mode = \"replay\" (Replay the node events in the trace, default), \"bootstrap\" (Resample"
+    print "             the failure histories of the nodes from the trace in each iteration) in the regular simulation."
+    print "block_size = number of consecutive inter-failure intervals of each block in the bootstrap (default: 4)."
+    print "node_mapping = \"exact\" (The nodes are the nodes of the trace, default), \"tile\" (Node i replays"
+    print "               trace node i % nodes_num), \"sample\" (Each node replays a trace node drawn at random),"
+    print "               \"replicate\" (Each trace node is replayed by consecutive nodes). The copies of a trace"
+    print "               node are shifted in time, so the number of nodes need not be nodes_num in the trace."
+    print "control_variate = False / True. If true, the regular simulation also reports PDL adjusted by the control"
+    print "                  variate, i.e., the number of disks whose first lifetime (of the disk or its node) ends by"
+    print "                  the mission time, whose expectation is exact from the Weibull distributions (needs"
+    print "                  use_trace = False)."
+    print "pdl_times = times (hours) separated by \",\" to report PDL by each time, e.g., 8760,43800,87600. Each iteration"
+    print "            reports the time of its data loss, so one run gives the PDL curve up to the mission time."
+    print "sensitivity = False / True. If true, the importance sampling simulation also reports the derivatives of PDL"
+    print "              with respect to the scales of disk failures, node failures and disk repairs (use_network = False)."
     print ""
     print "Samples:"
     print arg, "-n 9 -k 6 -t rs -T flat"
     print arg, "-n 9 -k 6 -t rs -T hie -g 3,3,3"
+    print arg, "-A markov -n 9 -k 6 -t rs -T hie -g 3,3,3"
+    print arg, "-i 40 -p 4 --sweep sweep.txt"
+    print arg, "-A regular -i 40 -p 4 --sweep codes.txt --replay"
+    print arg, "-A regular -i 40 -p 4 -n 9 -k 6 -t rs -T flat --compare \"-T hie -g 3,3,3\""
+    print arg, "-n 9 -k 6 -t rs -T flat -i 400 --serve 0.0.0.0:5555 --secret <secret>"
+    print arg, "-p 8 --worker coordinator_host:5555 --secret <secret>"
+
+def get_parms(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
 
-def get_parms():
     total_iterations = 4
     num_processes = 4
     mission_time = 87600  # 87600h = 10y
@@ -158,9 +281,24 @@ def get_parms():
     is_fb_prob = float(0.5)
     is_beta = float(.61)
 
+    batch_size = 64
+    br_buckets = 0
+    trace_mode = TRACE_MODE_REPLAY
+    block_size = 4
+    node_mapping = NODE_MAPPING_EXACT
+    control_variate = False
+    pdl_times = ()
+    sensitivity = False
+    placement_dir = None
+
+    # Options of the driver, which do not change the simulated configuration
+    run_opts = {"sweep_file": None, "replay": False, "compare": None, "cache_dir": None,
+                "target_re": None, "max_iterations": None, "serve": None, "worker": None,
+                "secret": os.environ.get("SIMEDC_SECRET"), "job_iterations": 10}
+
     try:
         # getopt, C-style parser for command line options
-        (opts, args) = getopt.getopt(sys.argv[1:], "hi:p:m:u:R:N:D:C:K:S:t:n:k:l:T:g:W:s:O:F:d:A:f:b:",
+        (opts, args) = getopt.getopt(argv, "hi:p:m:u:R:N:D:C:K:S:t:n:k:l:T:g:W:s:O:F:d:A:f:b:",
                                      ["help",
                                       "total_iterations=", "num_processes=", "mission_time=", "rseed_plus=",
                                       "num_racks=", "nodes_per_rack=", "disks_per_node=", "capacity_per_disk=",
@@ -170,7 +308,12 @@ def get_parms():
                                       "use_network=", "network_setting=",
                                       "use_power_outage=",
                                       "use_trace=", "trace_id=",
-                                      "sim_type=","fb_prob=", "beta="])
+                                      "sim_type=","fb_prob=", "beta=",
+                                      "sweep=", "replay", "compare=", "cache_dir=", "target_re=", "max_iterations=",
+                                      "serve=", "worker=", "secret=", "job_iterations=", "shared_placement=", "batch_size=",
+                                      "br_buckets=", "trace_mode=", "block_size=",
+                                      "node_mapping=", "control_variate=", "pdl_times=",
+                                      "sensitivity="])
     except:
         usage(sys.argv[0])
         print "getopts excepted"
@@ -257,10 +400,79 @@ def get_parms():
                 sim_type = Simulation.REGULAR
             elif a == "unifbfb":
                 sim_type = Simulation.UNIFBFB
+            elif a == "batched":
+                sim_type = Simulation.BATCHED
+            elif a == "markov":
+                sim_type = Simulation.MARKOV
         elif o in("-f", "fb_prob"):
             is_fb_prob = float(a)
         elif o in("-b", "beta"):
             is_beta = float(a)
+        elif o == "--sweep":
+            run_opts["sweep_file"] = a
+        elif o == "--replay":
+            run_opts["replay"] = True
+        elif o == "--compare":
+            run_opts["compare"] = a
+        elif o == "--cache_dir":
+            run_opts["cache_dir"] = a
+        elif o == "--target_re":
+            run_opts["target_re"] = float(a)
+        elif o == "--max_iterations":
+            run_opts["max_iterations"] = int(a)
+        elif o == "--serve":
+            run_opts["serve"] = a
+        elif o == "--worker":
+            run_opts["worker"] = a
+        elif o == "--secret":
+            run_opts["secret"] = a
+        elif o == "--job_iterations":
+            run_opts["job_iterations"] = int(a)
+            if run_opts["job_iterations"] <= 0:
+                print "Please set right job_iterations(--job_iterations)!"
+                sys.exit(2)
+        elif o == "--shared_placement":
+            placement_dir = os.path.abspath(a)
+        elif o == "--batch_size":
+            batch_size = int(a)
+        elif o == "--br_buckets":
+            br_buckets = int(a)
+        elif o == "--trace_mode":
+            if a == TRACE_MODE_REPLAY or a == TRACE_MODE_BOOTSTRAP:
+                trace_mode = a
+            else:
+                print "Please set right trace_mode(--trace_mode)!"
+                sys.exit(2)
+        elif o == "--block_size":
+            block_size = int(a)
+            if block_size < 1:
+                print "Please set right block_size(--block_size)!"
+                sys.exit(2)
+        elif o == "--node_mapping":
+            if a in [NODE_MAPPING_EXACT, NODE_MAPPING_TILE, NODE_MAPPING_SAMPLE, NODE_MAPPING_REPLICATE]:
+                node_mapping = a
+            else:
+                print "Please set right node_mapping(--node_mapping)!"
+                sys.exit(2)
+        elif o == "--control_variate":
+            if a == "true" or a == "True" or a == "TRUE":
+                control_variate = True
+            elif a == "false" or a == "False" or a == "FALSE":
+                control_variate = False
+            else:
+                print "Please set right control_variate(--control_variate)!"
+                sys.exit(2)
+        elif o == "--pdl_times":
+            pdl_times = tuple(sorted(float(each) for each in a.split(",")))
+        elif o == "--sensitivity":
+            if a == "true" or a == "True" or a == "TRUE":
+                sensitivity = True
+            elif a == "false" or a == "False" or a == "FALSE":
+                sensitivity = False
+
+    if len(pdl_times) != 0 and (pdl_times[0] <= 0 or pdl_times[-1] > mission_time):
+        print "Please set right pdl_times(--pdl_times)!"
+        sys.exit(2)
 
     return (total_iterations, num_processes, mission_time, rseed_plus,
             num_racks, nodes_per_rack, disks_per_node, capacity_per_disk,
@@ -270,23 +482,48 @@ def get_parms():
             use_network, network_setting,
             use_power_outage,
             use_trace, trace_id,
-            sim_type, is_fb_prob, is_beta)
+            sim_type, is_fb_prob, is_beta,
+            batch_size, br_buckets,
+            trace_mode, block_size, node_mapping, control_variate, pdl_times, sensitivity,
+            placement_dir,
+            run_opts)
 
-def do_it(job_description):
-    # get the values for each parameter via get_parms()
-    (iter_num, rseed, mission_time,
-     num_racks, nodes_per_rack, disks_per_node, capacity_per_disk,
-     chunk_size, num_stripes,
-     code_type, code_n, code_k, code_l,
-     place_type, chunk_rack_config,
-     use_network, network_setting,
-     use_power_outage,
-     use_trace, trace_id,
-     sim_type, is_fb_prob, is_beta) = job_description
+##
+# Split the output of get_parms() into the driver settings and
+# the tuple of parameters that is passed to do_it()
+#
+def split_parms(parms):
+    (total_iterations, num_processes, mission_time, rseed_plus) = parms[:4]
+    params_tuple = (mission_time,) + tuple(parms[4:-1])
+    run_opts = parms[-1]
+    return (total_iterations, num_processes, rseed_plus, params_tuple, run_opts)
 
-    nprandom.seed(rseed)
-    random.seed(rseed)
+##
+# Named fields of the tuple of parameters from split_parms(). The tuple is
+# passed to the jobs as it is, and read by name with get_params().
+#
+SimParams = namedtuple("SimParams",
+                       ["mission_time",
+                        "num_racks", "nodes_per_rack", "disks_per_node", "capacity_per_disk",
+                        "chunk_size", "num_stripes",
+                        "code_type", "code_n", "code_k", "code_l",
+                        "place_type", "chunk_rack_config",
+                        "use_network", "network_setting",
+                        "use_power_outage",
+                        "use_trace", "trace_id",
+                        "sim_type", "is_fb_prob", "is_beta",
+                        "batch_size", "br_buckets",
+                        "trace_mode", "block_size", "node_mapping", "control_variate", "pdl_times",
+                        "sensitivity",
+                        "placement_dir"])
+
+def get_params(params_tuple):
+    return SimParams._make(params_tuple)
 
+##
+# Get the failure and repair distributions of the subsystems
+#
+def get_dists(use_network, use_power_outage, use_trace):
     # disk failure distribution
     disk_fail_dists = Weibull(shape=1.12, scale=87600.)
     if use_network:
@@ -314,6 +551,41 @@ def do_it(job_description):
         node_transient_fail_dists = Weibull(shape=1.0, scale=2890.8, location = 0.0)
         node_transient_repair_dists = Weibull(shape=1.0, scale=0.25, location=0.0)
 
+    return (disk_fail_dists, disk_repair_dists,
+            rack_fail_dists, rack_repair_dists,
+            power_outage_dist, power_outage_duration,
+            node_fail_dists, node_transient_fail_dists, node_transient_repair_dists)
+
+##
+# Simulate objects built in this process, keyed by their parameters.
+# A pool worker keeps them across jobs instead of rebuilding them.
+#
+simulate_cache = {}
+
+def get_simulate(params_tuple):
+    key = repr(params_tuple)
+    if key in simulate_cache:
+        return simulate_cache[key]
+
+    (mission_time,
+     num_racks, nodes_per_rack, disks_per_node, capacity_per_disk,
+     chunk_size, num_stripes,
+     code_type, code_n, code_k, code_l,
+     place_type, chunk_rack_config,
+     use_network, network_setting,
+     use_power_outage,
+     use_trace, trace_id,
+     sim_type, is_fb_prob, is_beta,
+     batch_size, br_buckets,
+     trace_mode, block_size, node_mapping, control_variate, pdl_times, sensitivity,
+     placement_dir) = get_params(params_tuple)
+
+    (disk_fail_dists, disk_repair_dists,
+     rack_fail_dists, rack_repair_dists,
+     power_outage_dist, power_outage_duration,
+     node_fail_dists, node_transient_fail_dists,
+     node_transient_repair_dists) = get_dists(use_network, use_power_outage, use_trace)
+
     is_parms = None
     if sim_type == Simulation.UNIFBFB:
         is_parms = ISParms(is_fb_prob, is_beta)
@@ -330,12 +602,182 @@ def do_it(job_description):
                           use_network, network_setting,
                           use_power_outage, power_outage_dist, power_outage_duration,
                           use_trace, trace_id,
-                          sim_type, is_parms)
+                          sim_type, is_parms, batch_size, br_buckets,
+                          trace_mode, block_size, node_mapping, control_variate, pdl_times, sensitivity)
 
-    return simulation.run_simulation(iter_num)
+    simulate_cache[key] = simulation
+    return simulation
 
+##
+# Placements attached from the shared placement files in this process
+#
+placement_cache = {}
 
-def get_output(result_simulation, total_iterations, num_stripes, code_n):
+def get_shared_placement(simulation, placement_dir):
+    if placement_dir not in placement_cache:
+        sim = simulation.sim
+        placement_cache[placement_dir] = Placement(sim.num_racks, sim.nodes_per_rack,
+                                                   sim.disks_per_node, sim.capacity_per_disk,
+                                                   sim.num_stripes, sim.chunk_size,
+                                                   sim.code_type, sim.n, sim.k,
+                                                   sim.place_type,
+                                                   sim.chunk_rack_config, sim.l, placement_dir)
+    return placement_cache[placement_dir]
+
+##
+# Generate the shared placement files of the configuration if they do not
+# exist, or check that the existing ones are of the configuration
+#
+def prepare_shared_placement(params_tuple, rseed):
+    params = get_params(params_tuple)
+    placement_dir = params.placement_dir
+    meta = read_placement_meta(placement_dir)
+    if meta != None:
+        if meta != get_placement_meta(params.num_racks, params.nodes_per_rack, params.disks_per_node,
+                                      params.num_stripes, params.code_type, params.code_n, params.code_k,
+                                      params.place_type, params.chunk_rack_config):
+            print "The placement dir %s does not match the configuration!" % placement_dir
+            print "Its placement is (num_racks, nodes_per_rack, disks_per_node, num_stripes, " \
+                  "code_type, code_n, code_k, place_type, chunk_rack_config) = %s." % meta
+            print "Please remove it or set another dir(--shared_placement)."
+            sys.exit(2)
+        return
+    nprandom.seed(rseed)
+    if not generate_placement_files(placement_dir, params.num_racks, params.nodes_per_rack,
+                                    params.disks_per_node, params.num_stripes, params.code_type,
+                                    params.code_n, params.code_k, params.place_type,
+                                    params.chunk_rack_config):
+        print "Fail to generate the shared placement in %s!" % placement_dir
+        sys.exit(2)
+
+def do_it(job_description):
+    # the job is (iter_num, rseed) + the parameters from get_parms()
+    (iter_num, rseed) = job_description[:2]
+
+    nprandom.seed(rseed)
+    random.seed(rseed)
+    reset_draw_buffers()
+
+    simulation = get_simulate(job_description[2:])
+
+    placement = None
+    placement_dir = get_params(job_description[2:]).placement_dir
+    if placement_dir != None:
+        placement = get_shared_placement(simulation, placement_dir)
+
+    return simulation.run_simulation(iter_num, placement)
+
+##
+# Key of the placement configuration of params_tuple, the configurations with
+# the same key can share the same placement
+#
+def get_placement_key(params_tuple):
+    params = get_params(params_tuple)
+    chunk_rack_config = None
+    if params.chunk_rack_config != None:
+        chunk_rack_config = tuple(params.chunk_rack_config)
+    return (params.num_racks, params.nodes_per_rack, params.disks_per_node, params.capacity_per_disk,
+            params.num_stripes, params.chunk_size, params.code_type, params.code_n, params.code_k,
+            params.code_l, params.place_type, chunk_rack_config)
+
+##
+# Run a job of a sweep. Each iteration generates one placement for each
+# placement configuration of the job and evaluates all of the configurations
+# with it. With replay, the configurations also replay one failure timeline
+# of the iteration.
+#
+def do_sweep_job(job_description):
+    (group_idx, iter_num, rseed, params_list, replay) = job_description
+
+    nprandom.seed(rseed)
+    random.seed(rseed)
+    reset_draw_buffers()
+
+    simulations = [get_simulate(params_tuple) for params_tuple in params_list]
+    placement_keys = [get_placement_key(params_tuple) for params_tuple in params_list]
+    rst_lists = [[] for each in simulations]
+    placement_dir = get_params(params_list[0]).placement_dir
+    for i in xrange(iter_num):
+        timeline = None
+        if replay:
+            timeline = FailureTimeline()
+        placements = dict()
+        for idx in xrange(len(simulations)):
+            key = placement_keys[idx]
+            if key not in placements:
+                if placement_dir != None:
+                    placements[key] = get_shared_placement(simulations[idx], placement_dir)
+                else:
+                    placements[key] = simulations[idx].sim.generate_placement()
+            if replay:
+                simulations[idx].sim.set_timeline(timeline)
+            rst_lists[idx].append(simulations[idx].sim.run_iteration(i, placements[key]))
+
+    if replay:
+        for simulation in simulations:
+            simulation.sim.set_timeline(None)
+    return (group_idx, rst_lists)
+
+##
+# Seed the global random streams, e.g., before a placement is generated
+#
+def seed_global_streams(seed):
+    nprandom.seed(seed)
+    random.seed(seed)
+    reset_draw_buffers()
+
+##
+# Run a job of a paired comparison. In iteration i, the configurations draw
+# from the named streams of the same FailureTimeline seeded by (rseed, i),
+# and their placements are generated after seeding the global streams from
+# the placement stream.
+#
+def do_paired_job(job_description):
+    (iter_num, rseed, params_list) = job_description
+
+    simulations = [get_simulate(params_tuple) for params_tuple in params_list]
+    rst_lists = [[] for each in simulations]
+    for i in xrange(iter_num):
+        timeline = FailureTimeline([rseed, i])
+        for idx in xrange(len(simulations)):
+            simulation = simulations[idx]
+            seed_global_streams(timeline.get_seed(STREAM_PLACEMENT))
+            placement_dir = get_params(params_list[idx]).placement_dir
+            if placement_dir != None:
+                placement = get_shared_placement(simulation, placement_dir)
+            else:
+                placement = simulation.sim.generate_placement()
+            # the other draws (e.g., the resampled traces) are paired as well
+            seed_global_streams(timeline.get_seed(STREAM_OTHERS))
+            simulation.sim.set_timeline(timeline)
+            rst_lists[idx].append(simulation.sim.run_iteration(i, placement))
+
+    for simulation in simulations:
+        simulation.sim.set_timeline(None)
+    return rst_lists
+
+##
+# The means of values (one per iteration) over the batches of the batched
+# simulation, whose iterations share one placement and are not independent,
+# or None if the results are of independent iterations
+#
+def get_batch_means(result_simulation, values):
+    if len(result_simulation) == 0 or len(result_simulation[0]) < 3 or \
+            not result_simulation[0][2].has_key("batch_size"):
+        return None
+    batch_means = []
+    idx = 0
+    while idx < len(values):
+        size = result_simulation[idx][2]["batch_size"]
+        batch_means.append(float(sum(values[idx:idx + size])) / size)
+        idx += size
+    return batch_means
+
+##
+# Calculate the reliability metrics of the results of a configuration
+# The RE of the batched simulation is computed from the means of its batches.
+#
+def summarize_output(result_simulation, total_iterations, num_stripes, code_n, verbose=False):
     run_samples = []
     avg_num_lost_chunks = float(0)
     avg_br = float(0)
@@ -343,8 +785,10 @@ def get_output(result_simulation, total_iterations, num_stripes, code_n):
 
     # print "len_results = %d" % len(result_simulation)
     for each in result_simulation:
-        print each
-        (sample, ori_pattern) = each
+        if verbose:
+            print each
+        # each is (sample, ori_pattern) or (sample, ori_pattern, extras)
+        (sample, ori_pattern) = each[:2]
         run_samples.append(sample)
         (num_failed_stripes, num_lost_chunks, blocked_ratio, single_chunk_repair_ratio) = eval(ori_pattern)
         avg_num_lost_chunks += num_lost_chunks
@@ -353,13 +797,24 @@ def get_output(result_simulation, total_iterations, num_stripes, code_n):
 
     samples = Samples(run_samples)
     mean = samples.calcMean()
-    relative_error = 100. * float(samples.calcRE("0.95"))
+    batch_means = get_batch_means(result_simulation, run_samples)
+    if batch_means is None:
+        relative_error = 100. * float(samples.calcRE("0.95"))
+    else:
+        relative_error = 100. * float(Samples(batch_means).calcRE("0.95"))
 
     avg_num_lost_chunks /= total_iterations
     NOMDL = avg_num_lost_chunks / (num_stripes * code_n)
     avg_br /= total_iterations
     avg_single_chunk_repair_ratio /= total_iterations
 
+    return (samples, mean, relative_error, NOMDL, avg_br, avg_single_chunk_repair_ratio)
+
+
+def get_output(result_simulation, total_iterations, num_stripes, code_n):
+    (samples, mean, relative_error, NOMDL, avg_br, avg_single_chunk_repair_ratio) = \
+        summarize_output(result_simulation, total_iterations, num_stripes, code_n, True)
+
     print "*************** Result ***************"
     print "num_zeroes = %d" % samples.get_num_zeroes()
     print "PDL = %e" % mean
@@ -369,11 +824,453 @@ def get_output(result_simulation, total_iterations, num_stripes, code_n):
     #print "BR = %.12f" % avg_br
     print "BR = %e" % avg_br
     print "Single-chunk repair ratio = %.6f" % avg_single_chunk_repair_ratio
+
+    br_series = get_br_series(result_simulation)
+    if len(br_series) != 0:
+        print "BR of each period (the iterations with data loss count until the loss):"
+        for idx in xrange(len(br_series)):
+            print "  period %d: BR = %e" % (idx, br_series[idx])
+    print "***************************************"
+
+
+##
+# Report the paired difference of PDL of the configurations B and A
+#
+def get_paired_output(results_a, results_b, compare):
+    samples = PairedSamples([each[0] for each in results_a], [each[0] for each in results_b])
+    mean_diff = samples.calcMean()
+    (lower, upper) = samples.calcConfInterval("0.95")
+
+    print "*************** Paired Comparison ***************"
+    print "B = A with %s" % compare
+    print "PDL(A) = %e" % samples.samples_a.calcMean()
+    print "PDL(B) = %e" % samples.samples_b.calcMean()
+    print "PDL(B) - PDL(A) = %e" % mean_diff
+    print "95%% confidence interval = [%e, %e]" % (lower, upper)
+    print "num_discordant_pairs = %d" % (len(samples.samples) - samples.get_num_zeroes())
+    print "variance_reduction = %.2f" % samples.calcVarianceReduction()
+    print "*************************************************"
+
+
+##
+# Run a configuration A and the configuration B (A with the options of compare)
+# as a paired comparison, and return the lists of results of A and B
+#
+def run_compare(pool, n, total_iterations, rseed_plus, params_tuple, compare, base_argv):
+    params_tuple_b = split_parms(get_parms(base_argv + compare.split()))[3]
+    check_config(params_tuple_b)
+    for each in [params_tuple, params_tuple_b]:
+        if not isinstance(get_simulate(each).sim, RegularSimulation):
+            print "compare only supports the regular simulation!"
+            sys.exit(2)
+    params_b = get_params(params_tuple_b)
+    if params_b.use_trace:
+        prepare_traces(params_b.trace_id, params_b.num_racks, params_b.nodes_per_rack,
+                       params_b.trace_mode, params_b.node_mapping)
+
+    jobs = [(total_iterations / n, job_idx + rseed_plus, [params_tuple, params_tuple_b])
+            for job_idx in xrange(n)]
+    results_a = []
+    results_b = []
+    for (rst_a, rst_b) in pool.map(do_paired_job, jobs):
+        results_a += rst_a
+        results_b += rst_b
+    return (results_a, results_b)
+
+
+##
+# Report PDL and MTTDL solved by the analytic simulation
+#
+def get_markov_output(markov_simulation, pdl_times=()):
+    (pdl, mttdl) = markov_simulation.solve()
+
+    print "*************** Result ***************"
+    print "num_states = %d" % markov_simulation.chain.num_states
+    print "PDL = %e" % pdl
+    print "MTTDL (hours) = %e" % mttdl
+    print "MTTDL (years) = %e" % (mttdl / (24 * 365))
+    for pdl_time in pdl_times:
+        print "PDL by %g hours = %e" % (pdl_time, markov_simulation.chain.get_pdl(pdl_time))
+    if not markov_simulation.is_exact():
+        print "Warning: the configuration is not exponential (or has more disks per node or power outage),"
+        print "         so the failures and repairs are replaced by the exponential ones with the same means."
     print "***************************************"
 
+##
+# Expectation of the control variate of the regular simulation, i.e., the
+# number of disks whose first lifetime of the disk or its node ends by the
+# mission time. The first lifetimes are independent draws, so it is
+# num_disks * (1 - (1 - F_disk(T)) * (1 - F_node(T))) for the Weibull CDFs.
+#
+def get_control_mean(params_tuple):
+    params = get_params(params_tuple)
+    (disk_fail_dists, disk_repair_dists,
+     rack_fail_dists, rack_repair_dists,
+     power_outage_dist, power_outage_duration,
+     node_fail_dists, node_transient_fail_dists,
+     node_transient_repair_dists) = get_dists(params.use_network, params.use_power_outage, params.use_trace)
+
+    num_disks = params.num_racks * params.nodes_per_rack * params.disks_per_node
+    survival = (1 - disk_fail_dists.cdf_eval(params.mission_time)) * \
+               (1 - node_fail_dists.cdf_eval(params.mission_time))
+    return num_disks * (1 - survival)
+
+##
+# Report PDL adjusted by the control variate of the regular simulation next
+# to the raw PDL
+#
+def get_control_variate_output(result_simulation, params_tuple):
+    control_mean = get_control_mean(params_tuple)
+    controls = [each[2]["num_early_failures"] for each in result_simulation]
+    samples = ControlVariateSamples([each[0] for each in result_simulation], controls, control_mean)
+    raw_relative_error = 100. * float(samples.raw.calcRE("0.95"))
+    relative_error = 100. * float(samples.calcRE("0.95"))
+
+    print "*************** Control Variate ***************"
+    print "control = number of disks whose first lifetime ends by the mission time"
+    print "E[control] (Weibull) = %f" % control_mean
+    print "mean of control (simulated) = %f" % samples.controls_mean
+    print "correlation = %.4f\nbeta = %e" % (samples.correlation, samples.beta)
+    print "PDL (raw) = %e" % samples.raw.calcMean()
+    print "RE (raw) =", "{0:.1f}%".format(raw_relative_error)
+    print "PDL (control variate) = %e" % samples.calcMean()
+    print "RE (control variate) =", "{0:.1f}%".format(relative_error)
+    print "***********************************************"
+
+
+##
+# Report PDL by each of pdl_times (hours) from the time of data loss of each
+# iteration, where the sample of an iteration counts by the time if its data
+# loss happens by then (the sample of IS is the likelihood ratio at the loss)
+#
+def get_pdl_curve_output(result_simulation, pdl_times):
+    loss_times = []
+    for each in result_simulation:
+        if len(each) < 3 or not each[2].has_key("loss_time"):
+            loss_times.append(None)
+        else:
+            loss_times.append(each[2]["loss_time"])
+
+    print "*************** PDL Curve ***************"
+    print "%12s %14s %8s %30s" % ("time (hours)", "PDL", "RE", "95% CI")
+    for pdl_time in pdl_times:
+        values = [result_simulation[idx][0]
+                  if loss_times[idx] is not None and loss_times[idx] <= pdl_time else 0
+                  for idx in xrange(len(result_simulation))]
+        mean = SignedSamples(values).calcMean()
+        # the batches of the batched simulation are the independent samples
+        batch_means = get_batch_means(result_simulation, values)
+        if batch_means is None:
+            samples = SignedSamples(values)
+        else:
+            samples = SignedSamples(batch_means)
+        relative_error = 100. * float(samples.calcRE("0.95"))
+        # the normal interval around PDL, whose lower bound is clamped at 0 as PDL is not negative
+        (lower, upper) = samples.calcConfInterval("0.95")
+        half_width = (upper - lower) / 2
+        (lower, upper) = (max(mean - half_width, 0), mean + half_width)
+        print "%12g %14e %8s %30s" % (pdl_time, mean, "{0:.1f}%".format(relative_error),
+                                      "(%e, %e)" % (lower, upper))
+    print "*****************************************"
+
+
+##
+# Report the derivatives of PDL with respect to the scales of the failures and
+# repairs, which are the means of the likelihood ratios of the iterations with
+# data loss weighted by their scores (the derivatives of their log-likelihood
+# with respect to the log of the scales). The ratios are not clamped at 1 as
+# the samples of PDL are, or the derivatives would be biased.
+#
+def get_sensitivity_output(result_simulation, params_tuple):
+    params = get_params(params_tuple)
+    (disk_fail_dists, disk_repair_dists,
+     rack_fail_dists, rack_repair_dists,
+     power_outage_dist, power_outage_duration,
+     node_fail_dists, node_transient_fail_dists,
+     node_transient_repair_dists) = get_dists(params.use_network, params.use_power_outage, params.use_trace)
+    scales = [("disk failure", "disk_fail_score", disk_fail_dists.scale),
+              ("node failure", "node_fail_score", node_fail_dists.scale)]
+    if not params.use_network:
+        scales.append(("disk repair", "repair_score", disk_repair_dists.scale))
+
+    print "*************** Sensitivity ***************"
+    for (name, key, scale) in scales:
+        samples = SignedSamples([each[2]["lr"] * each[2][key] if len(each) >= 3 and each[2].has_key(key) else 0
+                                 for each in result_simulation])
+        mean = samples.calcMean()
+        (lower, upper) = samples.calcConfInterval("0.95")
+        print "%s scale = %g hours" % (name, scale)
+        print "  dPDL/dln(scale) = %e, 95%% CI = (%e, %e)" % (mean, lower, upper)
+        print "  dPDL/dscale = %e per hour" % (mean / scale)
+    print "PDL(scale * (1 + x)) ~= PDL + x * dPDL/dln(scale) for a small x"
+    print "*******************************************"
+
+
+##
+# Average the blocked ratio of each period over the iterations that reach it
+#
+def get_br_series(result_simulation):
+    sums = []
+    counts = []
+    for each in result_simulation:
+        if len(each) < 3 or not each[2].has_key("br_series"):
+            continue
+        series = each[2]["br_series"]
+        for idx in xrange(len(series)):
+            if idx == len(sums):
+                sums.append(float(0))
+                counts.append(0)
+            sums[idx] += series[idx]
+            counts[idx] += 1
+    return [sums[idx] / counts[idx] for idx in xrange(len(sums))]
+
+
+##
+# Check whether the configuration is valid
+#
+def check_config(params_tuple):
+    params = get_params(params_tuple)
+
+    # Check the configured storage capacity is valid
+    total_cap = float(params.capacity_per_disk * params.num_racks * params.nodes_per_rack *
+                      params.disks_per_node)
+    real_cap = float(params.code_n * params.num_stripes * params.chunk_size)
+    if total_cap < real_cap:
+        print "The storage capacity is NOT enough in current configuration!"
+        sys.exit(2)
+
+    if params.network_setting[0] > params.network_setting[1]:
+        print "Cross-rack bandwidth must be less than intra-rack bandwidth."
+        sys.exit(2)
+
+##
+# Build the trace store if it has not been built yet, and check the
+# number of nodes of the trace when the nodes replay it one to one
+#
+def prepare_traces(trace_id, num_racks, nodes_per_rack, trace_mode, node_mapping):
+    sum_nodes = get_trace_index().get_sum_nodes(trace_id)
+    if trace_mode == TRACE_MODE_REPLAY and node_mapping == NODE_MAPPING_EXACT and \
+            sum_nodes != num_racks * nodes_per_rack:
+        print "The number of nodes should be equal to nodes_num in trace!"
+        sys.exit(2)
+    get_trace_store(trace_id)
+
+##
+# Drop the option opt (with its value) from the command line options argv
+#
+def get_base_argv(argv, opt):
+    base_argv = []
+    for i in xrange(len(argv)):
+        if argv[i] == opt or (i > 0 and argv[i-1] == opt) or argv[i].startswith(opt + "="):
+            continue
+        base_argv.append(argv[i])
+    return base_argv
+
+##
+# Parse the sweep file into a list of configurations.
+# Each configuration is a list of command line options.
+#
+def parse_sweep_file(sweep_file):
+    axes = []
+    with open(sweep_file, "r") as f:
+        for line in f:
+            line = line.split("#")[0].strip()
+            if line == "":
+                continue
+            axes.append([alternative.split() for alternative in line.split("|")])
+
+    points = [[]]
+    for axis in axes:
+        points = [point + alternative for point in points for alternative in axis]
+    return points
+
+##
+# Run all the configurations of a sweep with one pool of processes.
+# The configurations with the same placement configuration form a group,
+# and the jobs of different groups are interleaved. With replay, all the
+# configurations form one group, which replays the same failure timelines.
+#
+def run_sweep(sweep_file, base_argv, total_iterations, num_processes, rseed_plus, replay=False):
+    points = parse_sweep_file(sweep_file)
+    if len(points) == 0:
+        print "No configuration in the sweep file %s!" % sweep_file
+        sys.exit(2)
+
+    params_list = []
+    groups = []
+    group_keys = []
+    placement_keys = []
+    for point in points:
+        params_tuple = split_parms(get_parms(base_argv + point))[3]
+        check_config(params_tuple)
+        params = get_params(params_tuple)
+        if params.use_trace:
+            prepare_traces(params.trace_id, params.num_racks, params.nodes_per_rack,
+                           params.trace_mode, params.node_mapping)
+
+        # the parent only groups the configurations, and the workers build their simulations
+        if replay and params.sim_type != Simulation.REGULAR:
+            print "replay only supports the regular simulation!"
+            sys.exit(2)
+        key = get_placement_key(params_tuple)
+        if key not in placement_keys:
+            placement_keys.append(key)
+        if replay:
+            key = None
+        if key not in group_keys:
+            group_keys.append(key)
+            groups.append([])
+        groups[group_keys.index(key)].append(len(params_list))
+        params_list.append(params_tuple)
+
+    if get_params(params_list[0]).placement_dir != None:
+        if len(placement_keys) != 1:
+            print "shared_placement needs the same placement configuration in the sweep!"
+            sys.exit(2)
+        prepare_shared_placement(params_list[0], rseed_plus)
+
+    n = num_processes * 1
+    if total_iterations % n != 0:
+        print "total_iterations should be divided by n!"
+        sys.exit(2)
+
+    print "\n*********** Sweep ***********"
+    print "total_iterations = %d\nnum_processes = %d\nrseed_plus = %d" % \
+          (total_iterations, num_processes, rseed_plus)
+    print "num_configurations = %d\nnum_placement_groups = %d" % (len(points), len(placement_keys))
+    print "replay = %s" % replay
+    print "***************************************\n"
+
+    # Interleave the jobs of the groups
+    jobs = []
+    for job_idx in xrange(n):
+        for group_idx in xrange(len(groups)):
+            jobs.append((group_idx, total_iterations / n, job_idx + rseed_plus,
+                         [params_list[idx] for idx in groups[group_idx]], replay))
+
+    pool = multiprocessing.Pool(num_processes)
+    results = [[] for each in params_list]
+    for (group_idx, rst_lists) in pool.imap_unordered(do_sweep_job, jobs):
+        for i in xrange(len(rst_lists)):
+            results[groups[group_idx][i]] += rst_lists[i]
+    pool.close()
+    pool.join()
+
+    print "*************** Sweep Result ***************"
+    print "%-4s %-13s %-7s %-13s %-13s %s" % ("id", "PDL", "RE", "NOMDL", "BR", "configuration")
+    for idx in xrange(len(points)):
+        params = get_params(params_list[idx])
+        (samples, mean, relative_error, NOMDL, avg_br, avg_single_chunk_repair_ratio) = \
+            summarize_output(results[idx], total_iterations, params.num_stripes, params.code_n)
+        print "%-4d %-13s %-7s %-13s %-13s %s" % (idx, "%e" % mean, "{0:.1f}%".format(relative_error),
+                                                "%e" % NOMDL, "%e" % avg_br, " ".join(points[idx]))
+    print "********************************************"
+
+
+##
+# Report the statistics of the results streamed back by the workers so far
+#
+class ProgressReport:
+
+    def __init__(self, total_iterations):
+        self.total_iterations = total_iterations
+        self.num_iterations = 0
+        self.sum = float(0)
+        self.num_nonzeroes = 0
+
+
+    def add_result(self, job_idx, result):
+        for each in result:
+            self.num_iterations += 1
+            self.sum += float(each[0])
+            if each[0] != 0:
+                self.num_nonzeroes += 1
+        print "Progress: iterations = %d/%d, nonzero samples = %d, PDL so far = %e" % \
+            (self.num_iterations, self.total_iterations, self.num_nonzeroes,
+             self.sum / self.num_iterations)
+
+
+##
+# Run the jobs of a configuration and return the list of results of each job
+# The jobs run in the local pool or in the workers of the coordinator.
+#
+def run_jobs(pool, iterations_per_job, enumerates, params_tuple):
+    jobs = zip(iterations_per_job, enumerates)
+
+    for idx in xrange(len(jobs)):
+        jobs[idx] += params_tuple
+    if isinstance(pool, Coordinator):
+        return pool.run(jobs, ProgressReport(sum(iterations_per_job)).add_result)
+    # results_list = map(do_it, jobs)
+    return pool.map(do_it, jobs)
+
+##
+# Run a configuration with the result cache. The cached batches are reused and
+# only the extra iterations to reach total_iterations (or target_re) are simulated.
+#
+def run_cached(pool, n, total_iterations, rseed_plus, params_tuple, run_opts):
+    params = get_params(params_tuple)
+    cache = ResultCache(run_opts["cache_dir"])
+    key = cache.get_key(params_tuple, get_dists(params.use_network, params.use_power_outage, params.use_trace))
+    target_re = run_opts["target_re"]
+    max_iterations = run_opts["max_iterations"]
+    if max_iterations == None:
+        max_iterations = 100 * total_iterations
+
+    results = []
+    # sufficient statistics of the samples of results
+    totals = new_stats()
+    used_seeds = set([])
+    for (stats, batch_results) in cache.load_batches(key):
+        used_seeds.add(stats["seed"])
+        if target_re == None and len(results) >= total_iterations:
+            continue
+        results += batch_results
+        add_stats(totals, stats)
+    num_cached = len(results)
+
+    needed = total_iterations - len(results)
+    seed = rseed_plus
+    num_extra_rounds = 0
+    while True:
+        if needed > 0:
+            iterations_per_job = [needed / n + (1 if i < needed % n else 0) for i in xrange(n)]
+            iterations_per_job = [each for each in iterations_per_job if each > 0]
+            enumerates = []
+            for i in xrange(len(iterations_per_job)):
+                while seed in used_seeds:
+                    seed += 1
+                enumerates.append(seed)
+                used_seeds.add(seed)
+
+            results_list = run_jobs(pool, iterations_per_job, enumerates, params_tuple)
+            for idx in xrange(len(results_list)):
+                add_stats(totals, cache.save_batch(key, enumerates[idx], results_list[idx]))
+                results += results_list[idx]
+
+        if target_re == None:
+            break
+        relative_error = get_relative_error(totals, 1.96)
+        if relative_error is None and num_extra_rounds > 0:
+            print "Warning: no data loss in %d iterations, so target_re cannot be reached!" % len(results)
+            print "         Try the importance sampling simulation (-A unifbfb) for rare data loss."
+            break
+        if relative_error is not None and relative_error <= target_re:
+            break
+        if len(results) >= max_iterations:
+            print "Warning: target_re is not reached in max_iterations = %d!" % max_iterations
+            break
+        needed = min(total_iterations, max_iterations - len(results))
+        num_extra_rounds += 1
+
+    print "cache key = %s" % key
+    print "cached_iterations = %d, simulated_iterations = %d" % (num_cached, len(results) - num_cached)
+    return results
+
 
 if __name__ == "__main__":
     # Get the configuration
+    parms = get_parms()
     (total_iterations, num_processes, mission_time, rseed_plus,
      num_racks, nodes_per_rack, disks_per_node, capacity_per_disk,
      chunk_size, num_stripes,
@@ -382,19 +1279,55 @@ if __name__ == "__main__":
      use_network, network_setting,
      use_power_outage,
      use_trace, trace_id,
-     sim_type, is_fb_prob, is_beta) = get_parms()
+     sim_type, is_fb_prob, is_beta,
+     batch_size, br_buckets,
+     trace_mode, block_size, node_mapping, control_variate, pdl_times, sensitivity,
+     placement_dir,
+     run_opts) = parms
 
-    # Check the configured storage capacity is valid
-    total_cap = float(capacity_per_disk * num_racks * nodes_per_rack * disks_per_node)
-    real_cap = float(code_n * num_stripes * chunk_size)
-    if total_cap < real_cap:
-        print "The storage capacity is NOT enough in current configuration!"
+    if (run_opts["serve"] != None or run_opts["worker"] != None) and not run_opts["secret"]:
+        print "Please set right secret(--secret or SIMEDC_SECRET)!"
         sys.exit(2)
 
-    if network_setting[0] > network_setting[1]:
-        print "Cross-rack bandwidth must be less than intra-rack bandwidth."
+    if run_opts["worker"] != None:
+        (host, port) = parse_address(run_opts["worker"], "localhost")
+        workers = [multiprocessing.Process(target=run_worker, args=(host, port, run_opts["secret"], do_it))
+                   for i in xrange(num_processes)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        sys.exit(0)
+
+    if run_opts["sweep_file"] != None:
+        if run_opts["serve"] != None or run_opts["compare"] != None:
+            print "serve and compare do not support sweep!"
+            sys.exit(2)
+        run_sweep(run_opts["sweep_file"], get_base_argv(sys.argv[1:], "--sweep"),
+                  total_iterations, num_processes, rseed_plus, run_opts["replay"])
+        sys.exit(0)
+    if run_opts["replay"]:
+        print "replay needs sweep!"
+        sys.exit(2)
+    if sim_type == Simulation.MARKOV and use_trace:
+        print "markov does not support trace!"
+        sys.exit(2)
+    if control_variate and (sim_type != Simulation.REGULAR or use_trace):
+        print "control_variate only supports the regular simulation without trace!"
+        sys.exit(2)
+    if sensitivity and sim_type != Simulation.UNIFBFB:
+        print "sensitivity only supports the importance sampling simulation (unifbfb)!"
+        sys.exit(2)
+    if run_opts["compare"] != None and (run_opts["serve"] != None or run_opts["cache_dir"] != None):
+        print "compare does not support serve or cache_dir!"
         sys.exit(2)
 
+    (total_iterations, num_processes, rseed_plus, params_tuple, run_opts) = split_parms(parms)
+    check_config(params_tuple)
+
+    total_cap = float(capacity_per_disk * num_racks * nodes_per_rack * disks_per_node)
+    real_cap = float(code_n * num_stripes * chunk_size)
+
     print "\n*********** Configuration ***********"
     print "total_iterations = %d\nnum_processes = %d\nmission_time(hours) = %d" % \
           (total_iterations, num_processes, mission_time)
@@ -412,52 +1345,83 @@ if __name__ == "__main__":
         print "use_power_outage =", use_power_outage
     if use_trace:
         print "use_trace =", use_trace, "\ntrace_id =", trace_id
+        print "trace_mode =", trace_mode
+        if trace_mode == TRACE_MODE_BOOTSTRAP:
+            print "block_size =", block_size
+        else:
+            print "node_mapping =", node_mapping
+    if placement_dir != None:
+        print "shared_placement =", placement_dir
     print "Simulation type = %s" % sim_type
     if sim_type == Simulation.UNIFBFB:
         print "is_fb_prob = %.3f, is_beta = %.3f" % (is_fb_prob, is_beta)
+    if sim_type == Simulation.BATCHED:
+        print "batch_size = %d" % batch_size
+    if run_opts["compare"] != None:
+        print "compare = %s" % run_opts["compare"]
+    if sim_type == Simulation.REGULAR:
+        if br_buckets != 0:
+            print "br_buckets = %d" % br_buckets
+        if control_variate:
+            print "control_variate =", control_variate
+    if len(pdl_times) != 0:
+        print "pdl_times =", ",".join("%g" % each for each in pdl_times)
+    if sensitivity:
+        print "sensitivity =", sensitivity
     print "***************************************\n"
 
-    # Check whether the parsed traces exist
-    trace_transient_path = "./lib/tracelib/transient_events/s" + str(trace_id) + 'n0.txt'
-    trace_failure_path = "./lib/tracelib/failure_events/s" + str(trace_id) + 'n0.txt'
-    trace_transient_repair_path = "./lib/tracelib/transient_repair/s" + str(trace_id) + 'n0.txt'
-    if use_trace and not (os.path.exists(trace_transient_path) and os.path.exists(trace_failure_path)
-                          and os.path.exists(trace_transient_repair_path)):
-        parser = Parser(trace_id, mission_time)
-        sum_nodes = parser.get_sum_nodes()
-        if sum_nodes != num_racks * nodes_per_rack:
-            print "The number of nodes should be equal to nodes_num in trace!"
-            sys.exit(2)
-        parser.parse_traces()
+    if sim_type == Simulation.MARKOV:
+        get_markov_output(get_simulate(params_tuple).sim, pdl_times)
+        sys.exit(0)
+
+    if use_trace:
+        prepare_traces(trace_id, num_racks, nodes_per_rack, trace_mode, node_mapping)
+
+    if placement_dir != None:
+        prepare_shared_placement(params_tuple, rseed_plus)
 
-    pool = multiprocessing.Pool(num_processes)
     n = num_processes * 1
-    if total_iterations % n != 0:
+    if run_opts["serve"] != None:
+        # n is the number of jobs handed out to the workers, which are small
+        # so that a lost worker costs little
+        n = (total_iterations + run_opts["job_iterations"] - 1) / run_opts["job_iterations"]
+    elif total_iterations % n != 0:
         print "total_iterations should be divided by n!"
         sys.exit(2)
 
-    iterations_per_job = [total_iterations / n] * n
-    enumerates = range(0+rseed_plus, n+rseed_plus)
-    jobs = zip(iterations_per_job, enumerates)
+    if run_opts["serve"] != None:
+        (host, port) = parse_address(run_opts["serve"])
+        pool = Coordinator(host, port, run_opts["secret"])
+    else:
+        pool = multiprocessing.Pool(num_processes)
 
-    # add params_tuple
-    params_tuple = (mission_time,
-     num_racks, nodes_per_rack, disks_per_node, capacity_per_disk,
-     chunk_size, num_stripes,
-     code_type, code_n, code_k, code_l,
-     place_type, chunk_rack_config,
-     use_network, network_setting,
-     use_power_outage,
-     use_trace, trace_id,
-     sim_type, is_fb_prob, is_beta)
+    if run_opts["compare"] != None:
+        (results, results_b) = run_compare(pool, n, total_iterations, rseed_plus, params_tuple,
+                                           run_opts["compare"], get_base_argv(sys.argv[1:], "--compare"))
+    elif run_opts["cache_dir"] == None:
+        if run_opts["target_re"] != None:
+            print "target_re needs cache_dir!"
+            sys.exit(2)
+        iterations_per_job = [total_iterations / n + (1 if i < total_iterations % n else 0) for i in xrange(n)]
+        enumerates = range(0+rseed_plus, n+rseed_plus)
+        results_list = run_jobs(pool, iterations_per_job, enumerates, params_tuple)
 
-    for idx in xrange(len(jobs)):
-        jobs[idx] += params_tuple
-    # results_list = map(do_it, jobs)
-    results_list = pool.map(do_it, jobs)
+        results = []
+        for each in results_list:
+            results += each
+    else:
+        results = run_cached(pool, n, total_iterations, rseed_plus, params_tuple, run_opts)
 
-    results = []
-    for each in results_list:
-        results += each
+    if isinstance(pool, Coordinator):
+        pool.close()
+        print "merged_iterations = %d" % len(results)
 
-    get_output(results, total_iterations, num_stripes, code_n)
+    get_output(results, len(results), num_stripes, code_n)
+    if control_variate:
+        get_control_variate_output(results, params_tuple)
+    if len(pdl_times) != 0:
+        get_pdl_curve_output(results, pdl_times)
+    if sensitivity:
+        get_sensitivity_output(results, params_tuple)
+    if run_opts["compare"] != None:
+        get_paired_output(results, results_b, run_opts["compare"])